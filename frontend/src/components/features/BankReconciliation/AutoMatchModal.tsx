@@ -0,0 +1,182 @@
+import { useAtom } from 'jotai'
+import { bankRecAutoMatchModalAtom } from './bankRecAtoms'
+import { Dialog, DialogContent, DialogHeader, DialogFooter, DialogClose, DialogTitle, DialogDescription } from '@/components/ui/dialog'
+import _ from '@/lib/translate'
+import { AutoMatchProposal, TransactionGroup, useAcceptAutoMatchProposals, useGetAutoMatchProposals, useGetTransactionGroups, useReconcileTransactionGroup } from './utils'
+import { Button } from '@/components/ui/button'
+import { Checkbox } from '@/components/ui/checkbox'
+import ErrorBanner from '@/components/ui/error-banner'
+import { Skeleton } from '@/components/ui/skeleton'
+import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table'
+import { Badge } from '@/components/ui/badge'
+import { formatDate } from '@/lib/date'
+import { formatCurrency } from '@/lib/numbers'
+import { slug } from '@/lib/frappe'
+import { useEffect, useState } from 'react'
+import { MissingFiltersBanner } from './MissingFiltersBanner'
+
+const AutoMatchModal = ({ dataSource }: { dataSource: "Bank" | "Debtor" }) => {
+
+    const [isOpen, setIsOpen] = useAtom(bankRecAutoMatchModalAtom)
+
+    return (
+        <Dialog open={isOpen} onOpenChange={setIsOpen}>
+            <DialogContent className='min-w-5xl'>
+                <DialogHeader>
+                    <DialogTitle>{_("Auto Match")}</DialogTitle>
+                    <DialogDescription>
+                        {_("Proposed matches for all unreconciled transactions. Each transaction and voucher is proposed at most once.")}
+                    </DialogDescription>
+                </DialogHeader>
+                {isOpen && <AutoMatchModalContent dataSource={dataSource} />}
+            </DialogContent>
+        </Dialog>
+    )
+}
+
+const getProposalKey = (proposal: AutoMatchProposal) => `${proposal.transaction}::${proposal.voucher.doctype}::${proposal.voucher.name}`
+
+const AutoMatchModalContent = ({ dataSource }: { dataSource: "Bank" | "Debtor" }) => {
+
+    const [, setIsOpen] = useAtom(bankRecAutoMatchModalAtom)
+
+    const { data: proposals, isLoading, error } = useGetAutoMatchProposals(dataSource)
+    const { acceptProposals, loading, error: acceptError } = useAcceptAutoMatchProposals(dataSource)
+
+    const [selected, setSelected] = useState<Set<string>>(new Set())
+
+    useEffect(() => {
+        // Proposals are selected by default
+        setSelected(new Set(proposals?.message.map(getProposalKey) ?? []))
+    }, [proposals])
+
+    const toggle = (key: string) => {
+        setSelected(current => {
+            const next = new Set(current)
+            if (next.has(key)) {
+                next.delete(key)
+            } else {
+                next.add(key)
+            }
+            return next
+        })
+    }
+
+    const onAccept = () => {
+        acceptProposals(proposals?.message.filter(proposal => selected.has(getProposalKey(proposal))) ?? [])
+            .then(() => setIsOpen(false))
+    }
+
+    if (isLoading) {
+        return <div className='flex flex-col gap-2'>
+            <Skeleton className='h-10 w-full' />
+            <Skeleton className='h-10 w-full' />
+            <Skeleton className='h-10 w-full' />
+        </div>
+    }
+
+    return <div className='flex flex-col gap-4'>
+        {error && <ErrorBanner error={error} />}
+        {acceptError && <ErrorBanner error={acceptError} />}
+
+        {proposals?.message.length === 0 ? <MissingFiltersBanner text={_("No matches found for the unreconciled transactions")} /> :
+            <div className='max-h-[60vh] overflow-y-auto'>
+                <Table>
+                    <TableHeader>
+                        <TableRow>
+                            <TableHead className='w-8' />
+                            <TableHead>{_("Date")}</TableHead>
+                            <TableHead>{_("Transaction")}</TableHead>
+                            <TableHead className='text-right'>{_("Amount")}</TableHead>
+                            <TableHead>{_("Voucher")}</TableHead>
+                            <TableHead className='text-right'>{_("Voucher Amount")}</TableHead>
+                            <TableHead className='text-right'>{_("Score")}</TableHead>
+                        </TableRow>
+                    </TableHeader>
+                    <TableBody>
+                        {proposals?.message.map((proposal) => {
+                            const key = getProposalKey(proposal)
+                            return <TableRow key={key}>
+                                <TableCell>
+                                    <Checkbox checked={selected.has(key)} onCheckedChange={() => toggle(key)} />
+                                </TableCell>
+                                <TableCell>{formatDate(proposal.date)}</TableCell>
+                                <TableCell className='max-w-72 truncate' title={proposal.description}>{proposal.reference_number || proposal.description}</TableCell>
+                                <TableCell className='text-right font-mono'>{formatCurrency(proposal.unallocated_amount, proposal.currency)}</TableCell>
+                                <TableCell>
+                                    <a className='underline underline-offset-4'
+                                        target='_blank'
+                                        rel='noopener noreferrer'
+                                        href={`/app/${slug(proposal.voucher.doctype)}/${proposal.voucher.name}`}>
+                                        {`${_(proposal.voucher.doctype)}: ${proposal.voucher.name}`}
+                                    </a>
+                                </TableCell>
+                                <TableCell className='text-right font-mono'>{formatCurrency(proposal.voucher.paid_amount, proposal.voucher.currency)}</TableCell>
+                                <TableCell className='text-right'>
+                                    <Badge variant='secondary' className={proposal.voucher.is_suggested ? 'bg-green-100 text-green-700' : ''}>
+                                        {Math.round((proposal.voucher.score ?? 0) * 100)}%
+                                    </Badge>
+                                </TableCell>
+                            </TableRow>
+                        })}
+                    </TableBody>
+                </Table>
+            </div>}
+
+        {dataSource === 'Bank' && <TransactionGroups />}
+
+        <DialogFooter>
+            <DialogClose asChild>
+                <Button variant={'outline'} disabled={loading}>{_("Cancel")}</Button>
+            </DialogClose>
+            <Button onClick={onAccept} disabled={loading || selected.size === 0}>
+                {loading ? _("Reconciling...") : _("Accept {0} Matches", [String(selected.size)])}
+            </Button>
+        </DialogFooter>
+    </div>
+}
+
+/** Several transactions that together settle one voucher - each group is reconciled on its own */
+const TransactionGroups = () => {
+
+    const { data: groups, error, mutate } = useGetTransactionGroups()
+    const { reconcileGroup, loading, error: reconcileError } = useReconcileTransactionGroup()
+
+    const onReconcile = (group: TransactionGroup) => {
+        reconcileGroup(group).then(() => mutate())
+    }
+
+    if (!groups?.message.length && !error) {
+        return null
+    }
+
+    return <div className='flex flex-col gap-2'>
+        <span className='text-sm font-medium'>{_("Grouped Matches")}</span>
+        {error && <ErrorBanner error={error} />}
+        {reconcileError && <ErrorBanner error={reconcileError} />}
+        <div className='max-h-[30vh] overflow-y-auto flex flex-col gap-2'>
+            {groups?.message.map((group) => <div key={`${group.voucher.doctype}::${group.voucher.name}::${group.transactions.map(t => t.name).join(',')}`}
+                className='border rounded-md p-2 flex items-center justify-between gap-2'>
+                <div className='flex flex-col gap-1'>
+                    <a className='underline underline-offset-4 text-sm'
+                        target='_blank'
+                        rel='noopener noreferrer'
+                        href={`/app/${slug(group.voucher.doctype)}/${group.voucher.name}`}>
+                        {`${_(group.voucher.doctype)}: ${group.voucher.name}`}
+                    </a>
+                    <div className='flex flex-wrap gap-1'>
+                        {group.transactions.map((transaction) => <Badge key={transaction.name} variant='secondary' className='text-xs rounded-sm' title={transaction.description}>
+                            {formatDate(transaction.date)} · {formatCurrency(transaction.unallocated_amount, transaction.currency)}
+                        </Badge>)}
+                    </div>
+                </div>
+                <div className='flex items-center gap-2'>
+                    <span className='font-mono text-sm font-semibold'>{formatCurrency(group.total, group.voucher.currency)}</span>
+                    <Button size='sm' disabled={loading} onClick={() => onReconcile(group)}>{_("Reconcile")}</Button>
+                </div>
+            </div>)}
+        </div>
+    </div>
+}
+
+export default AutoMatchModal
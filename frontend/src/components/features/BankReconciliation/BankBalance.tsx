@@ -1,9 +1,7 @@
 import { useAtom, useAtomValue } from "jotai"
 import { bankRecClosingBalanceAtom, bankRecDateAtom, selectedBankAccountAtom } from "./bankRecAtoms"
-import { useFrappeGetDocCount } from "frappe-react-sdk"
-import { BankTransaction } from "@/types/Accounts/BankTransaction"
 import { Progress } from "@/components/ui/progress"
-import { useGetAccountClosingBalance, useGetAccountOpeningBalance, useGetUnreconciledTransactions } from "./utils"
+import { useGetAccountClosingBalance, useGetAccountOpeningBalance, useGetReconciliationSummary } from "./utils"
 import { flt, formatCurrency, getCurrencyFormatInfo } from "@/lib/numbers"
 import { Skeleton } from "@/components/ui/skeleton"
 import { StatContainer, StatLabel, StatValue } from "@/components/ui/stats"
@@ -148,18 +146,13 @@ const ReconcileProgress = () => {
 
     const dates = useAtomValue(bankRecDateAtom)
 
-    const { data: totalCount } = useFrappeGetDocCount<BankTransaction>('Bank Transaction', [
-        ["bank_account", "=", bankAccount?.name ?? ''],
-        ['docstatus', '=', 1],
-        ['date', '<=', dates?.toDate],
-        ['date', '>=', dates?.fromDate]
-    ], false, false, undefined, {
-        revalidateOnFocus: false
-    })
+    const { data: summary } = useGetReconciliationSummary("Bank", bankAccount?.company)
 
-    const { data: unreconciledTransactions, } = useGetUnreconciledTransactions("Bank")
+    const accountSummary = summary?.message?.find((row) => row.account === bankAccount?.name)
 
-    const reconciledCount = (totalCount ?? 0) - (unreconciledTransactions?.message?.length ?? 0)
+    const totalCount = accountSummary?.total_count ?? 0
+
+    const reconciledCount = totalCount - (accountSummary?.unreconciled_count ?? 0)
 
     const progress = (totalCount ? reconciledCount / totalCount : 0) * 100
 
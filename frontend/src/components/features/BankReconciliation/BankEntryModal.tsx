@@ -2,7 +2,7 @@ import { useAtom, useAtomValue, useSetAtom } from "jotai"
 import { bankRecRecordJournalEntryModalAtom, bankRecSelectedTransactionAtom, bankRecUnreconcileModalAtom, selectedBankAccountAtom, selectedPartyAtom } from "./bankRecAtoms"
 import { Dialog, DialogContent, DialogTitle, DialogDescription, DialogHeader, DialogFooter, DialogClose } from "@/components/ui/dialog"
 import _ from "@/lib/translate"
-import { UnreconciledTransaction, useGetRuleForTransaction, useRefreshUnreconciledTransactions } from "./utils"
+import { UnreconciledTransaction, useGetRuleForTransaction, useRefreshUnreconciledTransactions, useIdempotencyKey, useTrackBulkJob } from "./utils"
 import { useFieldArray, useForm, useFormContext, useWatch } from "react-hook-form"
 import { JournalEntry } from "@/types/Accounts/JournalEntry"
 import { getCompanyCostCenter, getCompanyCurrency } from "@/lib/company"
@@ -77,25 +77,22 @@ const BulkBankEntryForm = ({ selectedTransactions }: { selectedTransactions: Unr
 
     const { call, loading, error } = useFrappePostCall('truebalance.apis.bank_reconciliation.create_bulk_bank_entry_and_reconcile')
 
-    const selectedParty = useAtomValue(selectedPartyAtom)
-    const dataSource = selectedParty ? 'Debtor' : 'Bank'
-    const onReconcile = useRefreshUnreconciledTransactions(dataSource)
+    const trackBulkJob = useTrackBulkJob()
 
     const setIsOpen = useSetAtom(bankRecRecordJournalEntryModalAtom)
 
+    const { idempotencyKey, renewIdempotencyKey } = useIdempotencyKey()
+
     const onSubmit = (data: { account: string }) => {
 
         call({
+            idempotency_key: idempotencyKey,
             bank_transactions: selectedTransactions.map(transaction => transaction.name),
             account: data.account
-        }).then(() => {
-
-            toast.success(_("Bank Entries Created"), {
-                duration: 4000,
-            })
-
-            // Set this to the last selected transaction
-            onReconcile(selectedTransactions[selectedTransactions.length - 1])
+        }).then((res: { message: string }) => {
+            renewIdempotencyKey()
+            // Bank entries are created in the background - progress is shown until the job finishes
+            trackBulkJob(res.message, _("Creating Bank Entries"), selectedTransactions[selectedTransactions.length - 1])
             setIsOpen(false)
         })
     }
@@ -182,12 +179,16 @@ const BankEntryForm = ({ selectedTransaction }: { selectedTransaction: Unreconci
 
     const setBankRecUnreconcileModalAtom = useSetAtom(bankRecUnreconcileModalAtom)
 
+    const { idempotencyKey, renewIdempotencyKey } = useIdempotencyKey()
+
     const onSubmit = (data: BankEntryFormData) => {
 
         createBankEntry({
+            idempotency_key: idempotencyKey,
             bank_transaction_name: selectedTransaction.name,
             ...data
         }).then(() => {
+            renewIdempotencyKey()
             toast.success(_("Bank Entry Created"), {
                 duration: 4000,
                 closeButton: true,
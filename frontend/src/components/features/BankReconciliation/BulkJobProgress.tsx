@@ -0,0 +1,84 @@
+import { useAtom } from 'jotai'
+import { useEffect, useRef } from 'react'
+import { useFrappeEventListener, useFrappeGetCall, useFrappePostCall } from 'frappe-react-sdk'
+import { toast } from 'sonner'
+import _ from '@/lib/translate'
+import { bankRecBulkJobsAtom, BulkJob } from './bankRecAtoms'
+import { BulkJobState, useRefreshUnreconciledTransactions } from './utils'
+
+/** Shows the progress of the bulk jobs started from the action modals and refreshes the transactions once they finish */
+const BulkJobProgress = ({ dataSource }: { dataSource: "Bank" | "Debtor" }) => {
+
+    const [jobs] = useAtom(bankRecBulkJobsAtom)
+
+    return <>
+        {jobs.map(job => <BulkJobTracker key={job.jobId} job={job} dataSource={dataSource} />)}
+    </>
+}
+
+const BulkJobTracker = ({ job, dataSource }: { job: BulkJob, dataSource: "Bank" | "Debtor" }) => {
+
+    const [, setJobs] = useAtom(bankRecBulkJobsAtom)
+    const onReconcile = useRefreshUnreconciledTransactions(dataSource)
+    const { call: cancelJob } = useFrappePostCall('truebalance.apis.jobs.cancel_job')
+
+    const isFinished = useRef(false)
+
+    // Polled as well in case a realtime event is missed
+    const { data } = useFrappeGetCall<{ message: BulkJobState }>('truebalance.apis.jobs.get_job_status', {
+        job_id: job.jobId,
+        page_length: 1
+    }, `truebalance-job-status-${job.jobId}`, {
+        refreshInterval: 5000,
+        revalidateOnFocus: false
+    })
+
+    const onProgress = (state: BulkJobState) => {
+        if (isFinished.current) {
+            return
+        }
+
+        if (state.status === 'Queued' || state.status === 'Running') {
+            toast.loading(job.label, {
+                id: job.jobId,
+                description: state.cancel_requested ? _("Cancelling...") : _("{0} of {1} transactions", [String(state.processed), String(state.total)]),
+                action: state.cancel_requested ? undefined : {
+                    label: _("Cancel"),
+                    onClick: () => cancelJob({ job_id: job.jobId })
+                }
+            })
+            return
+        }
+
+        isFinished.current = true
+
+        const description = _("{0} succeeded, {1} failed", [String(state.succeeded ?? 0), String(state.failed ?? 0)])
+
+        if (state.status === 'Completed' && !state.failed) {
+            toast.success(job.label, { id: job.jobId, description, action: undefined, duration: 4000, closeButton: true })
+        } else if (state.status === 'Completed' || state.status === 'Cancelled') {
+            toast.warning(state.status === 'Cancelled' ? _("{0} cancelled", [job.label]) : job.label, { id: job.jobId, description, action: undefined, closeButton: true })
+        } else {
+            toast.error(job.label, { id: job.jobId, description: _("The job failed"), action: undefined, closeButton: true })
+        }
+
+        onReconcile(job.lastTransaction)
+        setJobs(jobs => jobs.filter(j => j.jobId !== job.jobId))
+    }
+
+    useFrappeEventListener('truebalance_job_progress', (event: BulkJobState) => {
+        if (event.job_id === job.jobId) {
+            onProgress(event)
+        }
+    })
+
+    useEffect(() => {
+        if (data?.message) {
+            onProgress(data.message)
+        }
+    }, [data])
+
+    return null
+}
+
+export default BulkJobProgress
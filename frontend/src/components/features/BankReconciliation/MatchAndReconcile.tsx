@@ -1,13 +1,12 @@
 import { useAtom, useAtomValue, useSetAtom } from "jotai"
 import { MissingFiltersBanner } from "./MissingFiltersBanner"
-import { bankRecRecordJournalEntryModalAtom, bankRecRecordPaymentModalAtom, bankRecSelectedTransactionAtom, bankRecTransferModalAtom, selectedBankAccountAtom, selectedPartyAtom } from "./bankRecAtoms"
+import { bankRecAutoMatchModalAtom, bankRecRecordJournalEntryModalAtom, bankRecRecordPaymentModalAtom, bankRecSelectedTransactionAtom, bankRecTransferModalAtom, selectedBankAccountAtom, selectedPartyAtom } from "./bankRecAtoms"
 import { H4 } from "@/components/ui/typography"
-import { useMemo, useState } from "react"
+import { useEffect, useMemo, useState } from "react"
 import { getCompanyCurrency } from "@/lib/company"
 import ErrorBanner from "@/components/ui/error-banner"
 import { Separator } from "@/components/ui/separator"
-import Fuse from 'fuse.js'
-import { LinkedPayment, UnreconciledTransaction, useGetRuleForTransaction, useGetUnreconciledTransactions, useGetVouchersForTransaction, useIsTransactionWithdrawal, useReconcileTransaction } from "./utils"
+import { InvoiceCombination, LinkedPayment, UnreconciledTransaction, useGetInvoiceCombinations, useGetMatchSuggestions, useGetRuleForTransaction, useGetUnreconciledTransactions, useGetVouchersForTransaction, useIsTransactionWithdrawal, useReconcileTransaction, useSearchUnreconciledTransactions, VOUCHER_AMOUNT_TOLERANCES } from "./utils"
 import { useDebounceValue } from 'usehooks-ts'
 import { Input } from "@/components/ui/input"
 import { ArrowDownRight, ArrowRightLeft, ArrowUpRight, BadgeCheck, ChevronDown, DollarSign, Landmark, Loader2, Receipt, Search, User, XCircle, ZapIcon } from "lucide-react"
@@ -30,6 +29,8 @@ import RecordPaymentModal from "./RecordPaymentModal"
 import { Card, CardAction, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import SelectedTransactionsTable from "./SelectedTransactionsTable"
 import MatchFilters from "./MatchFilters"
+import BulkJobProgress from "./BulkJobProgress"
+import AutoMatchModal from "./AutoMatchModal"
 
 // 1. DEFINE THE PROP INTERFACE
 interface MatchAndReconcileProps {
@@ -41,6 +42,7 @@ interface MatchAndReconcileProps {
 const MatchAndReconcile = ({ contentHeight, dataSource }: MatchAndReconcileProps) => {
     const selectedBank = useAtomValue(selectedBankAccountAtom)
     const selectedParty = useAtomValue(selectedPartyAtom)
+    const setAutoMatchModalOpen = useSetAtom(bankRecAutoMatchModalAtom)
 
     // Conditional requirement: for Bank source require a selected bank, for Debtor require a selected party
     if (dataSource === 'Bank' && !selectedBank) {
@@ -54,7 +56,12 @@ const MatchAndReconcile = ({ contentHeight, dataSource }: MatchAndReconcileProps
     return <>
         <div className={`flex items-start space-x-2`} >
             <div className="flex-1">
-                <H4 className="text-sm font-medium">{_("Unreconciled Transactions")}</H4>
+                <div className="flex items-center justify-between">
+                    <H4 className="text-sm font-medium">{_("Unreconciled Transactions")}</H4>
+                    <Button size="sm" variant="outline" onClick={() => setAutoMatchModalOpen(true)}>
+                        <BadgeCheck className="w-4 h-4" /> {_("Auto Match")}
+                    </Button>
+                </div>
                 {/* 3. PASS PROP DOWN */}
                 <UnreconciledTransactions contentHeight={contentHeight} dataSource={dataSource} />
             </div>
@@ -68,6 +75,8 @@ const MatchAndReconcile = ({ contentHeight, dataSource }: MatchAndReconcileProps
         <TransferModal />
         <BankEntryModal />
         <RecordPaymentModal />
+        <AutoMatchModal dataSource={dataSource} />
+        <BulkJobProgress dataSource={dataSource} />
     </>
 }
 
@@ -97,26 +106,19 @@ const UnreconciledTransactions = ({ contentHeight, dataSource }: { contentHeight
 
     const [search, setSearch] = useDebounceValue('', 500)
 
-    const searchIndex = useMemo(() => {
+    // Search is ranked on the server (with the type and amount filters applied there as well)
+    const { data: searchResults, error: searchError } = useSearchUnreconciledTransactions(dataSource, search, typeFilter, amountFilter.value)
 
-        if (!unreconciledTransactions) {
-            return null
-        }
-
-        return new Fuse(unreconciledTransactions.message, {
-            keys: ['description', 'reference_number'],
-            threshold: 0.5,
-            includeScore: true
-        })
-    }, [unreconciledTransactions])
+    // Suggested matches for the whole list, scored in one batch on the server
+    const { data: matchSuggestions } = useGetMatchSuggestions(dataSource)
 
     const results = useMemo(() => {
 
         let r = []
-        if (!searchIndex || !search) {
+        if (!search) {
             r = unreconciledTransactions?.message ?? []
         } else {
-            r = searchIndex.search(search).map((result) => result.item)
+            r = searchResults?.message ?? []
         }
 
         if (typeFilter !== 'All') {
@@ -144,7 +146,7 @@ const UnreconciledTransactions = ({ contentHeight, dataSource }: { contentHeight
 
         return r
 
-    }, [searchIndex, search, typeFilter, amountFilter.value, unreconciledTransactions?.message])
+    }, [search, searchResults?.message, typeFilter, amountFilter.value, unreconciledTransactions?.message])
 
     const selectedParty = useAtomValue(selectedPartyAtom)
     const selectedKey = bankAccount?.name ?? selectedParty ?? ''
@@ -228,11 +230,12 @@ const UnreconciledTransactions = ({ contentHeight, dataSource }: { contentHeight
         </div>
 
         {error && <ErrorBanner error={error} />}
+        {searchError && <ErrorBanner error={searchError} />}
 
         <Virtuoso
             data={results}
             itemContent={(_index, transaction) => (
-                <UnreconciledTransactionItem transaction={transaction} />
+                <UnreconciledTransactionItem transaction={transaction} suggestion={matchSuggestions?.message?.[transaction.name]?.[0]} />
             )}
             style={{ minHeight: Math.max(contentHeight - 80, 400) }}
             totalCount={results?.length}
@@ -241,7 +244,7 @@ const UnreconciledTransactions = ({ contentHeight, dataSource }: { contentHeight
     </div>
 }
 
-const UnreconciledTransactionItem = ({ transaction }: { transaction: UnreconciledTransaction }) => {
+const UnreconciledTransactionItem = ({ transaction, suggestion }: { transaction: UnreconciledTransaction, suggestion?: LinkedPayment }) => {
 
     const selectedBank = useAtomValue(selectedBankAccountAtom)
 
@@ -288,6 +291,12 @@ const UnreconciledTransactionItem = ({ transaction }: { transaction: Unreconcile
                             title={_("Matched by rule")}
                             className="text-xs py-0.5 px-1 rounded-sm bg-primary-foreground text-primary">
                             <ZapIcon className="w-4 h-4" /> {transaction.matched_rule}</Badge>}
+
+                        {suggestion?.is_suggested && <Badge
+                            variant='secondary'
+                            title={_("Suggested match")}
+                            className="text-xs py-0.5 px-1 rounded-sm bg-amber-100 text-amber-700">
+                            <BadgeCheck className="w-4 h-4" /> {_(suggestion.doctype)}: {suggestion.name}</Badge>}
                     </div>
                     <span className="text-sm">{transaction.description}</span>
                 </div>
@@ -626,7 +635,15 @@ const RuleAction = ({ transaction }: { transaction: UnreconciledTransaction }) =
 const VouchersForTransaction = ({ transaction, contentHeight, dataSource }: { transaction: UnreconciledTransaction, contentHeight: number, dataSource: "Bank" | "Debtor" }) => {
 
     // 12. PASS PROP TO CUSTOM HOOK
-    const { data: vouchers, isLoading, error } = useGetVouchersForTransaction(transaction, dataSource)
+    // Exact amounts first - the band is widened on demand
+    const [toleranceIndex, setToleranceIndex] = useState(0)
+
+    useEffect(() => {
+        setToleranceIndex(0)
+    }, [transaction.name])
+
+    const { data: vouchers, isLoading, error } = useGetVouchersForTransaction(transaction, dataSource, VOUCHER_AMOUNT_TOLERANCES[toleranceIndex])
+    const nextTolerance = toleranceIndex < VOUCHER_AMOUNT_TOLERANCES.length - 1 ? VOUCHER_AMOUNT_TOLERANCES[toleranceIndex + 1] : undefined
 
     const [selectedVouchers, setSelectedVouchers] = useState<LinkedPayment[]>([])
 
@@ -677,18 +694,24 @@ const VouchersForTransaction = ({ transaction, contentHeight, dataSource }: { tr
             <span>or</span>
             <Separator className="flex-1" />
         </div>
-        {vouchers?.message.length === 0 && <MissingFiltersBanner text={_("No vouchers found for this transaction")} className="min-h-[10vh]" />}
+        {vouchers?.message.length === 0 && <MissingFiltersBanner text={VOUCHER_AMOUNT_TOLERANCES[toleranceIndex] === 0 ? _("No vouchers found with the same amount") : _("No vouchers found for this transaction")} className="min-h-[10vh]" />}
 
-        <div className="flex items-center justify-end">
+        <div className="flex items-center justify-between">
+            {nextTolerance !== undefined ? <Button variant='link' size='sm' className="px-0" onClick={() => setToleranceIndex(index => index + 1)}>
+                {nextTolerance === null ? _("Show all vouchers") : _("Widen amount to ±{0}%", [String(nextTolerance)])}
+            </Button> : <span />}
             <Button disabled={selectedVouchers.length === 0 || loading} onClick={onReconcileSelected} variant={selectedVouchers.length > 0 ? 'default' : 'ghost'}>
                 {loading ? _('Reconciling...') : _('Reconcile Selected')}
             </Button>
         </div>
 
+        {dataSource === 'Debtor' && <InvoiceCombinations transaction={transaction} dataSource={dataSource} loading={loading}
+            onReconcile={(combination) => reconcileTransaction(transaction, combination.vouchers)} />}
+
         <Virtuoso
             data={vouchers?.message}
-            itemContent={(index, voucher) => (
-                <VoucherItem voucher={voucher} index={index} dataSource={dataSource} isSelected={selectedVouchers.some(v => v.name === voucher.name && v.doctype === voucher.doctype)} onToggle={() => toggleVoucherSelection(voucher)} />
+            itemContent={(_index, voucher) => (
+                <VoucherItem voucher={voucher} dataSource={dataSource} isSelected={selectedVouchers.some(v => v.name === voucher.name && v.doctype === voucher.doctype)} onToggle={() => toggleVoucherSelection(voucher)} />
             )}
             style={{ height: contentHeight }}
             totalCount={vouchers?.message.length}
@@ -696,36 +719,46 @@ const VouchersForTransaction = ({ transaction, contentHeight, dataSource }: { tr
     </div >
 }
 
-// FIX: UPDATE VoucherItem SIGNATURE AND PASS dataSource TO HOOK
-const VoucherItem = ({ voucher, index, dataSource, isSelected, onToggle }: { voucher: LinkedPayment, index: number, dataSource: "Bank" | "Debtor", isSelected?: boolean, onToggle?: () => void }) => {
-
-    const selectedBank = useAtomValue(selectedBankAccountAtom)
-    const selectedParty = useAtomValue(selectedPartyAtom)
-    const selectedTransaction = useAtomValue(bankRecSelectedTransactionAtom(selectedBank?.name ?? selectedParty ?? ''))
-
-    const { amountMatches, postingDateMatches, referenceDateMatches, referenceMatchesFull, referenceMatchesPartial, isSuggested } = useMemo(() => {
-
-        const transaction = selectedTransaction?.[0]
-
-        // We need to check if the following details match:
-        // Amount
-        // Date
-        // Reference/Description: Full or partial
-        // Whether this is suggested or not - depends on the above scores
+/** Invoices that together add up to the transaction amount - for payments that settle several invoices at once */
+const InvoiceCombinations = ({ transaction, dataSource, loading, onReconcile }: { transaction: UnreconciledTransaction, dataSource: "Bank" | "Debtor", loading: boolean, onReconcile: (combination: InvoiceCombination) => void }) => {
 
-        const amountMatches = voucher.paid_amount === transaction?.unallocated_amount
-        const postingDateMatches = voucher.posting_date === transaction?.date
-        const referenceDateMatches = voucher.reference_date === transaction?.date
-        const referenceMatchesFull = voucher.reference_no === transaction?.reference_number || voucher.reference_no === transaction?.description
+    const { data: combinations } = useGetInvoiceCombinations(transaction, dataSource)
 
-        const referenceMatchesPartial = transaction?.reference_number?.includes(voucher.reference_no) || transaction?.description?.includes(voucher.reference_no)
+    if (!combinations?.message.length) {
+        return null
+    }
 
+    return <div className="flex flex-col gap-2">
+        <span className="text-sm font-medium">{_("Invoice Combinations")}</span>
+        {combinations.message.map((combination) => <div key={combination.vouchers.map(v => v.name).join(',')}
+            className="border rounded-md p-2 flex items-center justify-between gap-2 border-amber-500 bg-amber-50/50">
+            <div className="flex flex-wrap gap-1">
+                {combination.vouchers.map((voucher) => <Badge key={voucher.name} variant='secondary' className="text-xs rounded-sm" title={formatCurrency(voucher.paid_amount, voucher.currency)}>
+                    {voucher.name}
+                </Badge>)}
+            </div>
+            <div className="flex items-center gap-2">
+                <span className="font-mono text-sm font-semibold">{formatCurrency(combination.total, combination.vouchers[0]?.currency)}</span>
+                <Button size="sm" disabled={loading} onClick={() => onReconcile(combination)}>{_("Reconcile")}</Button>
+            </div>
+        </div>)}
+    </div>
+}
 
-        const isSuggested = amountMatches && (postingDateMatches || referenceDateMatches || referenceMatchesPartial) && index === 0
+// FIX: UPDATE VoucherItem SIGNATURE AND PASS dataSource TO HOOK
+const VoucherItem = ({ voucher, dataSource, isSelected, onToggle }: { voucher: LinkedPayment, dataSource: "Bank" | "Debtor", isSelected?: boolean, onToggle?: () => void }) => {
 
-        return { isSelected: false, amountMatches, postingDateMatches, referenceDateMatches, referenceMatchesFull, referenceMatchesPartial, isSuggested: isSuggested }
+    const selectedBank = useAtomValue(selectedBankAccountAtom)
+    const selectedParty = useAtomValue(selectedPartyAtom)
+    const selectedTransaction = useAtomValue(bankRecSelectedTransactionAtom(selectedBank?.name ?? selectedParty ?? ''))
 
-    }, [voucher, selectedTransaction, index])
+    // Match flags are computed by the scoring engine on the server (truebalance/matching/scoring.py)
+    const amountMatches = !!voucher.amount_matches
+    const postingDateMatches = !!voucher.posting_date_matches
+    const referenceDateMatches = !!voucher.reference_date_matches
+    const referenceMatchesFull = !!voucher.reference_matches_full
+    const referenceMatchesPartial = !!voucher.reference_matches_partial
+    const isSuggested = !!voucher.is_suggested
 
     // FIX: Pass dataSource to useReconcileTransaction hook
     const { reconcileTransaction, loading } = useReconcileTransaction(dataSource)
@@ -2,7 +2,7 @@ import { atom, useAtom, useAtomValue, useSetAtom } from "jotai"
 import { bankRecRecordPaymentModalAtom, bankRecSelectedTransactionAtom, bankRecUnreconcileModalAtom, SelectedBank, selectedBankAccountAtom, selectedPartyAtom } from "./bankRecAtoms"
 import { Dialog, DialogContent, DialogTitle, DialogDescription, DialogHeader, DialogFooter, DialogClose, DialogTrigger } from "@/components/ui/dialog"
 import _ from "@/lib/translate"
-import { UnreconciledTransaction, useGetRuleForTransaction, useRefreshUnreconciledTransactions } from "./utils"
+import { UnreconciledTransaction, useGetRuleForTransaction, useRefreshUnreconciledTransactions, useIdempotencyKey, useTrackBulkJob } from "./utils"
 import { useFieldArray, useForm, useFormContext, useWatch } from "react-hook-form"
 import { getCompanyCostCenter, getCompanyCurrency } from "@/lib/company"
 import { FrappeConfig, FrappeContext, useFrappeGetCall, useFrappePostCall } from "frappe-react-sdk"
@@ -92,23 +92,22 @@ const BulkPaymentEntryForm = ({ transactions }: { transactions: UnreconciledTran
 
     const { call: createPaymentEntry, loading, error } = useFrappePostCall('truebalance.apis.bank_reconciliation.create_bulk_payment_entry_and_reconcile')
 
-    const selectedParty = useAtomValue(selectedPartyAtom)
-    const dataSource = selectedParty ? 'Debtor' : 'Bank'
-    const onReconcile = useRefreshUnreconciledTransactions(dataSource)
+    const trackBulkJob = useTrackBulkJob()
+
+    const { idempotencyKey, renewIdempotencyKey } = useIdempotencyKey()
 
     const onSubmit = (data: { party_type: PaymentEntry['party_type'], party: PaymentEntry['party'], account: string, mode_of_payment: PaymentEntry['mode_of_payment'] }) => {
 
         createPaymentEntry({
+            idempotency_key: idempotencyKey,
             bank_transaction_names: transactions.map((transaction) => transaction.name),
             party_type: data.party_type,
             party: data.party,
             account: data.account
-        }).then(() => {
-            toast.success(_("Payment Recorded"), {
-                duration: 4000,
-                closeButton: true,
-            })
-            onReconcile(transactions[transactions.length - 1])
+        }).then((res: { message: string }) => {
+            renewIdempotencyKey()
+            // Payments are created in the background - progress is shown until the job finishes
+            trackBulkJob(res.message, _("Recording Payments"), transactions[transactions.length - 1])
             setIsOpen(false)
         })
     }
@@ -294,15 +293,19 @@ const PaymentEntryForm = ({ selectedTransaction, selectedBankAccount }: { select
 
     const setBankRecUnreconcileModalAtom = useSetAtom(bankRecUnreconcileModalAtom)
 
+    const { idempotencyKey, renewIdempotencyKey } = useIdempotencyKey()
+
     const onSubmit = (data: PaymentEntry) => {
 
         createPaymentEntry({
+            idempotency_key: idempotencyKey,
             bank_transaction_name: selectedTransaction.name,
             payment_entry_doc: {
                 ...data,
                 custom_remarks: data.remarks ? true : false
             }
         }).then(() => {
+            renewIdempotencyKey()
             toast.success(_("Payment Entry Created"), {
                 duration: 4000,
                 closeButton: true,
@@ -5,9 +5,10 @@ import { Skeleton } from "@/components/ui/skeleton"
 import { Badge } from "@/components/ui/badge"
 import _ from "@/lib/translate"
 import { MintBankTransactionRule } from "@/types/Mint/MintBankTransactionRule"
-import { FrappeConfig, FrappeContext, useFrappeGetCall, useFrappeGetDocList, useFrappePostCall } from "frappe-react-sdk"
+import { Progress } from "@/components/ui/progress"
+import { FrappeConfig, FrappeContext, useFrappeEventListener, useFrappeGetCall, useFrappeGetDocList, useFrappePostCall } from "frappe-react-sdk"
 import { ArrowDownRight, ArrowDownUp, ArrowLeftIcon, ArrowUpRight, MoreVertical, Trash2, GripVertical, Play, RefreshCw, ZapIcon } from "lucide-react"
-import { useContext, useState } from "react"
+import { useContext, useEffect, useState } from "react"
 import CreateNewRule from "./CreateNewRule"
 import EditRule from "./EditRule"
 import { toast } from "sonner"
@@ -112,7 +113,7 @@ const RuleList = ({ setSelectedRule, setIsNewRule }: { setSelectedRule: (rule: s
             await runRuleEvaluation({
                 force_evaluate: forceEvaluate
             })
-            toast.success(forceEvaluate ? _("Rules evaluation started") : _("Rules evaluation completed"))
+            toast.success(_("Rules evaluation started"))
         } catch (error) {
             toast.error(_("Failed to run rules evaluation"))
             console.error("Error running rules evaluation:", error)
@@ -182,6 +183,8 @@ const RuleList = ({ setSelectedRule, setIsNewRule }: { setSelectedRule: (rule: s
                     </DropdownMenu>}
                 </div>
 
+                <RuleEvaluationProgress />
+
                 {isLoading && <div className="flex flex-col gap-2">
                     <Skeleton className="w-full h-10" />
                     <Skeleton className="w-full h-10" />
@@ -238,6 +241,47 @@ const RuleList = ({ setSelectedRule, setIsNewRule }: { setSelectedRule: (rule: s
     )
 }
 
+interface RuleEvaluationProgressEvent {
+    status: "Running" | "Completed",
+    processed: number,
+    total: number,
+    matched: number,
+    force_evaluate: boolean
+}
+
+const RuleEvaluationProgress = () => {
+
+    const { data } = useFrappeGetCall<{ message: RuleEvaluationProgressEvent | null }>('truebalance.apis.rules.get_rule_evaluation_progress', undefined, undefined, {
+        revalidateOnFocus: false
+    })
+
+    const [progress, setProgress] = useState<RuleEvaluationProgressEvent | null>(null)
+
+    useEffect(() => {
+        if (data?.message) {
+            setProgress(data.message)
+        }
+    }, [data])
+
+    useFrappeEventListener('truebalance_rule_evaluation_progress', (event: RuleEvaluationProgressEvent) => {
+        setProgress(event)
+    })
+
+    if (!progress || !progress.total) {
+        return null
+    }
+
+    const percent = Math.min(100, Math.round((progress.processed / progress.total) * 100))
+
+    return <div className="flex flex-col gap-1.5 mb-4">
+        <div className="flex justify-between items-center text-xs text-muted-foreground">
+            <span>{progress.status === "Completed" ? _("Rules evaluation completed") : _("Evaluating rules...")}</span>
+            <span className="font-mono">{_("{0} of {1} transactions, {2} matched", [progress.processed.toString(), progress.total.toString(), progress.matched.toString()])}</span>
+        </div>
+        <Progress value={percent} />
+    </div>
+}
+
 const AutoRunRuleItem = () => {
 
     const { db } = useContext(FrappeContext) as FrappeConfig
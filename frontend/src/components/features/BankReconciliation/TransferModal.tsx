@@ -2,7 +2,7 @@ import { useAtom, useAtomValue, useSetAtom } from 'jotai'
 import { bankRecSelectedTransactionAtom, bankRecTransferModalAtom, bankRecUnreconcileModalAtom, SelectedBank, selectedBankAccountAtom, selectedPartyAtom } from './bankRecAtoms'
 import { Dialog, DialogContent, DialogHeader, DialogFooter, DialogClose, DialogTitle, DialogDescription } from '@/components/ui/dialog'
 import _ from '@/lib/translate'
-import { UnreconciledTransaction, useGetBankAccounts, useGetRuleForTransaction, useRefreshUnreconciledTransactions } from './utils'
+import { UnreconciledTransaction, useGetBankAccounts, useGetRuleForTransaction, useRefreshUnreconciledTransactions, useIdempotencyKey, useTrackBulkJob } from './utils'
 import { Button } from '@/components/ui/button'
 import SelectedTransactionDetails from './SelectedTransactionDetails'
 import { PaymentEntry } from '@/types/Accounts/PaymentEntry'
@@ -75,21 +75,20 @@ const BulkInternalTransferForm = ({ transactions }: { transactions: Unreconciled
 
     const { call: createPaymentEntry, loading, error } = useFrappePostCall('truebalance.apis.bank_reconciliation.create_bulk_internal_transfer')
 
-    const selectedParty = useAtomValue(selectedPartyAtom)
-    const dataSource = selectedParty ? 'Debtor' : 'Bank'
-    const onReconcile = useRefreshUnreconciledTransactions(dataSource)
+    const trackBulkJob = useTrackBulkJob()
+
+    const { idempotencyKey, renewIdempotencyKey } = useIdempotencyKey()
 
     const onSubmit = (data: { bank_account: string }) => {
 
         createPaymentEntry({
+            idempotency_key: idempotencyKey,
             bank_transaction_names: transactions.map((transaction) => transaction.name),
             bank_account: data.bank_account
-        }).then(() => {
-            toast.success(_("Transfer Recorded"), {
-                duration: 4000,
-                closeButton: true,
-            })
-            onReconcile(transactions[transactions.length - 1])
+        }).then((res: { message: string }) => {
+            renewIdempotencyKey()
+            // Transfers are created in the background - progress is shown until the job finishes
+            trackBulkJob(res.message, _("Recording Transfers"), transactions[transactions.length - 1])
             setIsOpen(false)
         })
 
@@ -169,15 +168,19 @@ const InternalTransferForm = ({ selectedBankAccount, selectedTransaction }: { se
 
     const setBankRecUnreconcileModalAtom = useSetAtom(bankRecUnreconcileModalAtom)
 
+    const { idempotencyKey, renewIdempotencyKey } = useIdempotencyKey()
+
     const onSubmit = (data: InternalTransferFormFields) => {
 
         createPaymentEntry({
+            idempotency_key: idempotencyKey,
             bank_transaction_name: selectedTransaction.name,
             ...data,
             custom_remarks: data.remarks ? true : false,
             // Pass this to reconcile both at the same time
             mirror_transaction_name: data.mirror_transaction_name
         }).then(() => {
+            renewIdempotencyKey()
             toast.success(_("Transfer Recorded"), {
                 duration: 4000,
                 closeButton: true,
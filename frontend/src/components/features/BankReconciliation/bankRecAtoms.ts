@@ -36,6 +36,17 @@ export const bankRecSelectedTransactionAtom = atomFamily((_id: string) => {
 export const bankRecTransferModalAtom = atom(false)
 export const bankRecRecordPaymentModalAtom = atom(false)
 export const bankRecRecordJournalEntryModalAtom = atom(false)
+export const bankRecAutoMatchModalAtom = atom(false)
+
+/** Bulk create-and-reconcile jobs running in the background - tracked until they finish */
+export interface BulkJob {
+    jobId: string,
+    label: string,
+    /** Selected once the job finishes so that the next unreconciled transaction is picked */
+    lastTransaction: UnreconciledTransaction
+}
+
+export const bankRecBulkJobsAtom = atom<BulkJob[]>([])
 
 export const bankRecUnreconcileModalAtom = atom<string>('')
 
@@ -1,17 +1,28 @@
-import { bankRecDateAtom, bankRecMatchFilters, bankRecSelectedTransactionAtom, bankRecUnreconcileModalAtom, SelectedBank, selectedBankAccountAtom, selectedPartyAtom } from './bankRecAtoms'
+import { bankRecBulkJobsAtom, bankRecDateAtom, bankRecMatchFilters, bankRecSelectedTransactionAtom, bankRecUnreconcileModalAtom, SelectedBank, selectedBankAccountAtom, selectedPartyAtom } from './bankRecAtoms'
 import { useAtomValue, useSetAtom } from 'jotai'
-import { useMemo } from 'react'
-import { useFrappeGetCall, useFrappeGetDoc, useFrappePostCall, useSWRConfig } from 'frappe-react-sdk'
+import { useCallback, useContext, useMemo, useState } from 'react'
+import { FrappeConfig, FrappeContext, useFrappeGetCall, useFrappeGetDoc, useFrappePostCall, useSWRConfig } from 'frappe-react-sdk'
 import { BankTransaction } from '@/types/Accounts/BankTransaction'
 import { BankAccount } from '@/types/Accounts/BankAccount'
 import dayjs from 'dayjs'
 import { toast } from 'sonner'
 import { BANK_LOGOS } from './logos'
 import { getErrorMessage } from '@/lib/frappe'
+import { CompactRows, decodeCompactRows } from '@/lib/utils'
 import { useCurrentCompany } from '@/hooks/useCurrentCompany'
 import _ from '@/lib/translate'
 import { MintBankTransactionRule } from '@/types/Mint/MintBankTransactionRule'
 
+/**
+ * Decode the list of rows in a response requested with `response_format: 'compact'`
+ */
+const useDecodedRows = <T,>(response: ReturnType<typeof useFrappeGetCall<{ message: CompactRows | T[] }>>) => {
+
+    const data = useMemo(() => response.data ? { message: decodeCompactRows<T>(response.data.message) } : undefined, [response.data])
+
+    return { ...response, data }
+}
+
 // >>> MODIFIED: ADD dataSource PARAMETER
 export const useGetAccountOpeningBalance = (dataSource: "Bank" | "Debtor") => {
 
@@ -94,15 +105,16 @@ export const useGetUnreconciledTransactions = (dataSource: "Bank" | "Debtor") =>
 
     if (!shouldFetch) {
         // Return a disabled SWR response so callers always get a consistent shape (includes mutate)
-        return useFrappeGetCall<{ message: UnreconciledTransaction[] }>('truebalance.apis.transactions.get_bank_transactions', {
+        return useDecodedRows<UnreconciledTransaction>(useFrappeGetCall<{ message: CompactRows | UnreconciledTransaction[] }>('truebalance.apis.transactions.get_bank_transactions', {
             bank_account: accountId,
             from_date: dates.fromDate,
             to_date: dates.toDate,
-            data_source: dataSource
+            data_source: dataSource,
+            response_format: 'compact'
         }, null, {
             revalidateOnFocus: false,
             revalidateIfStale: false
-        });
+        }));
     }
 
     // SWR Key MUST change when any input changes to trigger a new fetch
@@ -110,20 +122,150 @@ export const useGetUnreconciledTransactions = (dataSource: "Bank" | "Debtor") =>
 
     console.debug('[useGetUnreconciledTransactions] swrKey:', swrKey)
 
-    return useFrappeGetCall<{ message: UnreconciledTransaction[] }>('truebalance.apis.transactions.get_bank_transactions', {
+    return useDecodedRows<UnreconciledTransaction>(useFrappeGetCall<{ message: CompactRows | UnreconciledTransaction[] }>('truebalance.apis.transactions.get_bank_transactions', {
         // The Python API expects the target ID (Bank or Party) in 'bank_account'
         bank_account: accountId,
         from_date: dates.fromDate,
         to_date: dates.toDate,
-        data_source: dataSource
+        data_source: dataSource,
+        response_format: 'compact'
     }, swrKey, {
         revalidateOnFocus: false,
         revalidateIfStale: false
-    });
+    }));
+}
+
+interface TransactionChanges {
+    reset: boolean,
+    transactions: CompactRows | UnreconciledTransaction[],
+    removed: string[],
+    sync_token: string | null
+}
+
+/** Sync token of the last delta sync for each unreconciled transactions SWR key */
+const unreconciledSyncTokens = new Map<string, string>()
+
+/**
+ * Returns a function that updates the cached list of unreconciled transactions in place
+ * with only the transactions that changed since the last sync (instead of refetching the whole period).
+ * The first sync of a list (or one with an expired token) fetches the full list.
+ */
+export const useSyncUnreconciledTransactions = (dataSource: "Bank" | "Debtor") => {
+    const bankAccount = useAtomValue(selectedBankAccountAtom);
+    const partyId = useAtomValue(selectedPartyAtom);
+    const dates = useAtomValue(bankRecDateAtom);
+
+    const { call } = useContext(FrappeContext) as FrappeConfig
+    const { mutate } = useSWRConfig()
+
+    const accountId = dataSource === 'Bank' ? bankAccount?.name : partyId
+
+    return useCallback(() => {
+        const swrKey = `bank-reco-unreco-${accountId}-${dates.fromDate}-${dates.toDate}-${dataSource}`
+
+        return mutate(swrKey, async (current?: { message: CompactRows | UnreconciledTransaction[] }) => {
+            const { message: changes } = await call.get<{ message: TransactionChanges }>('truebalance.apis.transactions.get_bank_transaction_changes', {
+                bank_account: accountId,
+                from_date: dates.fromDate,
+                to_date: dates.toDate,
+                data_source: dataSource,
+                sync_token: current ? unreconciledSyncTokens.get(swrKey) : undefined,
+                response_format: 'compact'
+            })
+
+            if (changes.sync_token) {
+                unreconciledSyncTokens.set(swrKey, changes.sync_token)
+            }
+
+            const changed = decodeCompactRows<UnreconciledTransaction>(changes.transactions)
+
+            if (changes.reset || !current) {
+                return { message: changed }
+            }
+
+            return { message: applyTransactionChanges(decodeCompactRows<UnreconciledTransaction>(current.message), changed, changes.removed) }
+        }, { revalidate: false })
+            // Fall back to refetching the whole list
+            .catch(() => mutate(swrKey).then(res => res ? { message: decodeCompactRows<UnreconciledTransaction>(res.message) } : res))
+    }, [accountId, dates.fromDate, dates.toDate, dataSource, call, mutate])
+}
+
+/**
+ * Patch a list of transactions (ordered by date and name) with changed and removed transactions
+ */
+const applyTransactionChanges = (transactions: UnreconciledTransaction[], changed: UnreconciledTransaction[], removed: string[]) => {
+
+    const replaced = new Set([...removed, ...changed.map(t => t.name)])
+
+    return [...transactions.filter(t => !replaced.has(t.name)), ...changed]
+        .sort((a, b) => a.date === b.date ? a.name.localeCompare(b.name) : a.date < b.date ? -1 : 1)
+}
+
+/**
+ * Ranked server side search over the description and reference of unreconciled transactions.
+ * Does not fetch anything while the search is empty.
+ */
+export const useSearchUnreconciledTransactions = (dataSource: "Bank" | "Debtor", search: string, typeFilter: string, amount: number) => {
+    const bankAccount = useAtomValue(selectedBankAccountAtom);
+    const partyId = useAtomValue(selectedPartyAtom);
+    const dates = useAtomValue(bankRecDateAtom);
+
+    const accountId = dataSource === 'Bank' ? bankAccount?.name : partyId
+
+    const shouldFetch = !!search && !!accountId && !!dates.fromDate && !!dates.toDate
+
+    return useFrappeGetCall<{ message: UnreconciledTransaction[] }>('truebalance.apis.transaction_search.search_transactions', {
+        search,
+        bank_account: accountId,
+        from_date: dates.fromDate,
+        to_date: dates.toDate,
+        data_source: dataSource,
+        type_filter: typeFilter !== 'All' ? typeFilter : undefined,
+        amount: amount > 0 ? amount : undefined
+    }, shouldFetch ? `bank-reco-unreco-search-${accountId}-${dates.fromDate}-${dates.toDate}-${dataSource}-${typeFilter}-${amount}-${search}` : null, {
+        revalidateOnFocus: false,
+        keepPreviousData: true
+    })
+}
+
+export interface ReconciliationSummary {
+    /** Bank account, or party for the Debtor data source */
+    account: string,
+    total_count: number,
+    unreconciled_count: number,
+    unreconciled_deposit_count: number,
+    unreconciled_deposit_amount: number,
+    unreconciled_withdrawal_count: number,
+    unreconciled_withdrawal_amount: number,
+    rule_matched_count: number,
+    rule_unmatched_count: number,
+    oldest_unreconciled_date: string | null
+}
+
+/**
+ * Counts, sums and the oldest unreconciled date per bank account (or party) for the selected period - computed on the server
+ */
+export const useGetReconciliationSummary = (dataSource: "Bank" | "Debtor", company?: string) => {
+    const dates = useAtomValue(bankRecDateAtom);
+
+    const shouldFetch = !!company && !!dates.fromDate && !!dates.toDate
+
+    return useFrappeGetCall<{ message: ReconciliationSummary[] }>('truebalance.apis.reconciliation_summary.get_reconciliation_summary', {
+        company,
+        from_date: dates.fromDate,
+        to_date: dates.toDate,
+        data_source: dataSource
+    }, shouldFetch ? getReconciliationSummaryKey(dataSource, company, dates.fromDate, dates.toDate) : null, {
+        revalidateOnFocus: false
+    })
+}
+
+const getReconciliationSummaryKey = (dataSource: "Bank" | "Debtor", company: string | undefined, fromDate: string, toDate: string) => {
+    return `bank-reconciliation-summary-${company}-${fromDate}-${toDate}-${dataSource}`
 }
 
 export interface LinkedPayment {
-    rank: number,
+    rank?: number,
     doctype: string,
     name: string,
     paid_amount: number,
@@ -132,7 +274,148 @@ export interface LinkedPayment {
     posting_date: string,
     party_type?: string,
     party?: string,
-    currency: string
+    currency: string,
+    /** Match score (0 - 1) computed on the server - vouchers are sorted by it */
+    score?: number,
+    score_breakdown?: {
+        amount: number,
+        date: number,
+        reference: number,
+        party: number
+    },
+    amount_matches?: boolean,
+    posting_date_matches?: boolean,
+    reference_date_matches?: boolean,
+    reference_matches_full?: boolean,
+    reference_matches_partial?: boolean,
+    is_suggested?: boolean
+}
+
+/** Number of best matching vouchers shown for a transaction */
+export const VOUCHERS_TOP_N = 50
+
+/**
+ * Amount tolerance bands (percent of the unallocated amount) the vouchers of a transaction are searched in -
+ * exact amounts first, widened on demand. `null` fetches all vouchers of the period.
+ */
+export const VOUCHER_AMOUNT_TOLERANCES: (number | null)[] = [0, 1, 5, null]
+
+/** Number of suggested vouchers fetched for each transaction in the list */
+export const MATCH_SUGGESTIONS_TOP_K = 3
+
+/**
+ * Suggested vouchers for all unreconciled transactions in the period (best match first), keyed by transaction name.
+ * Scored on the server in a single batch, so the whole list can show its suggestions at once.
+ */
+export const useGetMatchSuggestions = (dataSource: "Bank" | "Debtor") => {
+    const bankAccount = useAtomValue(selectedBankAccountAtom);
+    const partyId = useAtomValue(selectedPartyAtom);
+    const dates = useAtomValue(bankRecDateAtom);
+    const matchFilters = useAtomValue(bankRecMatchFilters)
+
+    const accountId = dataSource === 'Bank' ? bankAccount?.name : partyId
+    const shouldFetch = !!accountId && !!dates.fromDate && !!dates.toDate
+
+    return useFrappeGetCall<{ message: Record<string, LinkedPayment[]> }>('truebalance.apis.reconciliation.get_match_suggestions', {
+        bank_account: accountId,
+        from_date: dates.fromDate,
+        to_date: dates.toDate,
+        document_types: matchFilters ?? ['payment_entry', 'journal_entry'],
+        data_source: dataSource,
+        top_k: MATCH_SUGGESTIONS_TOP_K
+    }, shouldFetch ? getMatchSuggestionsKey(dataSource, accountId, dates.fromDate, dates.toDate, matchFilters) : null, {
+        revalidateOnFocus: false
+    })
+}
+
+const getMatchSuggestionsKey = (dataSource: "Bank" | "Debtor", accountId: string | undefined, fromDate: string, toDate: string, matchFilters: string[]) => {
+    return `bank-reconciliation-match-suggestions-${accountId}-${fromDate}-${toDate}-${matchFilters.join(',')}-${dataSource}`
+}
+
+export interface AutoMatchProposal {
+    transaction: string,
+    company: string,
+    date: string,
+    description?: string,
+    reference_number?: string,
+    unallocated_amount: number,
+    currency?: string,
+    voucher: LinkedPayment,
+    allocated_amount: number
+}
+
+/**
+ * Conflict free match proposals for the unreconciled transactions in the period - every transaction and voucher is proposed at most once
+ */
+export const useGetAutoMatchProposals = (dataSource: "Bank" | "Debtor", enabled: boolean = true) => {
+    const bankAccount = useAtomValue(selectedBankAccountAtom);
+    const partyId = useAtomValue(selectedPartyAtom);
+    const dates = useAtomValue(bankRecDateAtom);
+    const matchFilters = useAtomValue(bankRecMatchFilters)
+
+    const accountId = dataSource === 'Bank' ? bankAccount?.name : partyId
+    const shouldFetch = enabled && !!accountId && !!dates.fromDate && !!dates.toDate
+
+    return useFrappeGetCall<{ message: AutoMatchProposal[] }>('truebalance.apis.reconciliation.get_auto_match_proposals', {
+        bank_account: accountId,
+        from_date: dates.fromDate,
+        to_date: dates.toDate,
+        document_types: matchFilters ?? ['payment_entry', 'journal_entry'],
+        data_source: dataSource
+    }, shouldFetch ? `bank-reconciliation-auto-match-${accountId}-${dates.fromDate}-${dates.toDate}-${matchFilters.join(',')}-${dataSource}` : null, {
+        revalidateOnFocus: false,
+        revalidateIfStale: false
+    })
+}
+
+export interface BulkReconciliationResult {
+    bank_transaction_name: string,
+    status: 'Reconciled' | 'Failed',
+    message: string | null,
+    unallocated_amount: number | null
+}
+
+/**
+ * Accept auto match proposals in bulk - then refresh the unreconciled transactions, balance, summary and suggestions
+ */
+export const useAcceptAutoMatchProposals = (dataSource: "Bank" | "Debtor") => {
+    const bankAccount = useAtomValue(selectedBankAccountAtom);
+    const partyId = useAtomValue(selectedPartyAtom);
+    const dates = useAtomValue(bankRecDateAtom);
+    const matchFilters = useAtomValue(bankRecMatchFilters)
+
+    const accountId = dataSource === 'Bank' ? bankAccount?.name : partyId
+
+    const { call, loading, error } = useFrappePostCall<{ message: BulkReconciliationResult[] }>('truebalance.apis.reconciliation.accept_auto_match_proposals')
+    const syncUnreconciledTransactions = useSyncUnreconciledTransactions(dataSource)
+    const { mutate } = useSWRConfig()
+
+    const acceptProposals = (proposals: AutoMatchProposal[]) => {
+        return call({
+            proposals: proposals.map(proposal => ({
+                transaction: proposal.transaction,
+                payment_doctype: proposal.voucher.doctype,
+                payment_name: proposal.voucher.name,
+                amount: proposal.allocated_amount
+            })),
+            data_source: dataSource
+        }).then((res) => {
+            syncUnreconciledTransactions()
+            mutate(`bank-reconciliation-account-closing-balance-${bankAccount?.name}-${dates.toDate}`)
+            mutate(getReconciliationSummaryKey(dataSource, proposals[0]?.company, dates.fromDate, dates.toDate))
+            mutate(getMatchSuggestionsKey(dataSource, accountId, dates.fromDate, dates.toDate, matchFilters))
+            const failed = res.message.filter(result => result.status === 'Failed')
+            toast.success(_("Reconciled {0} transactions", [String(res.message.length - failed.length)]))
+            if (failed.length > 0) {
+                toast.error(_("{0} transactions could not be reconciled", [String(failed.length)]), {
+                    description: failed.slice(0, 3).map(result => `${result.bank_transaction_name}: ${result.message}`).join('\n')
+                })
+            }
+            return res
+        })
+    }
+
+    return { acceptProposals, loading, error }
 }
 
 // >>> MODIFIED: ADD dataSource PARAMETER
@@ -159,41 +442,162 @@ export const useGetBankTransactions = (dataSource: "Bank" | "Debtor") => { // <<
 
     if (!shouldFetch) {
         // Return a disabled SWR response so callers always get a consistent shape (includes mutate)
-        return useFrappeGetCall<{ message: BankTransaction[] }>('truebalance.apis.transactions.get_bank_transactions', {
+        return useDecodedRows<BankTransaction>(useFrappeGetCall<{ message: CompactRows | BankTransaction[] }>('truebalance.apis.transactions.get_bank_transactions', {
             bank_account: accountId,
             from_date: dates.fromDate,
             to_date: dates.toDate,
             all_transactions: true,
-            data_source: dataSource
-        }, null, { revalidateOnFocus: false, revalidateIfStale: false });
+            data_source: dataSource,
+            response_format: 'compact'
+        }, null, { revalidateOnFocus: false, revalidateIfStale: false }));
     }
 
     const swrKey = `bank-reconciliation-bank-transactions-${accountId}-${dates.fromDate}-${dates.toDate}-${dataSource}`;
 
-    return useFrappeGetCall<{ message: BankTransaction[] }>('truebalance.apis.transactions.get_bank_transactions', {
+    return useDecodedRows<BankTransaction>(useFrappeGetCall<{ message: CompactRows | BankTransaction[] }>('truebalance.apis.transactions.get_bank_transactions', {
         bank_account: accountId,
         from_date: dates.fromDate,
         to_date: dates.toDate,
         all_transactions: true,
-        data_source: dataSource // <<< PASS DATA SOURCE
-    }, swrKey);
+        data_source: dataSource, // <<< PASS DATA SOURCE
+        response_format: 'compact'
+    }, swrKey));
 }
 
 
 // >>> MODIFIED: ADD dataSource PARAMETER
-export const useGetVouchersForTransaction = (transaction: UnreconciledTransaction, dataSource: "Bank" | "Debtor") => { // <<< ACCEPT DATA SOURCE
+export const useGetVouchersForTransaction = (transaction: UnreconciledTransaction, dataSource: "Bank" | "Debtor", amountTolerance: number | null = null) => { // <<< ACCEPT DATA SOURCE
 
     const dates = useAtomValue(bankRecDateAtom)
     const matchFilters = useAtomValue(bankRecMatchFilters)
 
-    return useFrappeGetCall<{ message: LinkedPayment[] }>('truebalance.apis.reconciliation.get_vouchers_for_reco', {
+    return useDecodedRows<LinkedPayment>(useFrappeGetCall<{ message: CompactRows | LinkedPayment[] }>('truebalance.apis.reconciliation.get_vouchers_for_reco', {
         bank_transaction_name: transaction.name,
         document_types: matchFilters ?? ['payment_entry', 'journal_entry'],
         from_date: dates.fromDate,
         to_date: dates.toDate,
         filter_by_reference_date: 0,
-        data_source: dataSource // <<< PASS DATA SOURCE
-    }, `bank-reconciliation-vouchers-${transaction.name}-${dates.fromDate}-${dates.toDate}-${matchFilters.join(',')}-${dataSource}`, { // <<< ADD dataSource to SWR key
+        data_source: dataSource, // <<< PASS DATA SOURCE
+        response_format: 'compact',
+        top_n: VOUCHERS_TOP_N,
+        ...(amountTolerance !== null ? { amount_tolerance: amountTolerance, tolerance_type: 'percentage' } : {})
+    }, `${getVouchersKeyPrefix(transaction.name, dates.fromDate, dates.toDate, matchFilters, dataSource)}${amountTolerance ?? 'all'}`, { // <<< ADD dataSource to SWR key
+        revalidateOnFocus: false
+    }))
+}
+
+/** SWR keys of the vouchers of a transaction start with this - one key per amount tolerance */
+const getVouchersKeyPrefix = (transactionName: string, fromDate: string, toDate: string, matchFilters: string[], dataSource: "Bank" | "Debtor") => {
+    return `bank-reconciliation-vouchers-${transactionName}-${fromDate}-${toDate}-${matchFilters.join(',')}-${dataSource}-`
+}
+
+const generateIdempotencyKey = () => typeof crypto !== 'undefined' && crypto.randomUUID ? crypto.randomUUID() : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+
+/**
+ * Key sent with voucher creating calls - a retry of the same submit (e.g. after a timeout) returns the result
+ * of the first call instead of creating the vouchers again. Renew it once a call succeeds.
+ */
+export const useIdempotencyKey = () => {
+    const [idempotencyKey, setIdempotencyKey] = useState(generateIdempotencyKey)
+
+    const renewIdempotencyKey = useCallback(() => setIdempotencyKey(generateIdempotencyKey()), [])
+
+    return { idempotencyKey, renewIdempotencyKey }
+}
+
+/** State of a background job - published on `truebalance_job_progress` and returned by get_job_status */
+export interface BulkJobState {
+    job_id: string,
+    job_type: string,
+    status: 'Queued' | 'Running' | 'Completed' | 'Cancelled' | 'Failed',
+    processed: number,
+    total: number,
+    succeeded?: number,
+    failed?: number,
+    cancel_requested?: boolean
+}
+
+/**
+ * Track a bulk job started from an action modal - progress is shown in a toast until the job finishes (see BulkJobProgress)
+ */
+export const useTrackBulkJob = () => {
+    const setJobs = useSetAtom(bankRecBulkJobsAtom)
+
+    return (jobId: string, label: string, lastTransaction: UnreconciledTransaction) => {
+        toast.loading(label, { id: jobId, description: _("Queued") })
+        setJobs(jobs => [...jobs, { jobId, label, lastTransaction }])
+    }
+}
+
+export interface TransactionGroup {
+    voucher: LinkedPayment & { unallocated_amount: number },
+    transactions: Pick<UnreconciledTransaction, 'name' | 'date' | 'description' | 'reference_number' | 'unallocated_amount' | 'currency'>[],
+    total: number
+}
+
+/**
+ * Groups of unreconciled transactions that together add up to one voucher (card settlements, split wires)
+ */
+export const useGetTransactionGroups = (enabled: boolean = true) => {
+    const bankAccount = useAtomValue(selectedBankAccountAtom);
+    const dates = useAtomValue(bankRecDateAtom);
+    const matchFilters = useAtomValue(bankRecMatchFilters)
+
+    const shouldFetch = enabled && !!bankAccount?.name && !!dates.fromDate && !!dates.toDate
+
+    return useFrappeGetCall<{ message: TransactionGroup[] }>('truebalance.apis.reconciliation.get_transaction_groups', {
+        bank_account: bankAccount?.name,
+        from_date: dates.fromDate,
+        to_date: dates.toDate,
+        document_types: matchFilters ?? ['payment_entry', 'journal_entry']
+    }, shouldFetch ? `bank-reconciliation-transaction-groups-${bankAccount?.name}-${dates.fromDate}-${dates.toDate}-${matchFilters.join(',')}` : null, {
+        revalidateOnFocus: false,
+        revalidateIfStale: false
+    })
+}
+
+/**
+ * Allocate a voucher across all transactions of a group - then refresh the unreconciled transactions and balance
+ */
+export const useReconcileTransactionGroup = () => {
+    const bankAccount = useAtomValue(selectedBankAccountAtom);
+    const dates = useAtomValue(bankRecDateAtom);
+
+    const { call, loading, error } = useFrappePostCall<{ message: string[] }>('truebalance.apis.bank_reconciliation.reconcile_transaction_group')
+    const syncUnreconciledTransactions = useSyncUnreconciledTransactions('Bank')
+    const { mutate } = useSWRConfig()
+
+    const reconcileGroup = (group: TransactionGroup) => {
+        return call({
+            bank_transaction_names: group.transactions.map(transaction => transaction.name),
+            payment_doctype: group.voucher.doctype,
+            payment_name: group.voucher.name
+        }).then((res) => {
+            syncUnreconciledTransactions()
+            mutate(`bank-reconciliation-account-closing-balance-${bankAccount?.name}-${dates.toDate}`)
+            mutate(getReconciliationSummaryKey('Bank', bankAccount?.company, dates.fromDate, dates.toDate))
+            toast.success(_("Reconciled {0} transactions", [String(res.message.length)]))
+            return res
+        })
+    }
+
+    return { reconcileGroup, loading, error }
+}
+
+export interface InvoiceCombination {
+    vouchers: LinkedPayment[],
+    total: number,
+    difference: number
+}
+
+/**
+ * Combinations of outstanding invoices of the transaction's party that add up to its unallocated amount
+ */
+export const useGetInvoiceCombinations = (transaction: UnreconciledTransaction, dataSource: "Bank" | "Debtor") => {
+    return useFrappeGetCall<{ message: InvoiceCombination[] }>('truebalance.apis.reconciliation.get_invoice_combinations', {
+        bank_transaction_name: transaction.name,
+        data_source: dataSource
+    }, `bank-reconciliation-invoice-combinations-${transaction.name}-${transaction.unallocated_amount}-${dataSource}`, {
         revalidateOnFocus: false
     })
 }
@@ -224,6 +628,7 @@ export const useRefreshUnreconciledTransactions = (dataSource: "Bank" | "Debtor"
 
     // Pass data source to hook used internally
     const { data: unreconciledTransactions } = useGetUnreconciledTransactions(dataSource)
+    const syncUnreconciledTransactions = useSyncUnreconciledTransactions(dataSource)
 
     /** * This function should be called after a transaction is reconciled
      * It will get the next unreconciled transaction and select it
@@ -231,15 +636,15 @@ export const useRefreshUnreconciledTransactions = (dataSource: "Bank" | "Debtor"
      */
     const onReconcileTransaction = (transaction: UnreconciledTransaction, updatedTransaction?: BankTransaction) => {
 
-        // Use the determined accountId for the mutate keys
-        const accountMutateKey = accountId || selectedBank?.name;
-
         // If the updated transaction has an unallocated amount of 0, then we need to select the next unreconciled transaction
         if (updatedTransaction && updatedTransaction?.unallocated_amount !== 0) {
-            mutate(`bank-reco-unreco-${accountMutateKey}-${dates.fromDate}-${dates.toDate}-${dataSource}`)
+            syncUnreconciledTransactions()
             mutate(`bank-reconciliation-account-closing-balance-${selectedBank?.name}-${dates.toDate}`)
-            // Update the matching vouchers for the selected transaction
-            mutate(`bank-reconciliation-vouchers-${transaction.name}-${dates.fromDate}-${dates.toDate}-${matchFilters.join(',')}-${dataSource}`)
+            mutate(getReconciliationSummaryKey(dataSource, transaction.company, dates.fromDate, dates.toDate))
+            mutate(getMatchSuggestionsKey(dataSource, accountId, dates.fromDate, dates.toDate, matchFilters))
+            // Update the matching vouchers for the selected transaction - at every amount tolerance
+            const vouchersKeyPrefix = getVouchersKeyPrefix(transaction.name, dates.fromDate, dates.toDate, matchFilters, dataSource)
+            mutate((key) => typeof key === 'string' && key.startsWith(vouchersKeyPrefix))
             return
         }
 
@@ -254,7 +659,7 @@ export const useRefreshUnreconciledTransactions = (dataSource: "Bank" | "Debtor"
         }
 
         // We need to select the next unreconciled transaction for a better UX
-        mutate(`bank-reco-unreco-${accountMutateKey}-${dates.fromDate}-${dates.toDate}-${dataSource}`)
+        syncUnreconciledTransactions()
             .then(res => {
                 if (nextTransaction) {
                     // Check if next transaction is there in the response
@@ -281,6 +686,8 @@ export const useRefreshUnreconciledTransactions = (dataSource: "Bank" | "Debtor"
                 }
             })
         mutate(`bank-reconciliation-account-closing-balance-${selectedBank?.name}-${dates.toDate}`)
+        mutate(getReconciliationSummaryKey(dataSource, transaction.company, dates.fromDate, dates.toDate))
+        mutate(getMatchSuggestionsKey(dataSource, accountId, dates.fromDate, dates.toDate, matchFilters))
     }
 
     return onReconcileTransaction
@@ -4,3 +4,63 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
+
+/** Rows encoded by the backend in the compact columnar format (truebalance/apis/response_format.py) */
+export interface CompactRows {
+  format: "compact"
+  length: number
+  columns: string[]
+  /** One array of values per column */
+  data: unknown[][]
+  /** Date columns are sent as day offsets from the base date */
+  dates: { base: string | null, columns: string[] }
+  /** Dictionary encoded columns - the value is an index into the dictionary */
+  dictionaries: Record<string, unknown[]>
+}
+
+const DAY_IN_MS = 24 * 60 * 60 * 1000
+
+/**
+ * Decode rows sent in the compact columnar format back to a list of objects.
+ * Lists that are not encoded are returned as is.
+ */
+export function decodeCompactRows<T>(payload: CompactRows | T[] | undefined | null): T[] {
+  if (!payload) {
+    return []
+  }
+
+  if (Array.isArray(payload)) {
+    return payload
+  }
+
+  const { columns, data, dates, dictionaries, length } = payload
+  // Dates in YYYY-MM-DD format are parsed as UTC
+  const base = dates.base ? Date.parse(dates.base) : 0
+
+  const decodedColumns = columns.map((column, index) => {
+    const values = data[index]
+    const dictionary = dictionaries[column]
+
+    if (dictionary) {
+      return values.map((value) => value === null ? null : dictionary[value as number])
+    }
+
+    if (dates.columns.includes(column)) {
+      return values.map((value) => value === null ? null : new Date(base + (value as number) * DAY_IN_MS).toISOString().slice(0, 10))
+    }
+
+    return values
+  })
+
+  const rows = new Array(length)
+
+  for (let rowIndex = 0; rowIndex < length; rowIndex++) {
+    const row: Record<string, unknown> = {}
+    for (let columnIndex = 0; columnIndex < columns.length; columnIndex++) {
+      row[columns[columnIndex]] = decodedColumns[columnIndex][rowIndex]
+    }
+    rows[rowIndex] = row
+  }
+
+  return rows as T[]
+}
@@ -12,8 +12,10 @@ export interface MintSettings{
 	idx?: number
 	/**	Match Transfers across (days) : Int - Number of days to consider for transfer matching across bank accounts.	*/
 	transfer_match_days?: number
-	/**	Automatically run rules on unreconciled transactions : Check - If checked, this job will run every 30 minutes	*/
+	/**	Automatically run rules on unreconciled transactions : Check - If checked, rules are evaluated when a bank transaction is submitted and every hour for any transactions that were missed	*/
 	automatically_run_rules_on_unreconciled_transactions?: 0 | 1
+	/**	Evaluate rules in parallel : Check - Split rule evaluation by company and bank account into multiple background jobs	*/
+	evaluate_rules_in_parallel?: 0 | 1
 	/**	Google Project ID : Data	*/
 	google_project_id?: string
 	/**	Google Processor Location : Select	*/
@@ -5,7 +5,13 @@ import datetime
 from erpnext.accounts.doctype.bank_reconciliation_tool.bank_reconciliation_tool import create_payment_entry_bts, create_journal_entry_bts
 from erpnext.accounts.party import get_party_account
 from erpnext import get_default_cost_center
-from frappe.utils import flt # Import flt for safe comparisons
+from frappe.utils import create_batch, flt # Import flt for safe comparisons
+from truebalance.apis.idempotency import idempotent
+from truebalance.apis.jobs import append_job_results, create_job, is_job_cancelled, update_job
+from truebalance.matching.candidates import DEBTOR_STATEMENT_DOCTYPES
+
+# Bulk jobs commit in chunks - a failure only rolls back the transaction that failed
+BULK_JOB_CHUNK_SIZE = 20
 
 @frappe.whitelist()
 def clear_clearing_date(voucher_type: str, voucher_name: str):
@@ -24,8 +30,19 @@ def reconcile_vouchers(bank_transaction_name, vouchers, is_new_voucher: bool = F
     """
     MODIFIED: Reconciles a statement entry with vouchers (Debtor Logic).
     """
-    vouchers = json.loads(vouchers)
+    transaction = allocate_vouchers(bank_transaction_name, json.loads(vouchers), is_new_voucher, data_source)
 
+    if data_source == 'Debtor':
+        frappe.db.commit()
+
+    return transaction
+
+
+def allocate_vouchers(bank_transaction_name, vouchers: list, is_new_voucher: bool = False, data_source: str = 'Debtor'):
+    """
+        Allocate the vouchers to a statement entry (or bank transaction) without committing - so that several
+        allocations can be applied in one database transaction (see reconcile_bulk)
+    """
     if data_source == 'Debtor':
         # --- Debtor Logic ---
         
@@ -41,6 +58,8 @@ def reconcile_vouchers(bank_transaction_name, vouchers, is_new_voucher: bool = F
         if total_allocation_amount > flt(transaction.unallocated_amount):
             frappe.throw(_("Total allocation amount {0} exceeds the unallocated amount in the statement entry {1}").format(total_allocation_amount, transaction.unallocated_amount))
 
+        validate_debtor_statement_vouchers(transaction, vouchers)
+
         # --- Get the CORRECT party account ---
         # FIX: Use get_party_account to get the specific receivable account for this party
         party_receivable_account = get_party_account(transaction.party_type, transaction.party, transaction.company)
@@ -129,8 +148,6 @@ def reconcile_vouchers(bank_transaction_name, vouchers, is_new_voucher: bool = F
         transaction.matched_document_name = pe.name
         transaction.matched_doctype = 'Payment Entry'
         transaction.save(ignore_permissions=True)
-        
-        frappe.db.commit()
 
         return transaction
 
@@ -161,6 +178,199 @@ def reconcile_vouchers(bank_transaction_name, vouchers, is_new_voucher: bool = F
         return transaction
 
 
+@frappe.whitelist(methods=["POST"])
+def reconcile_transaction_group(bank_transaction_names: list, payment_doctype: str, payment_name: str):
+    """
+        Allocate one voucher across several bank transactions of the same bank account (e.g. a card settlement
+        or a wire that arrived in parts). Either all transactions are reconciled or none are.
+    """
+    if isinstance(bank_transaction_names, str):
+        bank_transaction_names = json.loads(bank_transaction_names)
+
+    transactions = frappe.get_all("Bank Transaction",
+                                  filters={"name": ("in", bank_transaction_names)},
+                                  fields=["name", "bank_account", "docstatus", "unallocated_amount"],
+                                  order_by="date asc, name asc")
+
+    if len(transactions) != len(set(bank_transaction_names)):
+        frappe.throw(_("Some of the bank transactions do not exist"))
+
+    if len({transaction.bank_account for transaction in transactions}) > 1:
+        frappe.throw(_("All bank transactions in a group must belong to the same bank account"))
+
+    for transaction in transactions:
+        if transaction.docstatus != 1 or flt(transaction.unallocated_amount) <= 0.0:
+            frappe.throw(_("Bank Transaction {0} is already fully reconciled").format(transaction.name))
+
+    frappe.db.savepoint("reconcile_transaction_group")
+
+    try:
+        for transaction in transactions:
+            updated_transaction = reconcile_vouchers(transaction.name, json.dumps([{
+                "payment_doctype": payment_doctype,
+                "payment_name": payment_name,
+                "amount": transaction.unallocated_amount,
+            }]), data_source="Bank")
+
+            if flt(updated_transaction.unallocated_amount) >= flt(transaction.unallocated_amount):
+                frappe.throw(_("{0} {1} does not have enough unallocated amount left for Bank Transaction {2}").format(
+                    _(payment_doctype), payment_name, transaction.name))
+    except Exception:
+        frappe.db.rollback(save_point="reconcile_transaction_group")
+        raise
+
+    return [transaction.name for transaction in transactions]
+
+
+@frappe.whitelist(methods=["POST"])
+def reconcile_bulk(items: list, data_source: str = 'Bank'):
+    """
+        Reconcile many statement entries (or bank transactions) with their vouchers in one request.
+
+        items: [{"bank_transaction_name": name, "vouchers": [{"payment_doctype", "payment_name", "amount"}]}]
+
+        All items are validated up front with one query per doctype - missing or already reconciled transactions,
+        allocations above the unallocated amount, missing or unsubmitted vouchers and (for Debtor statements)
+        invoices and payments allocated above their outstanding amount. The valid items are then applied in one
+        database transaction, each under its own savepoint, so that a failing item does not undo the others.
+
+        Returns a result per item, in order: {"bank_transaction_name", "status": "Reconciled" or "Failed",
+        "message", "unallocated_amount"}
+    """
+    if isinstance(items, str):
+        items = json.loads(items)
+
+    doctype = "Debtor Statement Entry" if data_source == 'Debtor' else "Bank Transaction"
+    frappe.has_permission(doctype, "write", throw=True)
+
+    errors = _validate_bulk_reconciliation(items, data_source)
+
+    results = []
+
+    for index, item in enumerate(items):
+        name = item.get("bank_transaction_name")
+
+        if index in errors:
+            results.append({"bank_transaction_name": name, "status": "Failed", "message": errors[index], "unallocated_amount": None})
+            continue
+
+        save_point = f"reconcile_bulk_{index}"
+        message_count = len(frappe.local.message_log)
+        frappe.db.savepoint(save_point)
+
+        try:
+            transaction = allocate_vouchers(name, item["vouchers"], data_source=data_source)
+        except Exception as e:
+            frappe.db.rollback(save_point=save_point)
+            # The error is part of the result - do not show it as a message as well
+            del frappe.local.message_log[message_count:]
+            results.append({"bank_transaction_name": name, "status": "Failed", "message": str(e), "unallocated_amount": None})
+            continue
+
+        frappe.db.release_savepoint(save_point)
+        results.append({"bank_transaction_name": name, "status": "Reconciled", "message": None,
+                        "unallocated_amount": transaction.unallocated_amount})
+
+    return results
+
+
+def _validate_bulk_reconciliation(items: list, data_source: str) -> dict:
+    """
+        Returns {item index: error message} for the items that cannot be reconciled
+    """
+    doctype = "Debtor Statement Entry" if data_source == 'Debtor' else "Bank Transaction"
+    fields = ["name", "docstatus", "unallocated_amount"] + (["is_reconciled"] if data_source == 'Debtor' else [])
+
+    names = [item.get("bank_transaction_name") for item in items]
+    transactions = {row.name: row for row in frappe.get_all(doctype, filters={"name": ("in", list(set(names)))}, fields=fields)} if names else {}
+
+    # Vouchers by doctype - one query each
+    voucher_names = {}
+    for item in items:
+        for voucher in item.get("vouchers") or []:
+            voucher_names.setdefault(voucher.get("payment_doctype"), set()).add(voucher.get("payment_name"))
+
+    voucher_fields = {
+        "Sales Invoice": ["outstanding_amount as open_amount"],
+        "Purchase Invoice": ["outstanding_amount as open_amount"],
+        "Payment Entry": ["unallocated_amount as open_amount"],
+    }
+
+    vouchers = {}
+    for voucher_doctype, names_of_doctype in voucher_names.items():
+        if not voucher_doctype or not frappe.db.exists("DocType", voucher_doctype):
+            continue
+        # Outstanding amounts only limit allocations to Debtor statements - bank transactions clear vouchers
+        extra_fields = voucher_fields.get(voucher_doctype, []) if data_source == 'Debtor' else []
+        for row in frappe.get_all(voucher_doctype, filters={"name": ("in", list(names_of_doctype))}, fields=["name", "docstatus", *extra_fields]):
+            vouchers[(voucher_doctype, row.name)] = row
+
+    errors = {}
+    seen = set()
+    # What is left of each voucher's open amount as the items are allocated in order
+    remaining = {key: flt(row.open_amount) for key, row in vouchers.items() if "open_amount" in row}
+
+    for index, item in enumerate(items):
+        name = item.get("bank_transaction_name")
+        transaction = transactions.get(name)
+        item_vouchers = item.get("vouchers") or []
+
+        if name in seen:
+            errors[index] = _("{0} {1} is part of more than one item").format(_(doctype), name)
+        elif not transaction:
+            errors[index] = _("{0} {1} does not exist").format(_(doctype), name)
+        elif (data_source == 'Debtor' and (transaction.is_reconciled or transaction.docstatus != 0)) \
+                or (data_source != 'Debtor' and transaction.docstatus != 1) \
+                or flt(transaction.unallocated_amount) <= 0.0:
+            errors[index] = _("{0} {1} is already fully reconciled").format(_(doctype), name)
+        elif not item_vouchers:
+            errors[index] = _("No vouchers to reconcile {0} {1} with").format(_(doctype), name)
+        elif all(voucher.get("amount") is not None for voucher in item_vouchers) \
+                and sum(flt(voucher.get("amount")) for voucher in item_vouchers) > flt(transaction.unallocated_amount) + 0.005:
+            errors[index] = _("Total allocation amount exceeds the unallocated amount {0} of {1} {2}").format(
+                transaction.unallocated_amount, _(doctype), name)
+        else:
+            for voucher in item_vouchers:
+                key = (voucher.get("payment_doctype"), voucher.get("payment_name"))
+                if key not in vouchers or vouchers[key].docstatus != 1:
+                    errors[index] = _("{0} {1} does not exist or is not submitted").format(_(key[0] or ""), key[1])
+                    break
+                if key in remaining and flt(voucher.get("amount")) > remaining[key] + 0.005:
+                    errors[index] = _("{0} {1} only has {2} left to allocate").format(_(key[0]), key[1], remaining[key])
+                    break
+
+        seen.add(name)
+
+        if index not in errors:
+            for voucher in item_vouchers:
+                key = (voucher.get("payment_doctype"), voucher.get("payment_name"))
+                if key in remaining:
+                    remaining[key] -= flt(voucher.get("amount"))
+
+    return errors
+
+
+def validate_debtor_statement_vouchers(transaction, vouchers: list):
+    """
+        A Debtor statement entry is allocated with a "Receive" Payment Entry from the customer - it can only reference
+        the customer's outstanding Sales Invoices (not credit notes) and received payments
+    """
+    if transaction.party_type != "Customer":
+        frappe.throw(_("Debtor Statement Entry {0} can only be reconciled for a Customer").format(transaction.name))
+
+    for voucher in vouchers:
+        doctype, name = voucher.get('payment_doctype'), voucher.get('payment_name')
+
+        if doctype not in DEBTOR_STATEMENT_DOCTYPES:
+            frappe.throw(_("{0} {1} cannot be allocated to a Debtor Statement Entry - only Sales Invoices and Payment Entries can").format(_(doctype), name))
+
+        if doctype == "Sales Invoice" and frappe.db.get_value("Sales Invoice", name, "is_return"):
+            frappe.throw(_("Credit Note {0} cannot be allocated to a Debtor Statement Entry").format(name))
+
+        if doctype == "Payment Entry" and frappe.db.get_value("Payment Entry", name, "payment_type") != "Receive":
+            frappe.throw(_("Payment Entry {0} is not a payment received from the customer").format(name))
+
+
 def create_dummy_journal_entry_for_reconciliation(transaction, vouchers, total_allocation_amount, party_receivable_account):
     """
     Fallback function to create a Journal Entry when no proper bank/cash account is found.
@@ -208,8 +418,6 @@ def create_dummy_journal_entry_for_reconciliation(transaction, vouchers, total_a
         transaction.matched_doctype = 'Journal Entry'
         transaction.save(ignore_permissions=True)
         
-        frappe.db.commit()
-        
         return transaction
         
     except Exception as e:
@@ -258,36 +466,150 @@ def unreconcile_transaction(transaction_name: str, data_source: str = 'Bank'):
 
 
 @frappe.whitelist(methods=["POST"])
+@idempotent
 def create_bulk_internal_transfer(bank_transaction_names: list, 
-                                  bank_account: str):
+                                  bank_account: str,
+                                  idempotency_key: str | None = None):
     """
-        Create an internal transfer for multiple bank transactions
+        Create an internal transfer for multiple bank transactions - runs in the background, returns the job ID
     """
-    for bank_transaction_name in bank_transaction_names:
+    frappe.has_permission("Payment Entry", "create", throw=True)
 
-        bank_transaction = frappe.db.get_value("Bank Transaction", bank_transaction_name, ["name", "withdrawal", "bank_account", "date", "reference_number", "description"], as_dict=True)
+    return enqueue_bulk_job("Bulk Internal Transfer",
+                            "truebalance.apis.bank_reconciliation.create_internal_transfer_for_transaction",
+                            bank_transaction_names,
+                            bank_account=bank_account)
 
-        transaction_account = frappe.get_cached_value("Bank Account", bank_transaction.bank_account, "account")
+def enqueue_bulk_job(job_type: str, method: str, bank_transaction_names: list, **kwargs) -> str:
+    """
+        Run method(bank_transaction_name, **kwargs) for every transaction in a background job and return the job ID.
 
-        is_withdrawal = bank_transaction.withdrawal > 0.0
+        Progress is published as the job runs and the per-transaction report can be read with
+        `truebalance.apis.jobs.get_job_status`. The job can be stopped between transactions with
+        `truebalance.apis.jobs.cancel_job`.
+    """
+    if isinstance(bank_transaction_names, str):
+        bank_transaction_names = json.loads(bank_transaction_names)
 
-        if is_withdrawal:
-            paid_from = transaction_account
-            paid_to = bank_account
-        else:
-            paid_from = bank_account
-            paid_to = transaction_account
-        
-        reference_no = (bank_transaction.reference_number or bank_transaction.description or '')[:140]
-        
-        create_internal_transfer(bank_transaction_name=bank_transaction.name,
-                                 posting_date=bank_transaction.date,
-                                 reference_date=bank_transaction.date,
-                                 reference_no=reference_no,
-                                 paid_from=paid_from,
-                                 paid_to=paid_to,)
+    job_id = create_job(job_type, total=len(bank_transaction_names))
+
+    frappe.enqueue(method=_run_bulk_job,
+                   queue="long",
+                   job_id=f"truebalance_bulk::{job_id}",
+                   enqueue_after_commit=True,
+                   bulk_job_id=job_id,
+                   item_method=method,
+                   bank_transaction_names=bank_transaction_names,
+                   **kwargs)
+
+    return job_id
+
+def _run_bulk_job(bulk_job_id: str, item_method: str, bank_transaction_names: list, **kwargs):
+
+    job_id = bulk_job_id
+    method = frappe.get_attr(item_method)
+
+    update_job(job_id, status="Running", total=len(bank_transaction_names))
+
+    processed = succeeded = failed = 0
+
+    try:
+        for chunk in create_batch(bank_transaction_names, BULK_JOB_CHUNK_SIZE):
+            results = []
+            cancelled = False
+
+            for bank_transaction_name in chunk:
+                if is_job_cancelled(job_id):
+                    cancelled = True
+                    break
+
+                result = _run_bulk_job_item(method, bank_transaction_name, kwargs)
+                results.append(result)
+
+                if result["status"] == "Success":
+                    succeeded += 1
+                else:
+                    failed += 1
+
+            frappe.db.commit()
+
+            processed += len(results)
+            append_job_results(job_id, results)
+            update_job(job_id, processed=processed, succeeded=succeeded, failed=failed)
+
+            if cancelled:
+                update_job(job_id, status="Cancelled")
+                return
+
+        update_job(job_id, status="Completed", processed=processed, succeeded=succeeded, failed=failed)
+
+    except Exception:
+        frappe.log_error(title="Bulk Reconciliation Job Error", message=frappe.get_traceback())
+        update_job(job_id, status="Failed")
+
+def _run_bulk_job_item(method, bank_transaction_name: str, kwargs: dict) -> dict:
+    """
+        Create and reconcile the voucher for a single transaction inside a savepoint.
+        If anything fails, only this transaction's changes are rolled back.
+
+        The method must not commit (use allocate_vouchers, not reconcile_vouchers, for Debtor statements) - a commit
+        would release the savepoint and commit the earlier transactions of the chunk.
+    """
+    savepoint = "bulk_job_item"
+    frappe.db.savepoint(savepoint)
+
+    result = {"bank_transaction": bank_transaction_name}
+
+    try:
+        transaction = method(bank_transaction_name, **kwargs)
+
+        voucher = transaction.payment_entries[-1] if transaction and transaction.get("payment_entries") else None
+
+        result.update({
+            "status": "Success",
+            "voucher_type": voucher.payment_document if voucher else transaction.get("matched_doctype") if transaction else None,
+            "voucher_name": voucher.payment_entry if voucher else transaction.get("matched_document_name") if transaction else None,
+        })
+
+    except Exception as e:
+        frappe.db.rollback(save_point=savepoint)
+        frappe.clear_last_message()
+
+        result.update({
+            "status": "Failed",
+            "error": str(e),
+        })
+
+    return result
+
+def create_internal_transfer_for_transaction(bank_transaction_name: str, bank_account: str):
+    """
+        Create an internal transfer between the transaction's bank account and the given account, and reconcile it
+    """
+    bank_transaction = frappe.db.get_value("Bank Transaction", bank_transaction_name, ["name", "withdrawal", "bank_account", "date", "reference_number", "description"], as_dict=True)
+
+    transaction_account = frappe.get_cached_value("Bank Account", bank_transaction.bank_account, "account")
+
+    is_withdrawal = bank_transaction.withdrawal > 0.0
+
+    if is_withdrawal:
+        paid_from = transaction_account
+        paid_to = bank_account
+    else:
+        paid_from = bank_account
+        paid_to = transaction_account
+    
+    reference_no = (bank_transaction.reference_number or bank_transaction.description or '')[:140]
+    
+    return create_internal_transfer(bank_transaction_name=bank_transaction.name,
+                                    posting_date=bank_transaction.date,
+                                    reference_date=bank_transaction.date,
+                                    reference_no=reference_no,
+                                    paid_from=paid_from,
+                                    paid_to=paid_to,)
 
 @frappe.whitelist()
+@idempotent
 def create_internal_transfer(bank_transaction_name: str, 
                              posting_date: str | datetime.date, 
                              reference_date: str | datetime.date, 
@@ -297,7 +619,8 @@ def create_internal_transfer(bank_transaction_name: str,
                              custom_remarks: bool = False,
                              remarks: str = None,
                              mirror_transaction_name: str = None,
-                             dimensions: dict = None):
+                             dimensions: dict = None,
+                             idempotency_key: str | None = None):
     """
     Create an internal transfer payment entry
     """
@@ -349,40 +672,58 @@ def create_internal_transfer(bank_transaction_name: str,
 		]
 	)
 
-    transaction_id = reconcile_vouchers(bank_transaction_name, vouchers, is_new_voucher=True)
+    transaction_id = reconcile_vouchers(bank_transaction_name, vouchers, is_new_voucher=True, data_source='Bank')
 
     if mirror_transaction_name:
         # Reconcile the mirror transaction
-        reconcile_vouchers(mirror_transaction_name, vouchers, is_new_voucher=False)
+        reconcile_vouchers(mirror_transaction_name, vouchers, is_new_voucher=False, data_source='Bank')
 
     return transaction_id
 
 @frappe.whitelist(methods=['POST'])
+@idempotent
 def create_bulk_bank_entry_and_reconcile(bank_transactions: list, 
-                                         account: str):
+                                         account: str,
+                                         idempotency_key: str | None = None):
     """
-     Create bank entries for all transactions and reconcile them
+     Create bank entries for all transactions and reconcile them - runs in the background, returns the job ID
     """
-    for bank_transaction in bank_transactions:
-        transactions_details = frappe.db.get_value("Bank Transaction", bank_transaction, ["name", "deposit", "withdrawal", "bank_account", "currency", "unallocated_amount", "date", "reference_number", "description"], as_dict=True)
+    frappe.has_permission("Journal Entry", "create", throw=True)
 
-        is_credit_card = frappe.get_cached_value("Bank Account", transactions_details.bank_account, "is_credit_card")
+    return enqueue_bulk_job("Bulk Bank Entry",
+                            "truebalance.apis.bank_reconciliation.create_bank_entry_for_transaction",
+                            bank_transactions,
+                            account=account)
 
-        # Check Number will be limited to 140 characters
-        cheque_no = (transactions_details.reference_number or transactions_details.description or '')[:140]
-
-        create_bank_entry_and_reconcile(bank_transaction_name=bank_transaction,
-                                        cheque_date=transactions_details.date,
-                                        posting_date=transactions_details.date,
-                                        cheque_no=cheque_no,
-                                        user_remark=transactions_details.description,
-                                        entries=[{
-                                            "account": account,
-                                            "amount": transactions_details.unallocated_amount,
-                                        }],
-                                        voucher_type=("Credit Card Entry" if is_credit_card else "Bank Entry"))
+def create_bank_entry_for_transaction(bank_transaction_name: str,
+                                      account: str,
+                                      party_type: str | None = None,
+                                      party: str | None = None):
+    """
+     Create a bank entry for the full unallocated amount of a transaction against the given account and reconcile it
+    """
+    transactions_details = frappe.db.get_value("Bank Transaction", bank_transaction_name, ["name", "deposit", "withdrawal", "bank_account", "currency", "unallocated_amount", "date", "reference_number", "description"], as_dict=True)
+
+    is_credit_card = frappe.get_cached_value("Bank Account", transactions_details.bank_account, "is_credit_card")
+
+    # Check Number will be limited to 140 characters
+    cheque_no = (transactions_details.reference_number or transactions_details.description or '')[:140]
+
+    return create_bank_entry_and_reconcile(bank_transaction_name=bank_transaction_name,
+                                           cheque_date=transactions_details.date,
+                                           posting_date=transactions_details.date,
+                                           cheque_no=cheque_no,
+                                           user_remark=transactions_details.description,
+                                           entries=[{
+                                               "account": account,
+                                               "amount": transactions_details.unallocated_amount,
+                                               "party_type": party_type,
+                                               "party": party,
+                                           }],
+                                           voucher_type=("Credit Card Entry" if is_credit_card else "Bank Entry"))
 
 @frappe.whitelist(methods=['POST'])
+@idempotent
 def create_bank_entry_and_reconcile(bank_transaction_name: str, 
                                     cheque_date: str | datetime.date,
                                     posting_date: str | datetime.date,
@@ -390,7 +731,8 @@ def create_bank_entry_and_reconcile(bank_transaction_name: str,
                                     entries: list,
                                     user_remark: str = None,
                                     voucher_type: str = "Bank Entry",
-                                    dimensions: dict = None):
+                                    dimensions: dict = None,
+                                    idempotency_key: str | None = None):
     """
         Create a bank entry and reconcile it with the bank transaction
     """
@@ -481,96 +823,118 @@ def create_bank_entry_and_reconcile(bank_transaction_name: str,
         "payment_doctype": "Journal Entry",
         "payment_name": bank_entry.name,
         "amount": paid_amount,
-    }]), is_new_voucher=True)
+    }]), is_new_voucher=True, data_source='Bank')
 
 @frappe.whitelist(methods=['POST'])
+@idempotent
 def create_bulk_payment_entry_and_reconcile(bank_transaction_names: list, 
                                             party_type: str, 
                                             party: str, 
                                             account: str,
                                             mode_of_payment: str | None = None,
-                                            data_source: str = 'Bank'):
+                                            data_source: str = 'Bank',
+                                            idempotency_key: str | None = None):
     """
         MODIFIED: Create a payment entry and reconcile it with the statement entry.
+        Runs in the background, returns the job ID.
     """
-
-    for name in bank_transaction_names:
+    frappe.has_permission("Payment Entry", "create", throw=True)
+
+    return enqueue_bulk_job("Bulk Payment Entry",
+                            "truebalance.apis.bank_reconciliation.create_payment_entry_for_transaction",
+                            bank_transaction_names,
+                            party_type=party_type,
+                            party=party,
+                            account=account,
+                            mode_of_payment=mode_of_payment,
+                            data_source=data_source)
+
+def create_payment_entry_for_transaction(name: str,
+                                         party_type: str,
+                                         party: str,
+                                         account: str,
+                                         mode_of_payment: str | None = None,
+                                         data_source: str = 'Bank'):
+    """
+        Create a payment entry for the full unallocated amount of a statement entry and reconcile it
+    """
+    if data_source == 'Debtor':
+        # --- Debtor Statement Entry (DSE) creation logic ---
+        dse = frappe.get_doc("Debtor Statement Entry", name)
         
-        if data_source == 'Debtor':
-            # --- Debtor Statement Entry (DSE) creation logic ---
-            dse = frappe.get_doc("Debtor Statement Entry", name)
-            
-            # Use DSE fields for PE creation
-            is_receive = dse.deposit > 0.0
-            
-            # We assume Debtor mode is always for receiving a payment from a Customer (AR)
-            if not is_receive:
-                frappe.throw(_("Debtor Statement Entry must be a credit (deposit) to create a standard Payment Entry."))
-                
-            paid_from = account # The receiving account (e.g., Bank/Cash)
-            paid_to = get_party_account(party_type, party, dse.company) # Receivable/Payable account is 'paid to' in receive
+        # Use DSE fields for PE creation
+        is_receive = dse.deposit > 0.0
+        
+        # We assume Debtor mode is always for receiving a payment from a Customer (AR)
+        if not is_receive:
+            frappe.throw(_("Debtor Statement Entry must be a credit (deposit) to create a standard Payment Entry."))
             
-            amount = dse.unallocated_amount
-            reference_no = (dse.reference_number or dse.description or '')[:140]
-            date = dse.statement_date
-            company = dse.company
+        paid_from = account # The receiving account (e.g., Bank/Cash)
+        paid_to = get_party_account(party_type, party, dse.company) # Receivable/Payable account is 'paid to' in receive
+        
+        amount = dse.unallocated_amount
+        reference_no = (dse.reference_number or dse.description or '')[:140]
+        date = dse.statement_date
+        company = dse.company
 
-        else:
-            # --- Original Bank Transaction (BT) creation logic ---
-            bt = frappe.db.get_value("Bank Transaction", name, ["name", "deposit", "withdrawal", "bank_account", "currency", "unallocated_amount", "date", "reference_number", "description", "company"], as_dict=True)
-            transaction_account = frappe.get_cached_value("Bank Account", bt.bank_account, "account")
+    else:
+        # --- Original Bank Transaction (BT) creation logic ---
+        bt = frappe.db.get_value("Bank Transaction", name, ["name", "deposit", "withdrawal", "bank_account", "currency", "unallocated_amount", "date", "reference_number", "description", "company"], as_dict=True)
+        transaction_account = frappe.get_cached_value("Bank Account", bt.bank_account, "account")
 
-            is_withdrawal = bt.withdrawal > 0.0
-            is_receive = not is_withdrawal
-            
-            if is_withdrawal:
-                paid_from = transaction_account
-                paid_to = account # The contra account (e.g. Expense/Asset)
-            else:
-                paid_from = account
-                paid_to = transaction_account
-            
-            amount = bt.unallocated_amount
-            reference_no = (bt.reference_number or bt.description or '')[:140]
-            date = bt.date
-            company = bt.company
-
-        payment_entry_doc = frappe.get_doc({
-            "doctype": "Payment Entry",
-            "payment_type": "Receive" if is_receive else "Pay",
-            "company": company,
-            "mode_of_payment": mode_of_payment,
-            "party_type": party_type,
-            "party": party,
-            "paid_from": paid_from,
-            "paid_to": paid_to,
-            "paid_amount": amount,
-            "base_paid_amount": amount,
-            "received_amount": amount,
-            "base_received_amount": amount,
-            "target_exchange_rate": 1,
-            "source_exchange_rate": 1,
-            "reference_date": date,
-            "posting_date": date,
-            "reference_no": reference_no,
-            # Link to the external statement entry is only in the original Mint logic through the BT link field
-        })
+        is_withdrawal = bt.withdrawal > 0.0
+        is_receive = not is_withdrawal
         
-        payment_entry_doc.insert()
-        payment_entry_doc.submit()
+        if is_withdrawal:
+            paid_from = transaction_account
+            paid_to = account # The contra account (e.g. Expense/Asset)
+        else:
+            paid_from = account
+            paid_to = transaction_account
+        
+        amount = bt.unallocated_amount
+        reference_no = (bt.reference_number or bt.description or '')[:140]
+        date = bt.date
+        company = bt.company
+
+    payment_entry_doc = frappe.get_doc({
+        "doctype": "Payment Entry",
+        "payment_type": "Receive" if is_receive else "Pay",
+        "company": company,
+        "mode_of_payment": mode_of_payment,
+        "party_type": party_type,
+        "party": party,
+        "paid_from": paid_from,
+        "paid_to": paid_to,
+        "paid_amount": amount,
+        "base_paid_amount": amount,
+        "received_amount": amount,
+        "base_received_amount": amount,
+        "target_exchange_rate": 1,
+        "source_exchange_rate": 1,
+        "reference_date": date,
+        "posting_date": date,
+        "reference_no": reference_no,
+        # Link to the external statement entry is only in the original Mint logic through the BT link field
+    })
+    
+    payment_entry_doc.insert()
+    payment_entry_doc.submit()
 
-        # Reconcile using the appropriate logic
-        reconcile_vouchers(name, json.dumps([{
-            "payment_doctype": "Payment Entry",
-            "payment_name": payment_entry_doc.name,
-            "amount": payment_entry_doc.paid_amount,
-        }]), is_new_voucher=True, data_source=data_source)
+    # Reconcile using the appropriate logic - without committing, the bulk job commits once per chunk
+    return allocate_vouchers(name, [{
+        "payment_doctype": "Payment Entry",
+        "payment_name": payment_entry_doc.name,
+        "amount": payment_entry_doc.paid_amount,
+    }], is_new_voucher=True, data_source=data_source)
 
     
 @frappe.whitelist(methods=['POST'])
+@idempotent
 def create_payment_entry_and_reconcile(bank_transaction_name: str, 
                                        payment_entry_doc: dict,
-                                       data_source: str = 'Bank'):
+                                       data_source: str = 'Bank',
+                                       idempotency_key: str | None = None):
     """
         Create a payment entry and reconcile it with the bank transaction
     """
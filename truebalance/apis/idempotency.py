@@ -0,0 +1,110 @@
+import frappe
+import functools
+import hashlib
+import json
+from frappe import _
+from frappe.utils import add_days, add_to_date, get_datetime, now_datetime
+
+IDEMPOTENCY_DOCTYPE = "Mint Idempotency Key TB"
+
+# Keys (and their stored results) are kept for a week
+IDEMPOTENCY_KEY_TTL_DAYS = 7
+
+# A key still "Processing" after this long belongs to a call that died half way - it can be used again
+PROCESSING_TIMEOUT_MINUTES = 10
+
+def idempotent(method):
+    """
+    Make a voucher creating API safe to retry. The API takes an optional `idempotency_key` argument
+    (a client generated ID, the same for every retry of one action):
+
+    - The first call with a key stores the result under the key once the API succeeds.
+    - A retry with the same key returns the stored result without calling the API again.
+    - Reusing a key with different arguments is an error.
+
+    The key is inserted in the same database transaction as the vouchers, so a call that fails leaves no key
+    behind and a call that runs in parallel with the same key waits on it and then returns the stored result.
+
+    Put it below @frappe.whitelist and declare `idempotency_key: str | None = None` on the API so that Frappe
+    passes it through.
+    """
+    endpoint = f"{method.__module__}.{method.__qualname__}"
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        idempotency_key = kwargs.get("idempotency_key")
+
+        if not idempotency_key:
+            return method(*args, **kwargs)
+
+        name = _get_record_name(endpoint, idempotency_key)
+        request_hash = _get_request_hash(args, {key: value for key, value in kwargs.items() if key != "idempotency_key"})
+
+        record = _get_record(name)
+
+        if record and record.status == "Processing" \
+                and get_datetime(record.modified) < add_to_date(now_datetime(), minutes=-PROCESSING_TIMEOUT_MINUTES):
+            # The call that took the key never finished - take it over
+            frappe.db.delete(IDEMPOTENCY_DOCTYPE, {"name": name})
+            record = None
+
+        if record:
+            return _replay(record, request_hash)
+
+        frappe.db.savepoint("idempotency_key")
+
+        try:
+            frappe.get_doc({
+                "doctype": IDEMPOTENCY_DOCTYPE,
+                "idempotency_key": idempotency_key,
+                "endpoint": endpoint,
+                "user": frappe.session.user,
+                "status": "Processing",
+                "request_hash": request_hash,
+            }).insert(ignore_permissions=True, set_name=name)
+        except frappe.DuplicateEntryError:
+            # Another call with the key got there first and has finished (it held the row until it committed).
+            # A plain read would still see the snapshot from before the insert - a locking read sees the committed row.
+            frappe.db.rollback(save_point="idempotency_key")
+            return _replay(_get_record(name, for_update=True), request_hash)
+
+        result = method(*args, **kwargs)
+
+        frappe.db.set_value(IDEMPOTENCY_DOCTYPE, name, {
+            "status": "Completed",
+            "response": frappe.as_json(result),
+        }, update_modified=False)
+
+        return result
+
+    return wrapper
+
+def delete_expired_idempotency_keys():
+    """
+    Scheduled daily - delete the keys that are older than IDEMPOTENCY_KEY_TTL_DAYS
+    """
+    frappe.db.delete(IDEMPOTENCY_DOCTYPE, {"creation": ("<", add_days(now_datetime(), -IDEMPOTENCY_KEY_TTL_DAYS))})
+
+def _replay(record, request_hash):
+    if not record:
+        frappe.throw(_("The request could not be completed, please try again"))
+
+    if record.request_hash != request_hash:
+        frappe.throw(_("Idempotency key {0} was already used for a different request").format(record.idempotency_key))
+
+    if record.status == "Completed":
+        return json.loads(record.response) if record.response else None
+
+    frappe.throw(_("A request with idempotency key {0} is still being processed").format(record.idempotency_key))
+
+def _get_record(name, for_update=False):
+    return frappe.db.get_value(IDEMPOTENCY_DOCTYPE, name,
+                               ["name", "idempotency_key", "status", "request_hash", "response", "modified"],
+                               as_dict=True, for_update=for_update)
+
+def _get_record_name(endpoint: str, idempotency_key: str) -> str:
+    # Keys are scoped to the user and the API - the same key from another user is another record
+    return hashlib.sha256(f"{frappe.session.user}\n{endpoint}\n{idempotency_key}".encode()).hexdigest()[:40]
+
+def _get_request_hash(args, kwargs) -> str:
+    return hashlib.sha256(json.dumps([args, kwargs], sort_keys=True, default=str).encode()).hexdigest()
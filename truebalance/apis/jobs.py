@@ -0,0 +1,123 @@
+import frappe
+import json
+from frappe import _
+from frappe.utils import cint, now
+
+# Job state and results are kept in the cache for a day
+JOB_TTL = 24 * 60 * 60
+
+JOB_PROGRESS_EVENT = "truebalance_job_progress"
+
+def create_job(job_type: str, **values) -> str:
+    """
+    Create the tracking state for a background job and return its ID
+    """
+    job_id = frappe.generate_hash(length=12)
+
+    state = frappe._dict({
+        "job_id": job_id,
+        "job_type": job_type,
+        "status": "Queued",
+        "owner": frappe.session.user,
+        "created": now(),
+        "processed": 0,
+        "total": 0,
+        **values,
+    })
+    frappe.cache.set_value(_get_state_key(job_id), state, expires_in_sec=JOB_TTL)
+
+    return job_id
+
+def get_job(job_id: str):
+    return frappe.cache.get_value(_get_state_key(job_id))
+
+def update_job(job_id: str, publish: bool = True, **values):
+    """
+    Update the state of a job and publish it to the user who started it
+    """
+    state = get_job(job_id)
+
+    if not state:
+        return None
+
+    state.update(values)
+    frappe.cache.set_value(_get_state_key(job_id), state, expires_in_sec=JOB_TTL)
+
+    if publish:
+        frappe.publish_realtime(JOB_PROGRESS_EVENT, _get_public_state(state), user=state.owner)
+
+    return state
+
+def append_job_results(job_id: str, rows: list):
+    """
+    Append result rows to the job. Rows are stored as a list so that they can be read back in pages.
+    """
+    if not rows:
+        return
+
+    key = frappe.cache.make_key(_get_results_key(job_id))
+
+    pipeline = frappe.cache.pipeline()
+    pipeline.rpush(key, *[json.dumps(row, default=str) for row in rows])
+    pipeline.expire(key, JOB_TTL)
+    pipeline.execute()
+
+def get_job_results(job_id: str, start: int = 0, page_length: int = 100) -> list:
+    start = cint(start)
+    page_length = cint(page_length) or 100
+
+    rows = frappe.cache.lrange(_get_results_key(job_id), start, start + page_length - 1)
+    return [json.loads(row) for row in rows]
+
+def get_job_results_count(job_id: str) -> int:
+    return frappe.cache.llen(_get_results_key(job_id))
+
+@frappe.whitelist(methods=["GET"])
+def get_job_status(job_id: str, start: int = 0, page_length: int = 100):
+    """
+    Returns the status and progress of a background job along with a page of its results
+    """
+    state = _get_job_for_user(job_id)
+
+    return {
+        **_get_public_state(state),
+        "total_results": get_job_results_count(job_id),
+        "results": get_job_results(job_id, start, page_length),
+    }
+
+@frappe.whitelist(methods=["POST"])
+def cancel_job(job_id: str):
+    """
+    Ask a running job to stop - jobs that support it check between items, keep what is already done and
+    end with the status "Cancelled"
+    """
+    state = _get_job_for_user(job_id)
+
+    if state.status not in ("Queued", "Running"):
+        frappe.throw(_("Job {0} has already finished").format(job_id))
+
+    return _get_public_state(update_job(job_id, cancel_requested=True))
+
+def is_job_cancelled(job_id: str) -> bool:
+    state = get_job(job_id)
+    return bool(state and state.get("cancel_requested"))
+
+def _get_job_for_user(job_id: str):
+    state = get_job(job_id)
+
+    if not state:
+        frappe.throw(_("Job {0} not found or has expired").format(job_id), frappe.DoesNotExistError)
+
+    if state.owner != frappe.session.user and "System Manager" not in frappe.get_roles():
+        frappe.throw(_("You do not have permission to view this job"), frappe.PermissionError)
+
+    return state
+
+def _get_public_state(state) -> dict:
+    return {key: value for key, value in state.items() if not key.startswith("_")}
+
+def _get_state_key(job_id: str) -> str:
+    return f"truebalance:job:{job_id}"
+
+def _get_results_key(job_id: str) -> str:
+    return f"truebalance:job:{job_id}:results"
@@ -1,18 +1,298 @@
 # mint/mint/apis/reconciliation.py
 from __future__ import annotations
 import frappe
+import json
 from frappe import _
-from frappe.utils import flt, getdate
+from frappe.utils import add_days, cint, flt, getdate
 from erpnext.accounts.doctype.bank_reconciliation_tool.bank_reconciliation_tool import get_linked_payments as erpnext_get_linked_payments
+from pypika.terms import Criterion
+from truebalance.apis.bank_reconciliation import reconcile_bulk
+from truebalance.apis.response_format import format_rows
+from truebalance.apis.transactions import get_transaction_source
+from truebalance.matching import assignment
+from truebalance.matching.batch_scoring import get_direction, get_top_k_suggestions
+from truebalance.matching.candidates import get_debtor_statement_vouchers, get_open_vouchers, get_party_vouchers
+from truebalance.matching.grouping import DATE_WINDOW_DAYS, find_transaction_groups
+from truebalance.matching.scoring import rank_candidates
+from truebalance.matching.subset_sum import find_combinations
+
+# Invoices posted up to this many days before a payment are considered for invoice combinations
+INVOICE_COMBINATION_LOOKBACK_DAYS = 365
 
 @frappe.whitelist()
-def get_vouchers_for_reco(bank_transaction_name, document_types, from_date, to_date, filter_by_reference_date, data_source='Bank'):
+def get_vouchers_for_reco(bank_transaction_name, document_types, from_date, to_date, filter_by_reference_date, data_source='Bank', response_format=None, top_n=None,
+                          amount_tolerance=None, tolerance_type='absolute', date_window=None):
     """
     Handles fetching of internal matching vouchers.
     Switches logic based on data_source: Bank (calls ERPNext core) vs. Debtor (custom AR query).
     
     bank_transaction_name is the name of the external statement entry.
+
+    Vouchers are scored against the transaction (see matching/scoring.py) and returned best match first,
+    with their score breakdown and match flags. Pass top_n to only get the best N vouchers.
+
+    Pass amount_tolerance to only get vouchers whose amount is within the tolerance of the transaction's
+    unallocated amount - an absolute amount, or a percentage with tolerance_type="percentage". The band is
+    part of the query: 0 only returns exact amounts (an indexed lookup), and a wider band is only queried
+    if the exact amounts do not already fill top_n. Pass date_window (days) to only get vouchers posted within
+    that many days of the transaction date instead of the whole period.
+
+    Pass response_format="compact" to get the vouchers in the compact columnar format (see response_format.py).
+    """
+    transaction = _get_transaction_for_scoring(bank_transaction_name, data_source)
+
+    if transaction and amount_tolerance not in (None, ""):
+        vouchers = _get_vouchers_in_amount_window(transaction, document_types, from_date, to_date, data_source, top_n,
+                                                  flt(amount_tolerance), tolerance_type, date_window)
+    else:
+        vouchers = _get_vouchers_for_reco(bank_transaction_name, document_types, from_date, to_date,
+                                          filter_by_reference_date, data_source)
+
+    if transaction:
+        vouchers = rank_candidates(transaction, vouchers, cint(top_n) or None)
+
+    return format_rows(vouchers, response_format)
+
+@frappe.whitelist()
+def get_match_suggestions(bank_account, from_date, to_date, document_types=None, data_source='Bank', top_k=3):
+    """
+    Suggested vouchers for all unreconciled transactions of a bank account (or party when data_source='Debtor')
+    in the period: {transaction name: [best top_k vouchers, with their score and match flags]}.
+
+    Open vouchers are fetched once for the whole list and scored against every transaction together
+    (see matching/batch_scoring.py).
+    """
+    transactions, vouchers = _get_unreconciled_transactions_and_vouchers(bank_account, from_date, to_date,
+                                                                          document_types, data_source)
+
+    return get_top_k_suggestions(transactions, vouchers, cint(top_k))
+
+@frappe.whitelist()
+def get_auto_match_proposals(bank_account, from_date, to_date, document_types=None, data_source='Bank',
+                             amount_tolerance=None, date_tolerance=None):
+    """
+    Conflict free match proposals for the unreconciled transactions of a bank account (or party when
+    data_source='Debtor') in the period - every transaction and every voucher is proposed at most once
+    (see matching/assignment.py).
+
+    amount_tolerance is the share of the transaction amount the voucher amount may differ by (default 1%),
+    date_tolerance the number of days its posting / reference date may differ by (default 30).
+
+    The proposals can be accepted in bulk with accept_auto_match_proposals.
+    """
+    transactions, vouchers = _get_unreconciled_transactions_and_vouchers(bank_account, from_date, to_date,
+                                                                          document_types, data_source)
+
+    proposals = assignment.get_auto_match_proposals(
+        transactions,
+        vouchers,
+        amount_tolerance=assignment.AMOUNT_TOLERANCE if amount_tolerance in (None, "") else flt(amount_tolerance),
+        date_tolerance=assignment.DATE_TOLERANCE_DAYS if date_tolerance in (None, "") else cint(date_tolerance),
+    )
+
+    return [{
+        "transaction": proposal["transaction"].name,
+        "company": proposal["transaction"].company,
+        "date": proposal["transaction"].date,
+        "description": proposal["transaction"].description,
+        "reference_number": proposal["transaction"].reference_number,
+        "unallocated_amount": proposal["transaction"].unallocated_amount,
+        "currency": proposal["transaction"].currency,
+        "voucher": proposal["voucher"],
+        "allocated_amount": proposal["allocated_amount"],
+    } for proposal in proposals]
+
+@frappe.whitelist(methods=["POST"])
+def accept_auto_match_proposals(proposals, data_source='Bank'):
+    """
+    Reconcile each transaction with its proposed voucher - in one request (see reconcile_bulk).
+
+    proposals: [{"transaction": name, "payment_doctype": voucher doctype, "payment_name": voucher name, "amount": allocated amount}]
+
+    Returns the result of each proposal: [{"bank_transaction_name", "status", "message", "unallocated_amount"}]
+    """
+    if isinstance(proposals, str):
+        proposals = json.loads(proposals)
+
+    vouchers = [(proposal["payment_doctype"], proposal["payment_name"]) for proposal in proposals]
+    transactions = [proposal["transaction"] for proposal in proposals]
+
+    if len(set(vouchers)) != len(vouchers) or len(set(transactions)) != len(transactions):
+        frappe.throw(_("A transaction or voucher can only be part of one proposal"))
+
+    return reconcile_bulk([{
+        "bank_transaction_name": proposal["transaction"],
+        "vouchers": [{
+            "payment_doctype": proposal["payment_doctype"],
+            "payment_name": proposal["payment_name"],
+            "amount": proposal.get("amount"),
+        }],
+    } for proposal in proposals], data_source=data_source)
+
+@frappe.whitelist()
+def get_invoice_combinations(bank_transaction_name, data_source='Bank', tolerance=0, max_results=10):
+    """
+    Combinations of outstanding invoices of the transaction's party whose outstanding amounts add up to the
+    unallocated amount of the transaction (within the tolerance) - for payments that settle several invoices at once.
+
+    Only invoices posted in the year up to the transaction date are considered, closest to it first
+    (see matching/subset_sum.py). Returns [{"vouchers": [...], "total": ..., "difference": ...}], fewest invoices first.
+    """
+    transaction = _get_transaction_for_scoring(bank_transaction_name, data_source)
+
+    if not transaction or not transaction.party or transaction.party_type not in ("Customer", "Supplier"):
+        return []
+
+    date = getdate(transaction.date)
+    from_date = add_days(date, -INVOICE_COMBINATION_LOOKBACK_DAYS)
+    if transaction.party_type == "Supplier":
+        invoice_doctype, invoice_direction = "Purchase Invoice", "withdrawal"
+    else:
+        invoice_doctype, invoice_direction = "Sales Invoice", "deposit"
+
+    # Open invoices (not credit notes) of the party from the open items cache, closest to the transaction date first
+    invoices = sorted((
+        item for item in get_party_vouchers(transaction.party, transaction.party_type, transaction.company)
+        if item["doctype"] == invoice_doctype
+        and item["direction"] == invoice_direction
+        and from_date <= getdate(item["posting_date"]) <= date
+    ), key=lambda invoice: invoice["posting_date"], reverse=True)
+
+    precision = cint(frappe.db.get_default("currency_precision")) or 2
+
+    combinations = find_combinations(flt(transaction.unallocated_amount), [flt(invoice["paid_amount"]) for invoice in invoices],
+                                     tolerance=flt(tolerance), precision=precision, max_results=cint(max_results) or 10)
+
+    results = []
+    for combination in combinations:
+        vouchers = sorted((invoices[index] for index in combination), key=lambda invoice: invoice["posting_date"])
+        total = flt(sum(flt(voucher["paid_amount"]) for voucher in vouchers), precision)
+
+        results.append({
+            "vouchers": vouchers,
+            "total": total,
+            "difference": flt(flt(transaction.unallocated_amount) - total, precision),
+        })
+
+    return results
+
+@frappe.whitelist()
+def get_transaction_groups(bank_account, from_date, to_date, document_types=None, date_window=None, max_groups_per_voucher=3):
+    """
+    Groups of unreconciled bank transactions whose unallocated amounts add up to the unallocated amount of one
+    voucher dated within date_window days (default 7) - e.g. card settlements or split wires
+    (see matching/grouping.py).
+
+    A group can be reconciled with reconcile_transaction_group.
+    """
+    transactions, vouchers = _get_unreconciled_transactions_and_vouchers(bank_account, from_date, to_date, document_types)
+
+    groups = find_transaction_groups(
+        transactions,
+        vouchers,
+        date_window=DATE_WINDOW_DAYS if date_window in (None, "") else cint(date_window),
+        max_groups_per_voucher=cint(max_groups_per_voucher) or 3,
+        precision=cint(frappe.db.get_default("currency_precision")) or 2,
+    )
+
+    return [{
+        "voucher": group["voucher"],
+        "transactions": [{
+            "name": transaction.name,
+            "date": transaction.date,
+            "description": transaction.description,
+            "reference_number": transaction.reference_number,
+            "unallocated_amount": transaction.unallocated_amount,
+            "currency": transaction.currency,
+        } for transaction in group["transactions"]],
+        "total": group["total"],
+    } for group in groups]
+
+def _get_unreconciled_transactions_and_vouchers(bank_account, from_date, to_date, document_types=None, data_source='Bank'):
+    """
+    The unreconciled transactions of a bank account (or party) in the period and the open vouchers they can be matched with
+    """
+    source = get_transaction_source(bank_account, from_date, to_date, data_source=data_source)
+
+    if not source:
+        return [], []
+
+    transactions = (frappe.qb.from_(source.table)
+                    .select(*source.fields)
+                    .where(Criterion.all(source.conditions))
+                    .run(as_dict=True))
+
+    if not transactions:
+        return [], []
+
+    if data_source == 'Debtor':
+        # Open items are not limited to the period - statements settle invoices from any time
+        vouchers = get_debtor_statement_vouchers(bank_account)
+    else:
+        if isinstance(document_types, str):
+            document_types = frappe.parse_json(document_types)
+        vouchers = get_open_vouchers(bank_account, from_date, to_date, document_types)
+
+    return transactions, vouchers
+
+def _get_transaction_for_scoring(bank_transaction_name, data_source='Bank'):
+    if data_source == 'Debtor':
+        return frappe.db.get_value('Debtor Statement Entry', bank_transaction_name, [
+            'statement_date as date', 'unallocated_amount', 'customer_reference as reference_number', 'description', 'party', 'party_type',
+            'company', 'payment_amount_credit as deposit', 'payment_amount_debit as withdrawal'
+        ], as_dict=True)
+
+    return frappe.db.get_value('Bank Transaction', bank_transaction_name, [
+        'date', 'unallocated_amount', 'reference_number', 'description', 'party', 'party_type',
+        'company', 'bank_account', 'deposit', 'withdrawal'
+    ], as_dict=True)
+
+def _get_vouchers_in_amount_window(transaction, document_types, from_date, to_date, data_source, top_n,
+                                   amount_tolerance, tolerance_type='absolute', date_window=None):
+    """
+    Vouchers in the direction of the transaction with an amount within the tolerance of its unallocated amount -
+    exact amounts first, the wider band only if the exact amounts do not fill top_n
     """
+    precision = cint(frappe.db.get_default("currency_precision")) or 2
+    amount = flt(abs(flt(transaction.unallocated_amount)), precision)
+    band = flt(amount * amount_tolerance / 100 if tolerance_type == 'percentage' else amount_tolerance, precision)
+    direction = get_direction(transaction)
+
+    has_date_window = date_window not in (None, "")
+    if has_date_window:
+        from_date = getdate(add_days(transaction.date, -cint(date_window)))
+        to_date = getdate(add_days(transaction.date, cint(date_window)))
+
+    if data_source == 'Debtor':
+        if not transaction.party:
+            return []
+
+        # Open items are already in the cache - the window is applied to them here. They are not limited to
+        # the period unless a date window is given.
+        return [
+            voucher for voucher in get_debtor_statement_vouchers(transaction.party, transaction.party_type, transaction.company)
+            if voucher["direction"] == direction
+            and abs(flt(voucher["paid_amount"]) - amount) <= band
+            and (not has_date_window or from_date <= getdate(voucher["posting_date"]) <= to_date)
+        ]
+
+    if isinstance(document_types, str):
+        document_types = frappe.parse_json(document_types)
+
+    vouchers = get_open_vouchers(transaction.bank_account, from_date, to_date, document_types, direction, (amount, amount))
+
+    if band <= 0 or (cint(top_n) and len(vouchers) >= cint(top_n)):
+        return vouchers
+
+    exact = {(voucher.doctype, voucher.name) for voucher in vouchers}
+
+    return vouchers + [
+        voucher for voucher in get_open_vouchers(transaction.bank_account, from_date, to_date, document_types,
+                                                 direction, (max(0, amount - band), amount + band))
+        if (voucher.doctype, voucher.name) not in exact
+    ]
+
+def _get_vouchers_for_reco(bank_transaction_name, document_types, from_date, to_date, filter_by_reference_date, data_source='Bank'):
     
     if data_source == 'Debtor':
         # --- Debtor Logic: Find Sales Invoices and Payments for the Customer ---
@@ -24,74 +304,9 @@ def get_vouchers_for_reco(bank_transaction_name, document_types, from_date, to_d
             # Should not happen if transactions.py worked, but handled defensively
             return []
         
-        linked_vouchers = []
-        
         if dse.party and dse.party_type == 'Customer':
-            
-            # --- 2. Query Outstanding Sales Invoices (The core AR balance entry) ---
-            invoices = frappe.get_all(
-                "Sales Invoice",
-                filters={
-                    "customer": dse.party,
-                    "docstatus": 1,
-                    # Target only open invoices
-                    "outstanding_amount": (">", 0), 
-                    "posting_date": ['between', [from_date, to_date]],
-                },
-                # Alias fields to match the LinkedPayment interface expected by the UI
-                fields=["name", "posting_date", "outstanding_amount as paid_amount", "customer as party", 'currency', 'due_date'],
-                order_by="posting_date asc"
-            )
-
-            # Map Invoices to the LinkedPayment structure 
-            mapped_invoices = [{
-                'doctype': 'Sales Invoice',
-                'name': inv.name,
-                'paid_amount': inv.paid_amount,
-                'posting_date': str(inv.posting_date),
-                'currency': inv.currency,
-                'party': inv.party,
-                'party_type': 'Customer',
-                'rank': 10, # Mock rank for UI to display it
-                'reference_no': inv.name,
-                'reference_date': str(inv.posting_date)
-            } for inv in invoices]
-            
-            linked_vouchers.extend(mapped_invoices)
-            
-            # --- 3. Query Unallocated Payment Entries (If a payment was booked on account) ---
-            payments = frappe.get_all(
-                "Payment Entry",
-                filters={
-                    "party": dse.party,
-                    "party_type": "Customer",
-                    "docstatus": 1,
-                    # Target only unallocated payments
-                    "unallocated_amount": (">", 0), 
-                    "posting_date": ['between', [from_date, to_date]],
-                },
-                fields=["name", "posting_date", "unallocated_amount as paid_amount", "party", 'paid_from_account_currency as currency', 'reference_no', 'reference_date'],
-                order_by="posting_date asc"
-            )
-
-            mapped_payments = [{
-                'doctype': 'Payment Entry',
-                'name': pay.name,
-                'paid_amount': pay.paid_amount,
-                'posting_date': str(pay.posting_date),
-                'currency': pay.currency,
-                'party': pay.party,
-                'party_type': 'Customer',
-                'rank': 5, # Lower rank than Invoices
-                'reference_no': pay.reference_no or pay.name,
-                'reference_date': str(pay.reference_date) if pay.reference_date else str(pay.posting_date)
-            } for pay in payments]
-
-            linked_vouchers.extend(mapped_payments)
-
-            # NOTE: You would add fuzzy matching logic here later to sort the 'rank' field.
-            
-            return linked_vouchers
+            # Open items of the customer - from the cache, whenever they were posted
+            return get_debtor_statement_vouchers(dse.party, dse.party_type, dse.company)
             
         return []
         
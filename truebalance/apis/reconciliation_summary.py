@@ -0,0 +1,111 @@
+import frappe
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Count, Min, Sum
+from frappe.utils import cint, getdate
+from pypika import Order
+from pypika.terms import ValueWrapper
+from truebalance.apis.transactions import get_permission_condition
+
+# Summaries are cached until a transaction changes - or for an hour at most
+SUMMARY_CACHE_TTL = 60 * 60
+
+SUMMARY_DOCTYPES = {
+    "Bank": "Bank Transaction",
+    "Debtor": "Debtor Statement Entry",
+}
+
+@frappe.whitelist(methods=["GET"])
+def get_reconciliation_summary(company: str, from_date: str, to_date: str, data_source: str = 'Bank'):
+    """
+    Counts and sums of unreconciled deposits and withdrawals, rule matched vs unmatched counts and the
+    oldest unreconciled date - per bank account (or per party when data_source='Debtor') for the period.
+
+    Only the transactions the user can read are counted. Results are cached per user and invalidated whenever
+    a transaction of the data source changes.
+    """
+    doctype = SUMMARY_DOCTYPES.get(data_source, "Bank Transaction")
+
+    frappe.has_permission(doctype, "read", throw=True)
+    frappe.has_permission("Company", "read", company, throw=True)
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+
+    cache_key = (f"truebalance:reconciliation_summary:{doctype}:{_get_generation(doctype)}:{frappe.session.user}"
+                 f":{company}:{from_date}:{to_date}")
+    summary = frappe.cache.get_value(cache_key)
+
+    if summary is None:
+        summary = _get_summary_query(doctype, company, from_date, to_date).run(as_dict=True)
+        frappe.cache.set_value(cache_key, summary, expires_in_sec=SUMMARY_CACHE_TTL)
+
+    return summary
+
+def _get_summary_query(doctype, company, from_date, to_date):
+    table = frappe.qb.DocType(doctype)
+
+    if doctype == "Debtor Statement Entry":
+        account = table.party
+        date = table.statement_date
+        deposit = table.payment_amount_credit
+        withdrawal = table.payment_amount_debit
+        is_unreconciled = table.is_reconciled == 0
+        is_valid = table.docstatus == 0
+    else:
+        account = table.bank_account
+        date = table.date
+        deposit = table.deposit
+        withdrawal = table.withdrawal
+        is_unreconciled = table.unallocated_amount > 0
+        is_valid = table.docstatus == 1
+
+    is_unreconciled_deposit = is_unreconciled & (deposit > 0)
+    is_unreconciled_withdrawal = is_unreconciled & (withdrawal > 0)
+
+    if frappe.get_meta(doctype).has_field("matched_rule"):
+        rule_matched_count = Sum(Case().when(is_unreconciled & table.matched_rule.isnotnull(), 1).else_(0))
+        rule_unmatched_count = Sum(Case().when(is_unreconciled & table.matched_rule.isnull(), 1).else_(0))
+    else:
+        # Rules are not evaluated for this doctype
+        rule_matched_count = ValueWrapper(0)
+        rule_unmatched_count = Sum(Case().when(is_unreconciled, 1).else_(0))
+
+    return (frappe.qb.from_(table)
+            .select(
+                account.as_("account"),
+                Count("*").as_("total_count"),
+                Sum(Case().when(is_unreconciled, 1).else_(0)).as_("unreconciled_count"),
+                Sum(Case().when(is_unreconciled_deposit, 1).else_(0)).as_("unreconciled_deposit_count"),
+                Sum(Case().when(is_unreconciled_deposit, table.unallocated_amount).else_(0)).as_("unreconciled_deposit_amount"),
+                Sum(Case().when(is_unreconciled_withdrawal, 1).else_(0)).as_("unreconciled_withdrawal_count"),
+                Sum(Case().when(is_unreconciled_withdrawal, table.unallocated_amount).else_(0)).as_("unreconciled_withdrawal_amount"),
+                rule_matched_count.as_("rule_matched_count"),
+                rule_unmatched_count.as_("rule_unmatched_count"),
+                Min(Case().when(is_unreconciled, date)).as_("oldest_unreconciled_date"),
+            )
+            .where(table.company == company)
+            .where(is_valid)
+            .where(get_permission_condition(doctype))
+            .where(date[from_date:to_date])
+            .groupby(account)
+            .orderby(account, order=Order.asc)
+    )
+
+def invalidate_reconciliation_summary(doc, method=None):
+    """
+    doc_events hook - a change to any transaction invalidates the cached summaries of its doctype
+    """
+    clear_reconciliation_summary_cache(doc.doctype)
+
+def clear_reconciliation_summary_cache(doctype: str = "Bank Transaction"):
+    """
+    Invalidate the cached summaries by moving to a new generation - old entries are never read again and expire.
+
+    Code that updates transactions in bulk (without going through the document) should call this directly.
+    """
+    frappe.cache.incr(frappe.cache.make_key(_get_generation_key(doctype)))
+
+def _get_generation(doctype) -> int:
+    return cint(frappe.safe_decode(frappe.cache.get(frappe.cache.make_key(_get_generation_key(doctype)))))
+
+def _get_generation_key(doctype):
+    return f"truebalance:reconciliation_summary:{doctype}:generation"
@@ -0,0 +1,102 @@
+"""
+Compact columnar encoding for large lists of rows returned by the APIs.
+
+Instead of repeating every key on every row, the column names are sent once and the values
+as one array per column:
+
+    {
+        "format": "compact",
+        "length": 2,
+        "columns": ["name", "date", "currency", "deposit"],
+        "data": [["BT-001", "BT-002"], [0, 3], [0, 0], [100.0, 250.0]],
+        "dates": {"base": "2025-04-01", "columns": ["date"]},
+        "dictionaries": {"currency": ["INR"]}
+    }
+
+- Date columns are sent as day offsets from `dates.base`
+- String columns with many repeated values are dictionary encoded - the value is an index into `dictionaries[column]`
+
+The frontend decodes it back to a list of objects with `decodeCompactRows` (src/lib/utils.ts).
+"""
+from __future__ import annotations
+import datetime
+
+COMPACT_FORMAT = "compact"
+
+# A string column is dictionary encoded when it has at most this share of distinct values
+DICTIONARY_MAX_DISTINCT_RATIO = 0.5
+
+
+def format_rows(rows: list, response_format: str | None = None):
+    """
+    Returns the rows as is, or encoded in the compact columnar format if it was requested
+    """
+    if response_format == COMPACT_FORMAT:
+        return to_compact(rows)
+    return rows
+
+
+def to_compact(rows: list) -> dict:
+    columns = []
+    for row in rows:
+        for column in row:
+            if column not in columns:
+                columns.append(column)
+
+    data = [[row.get(column) for row in rows] for column in columns]
+
+    date_columns = []
+    dictionaries = {}
+
+    all_dates = [
+        value for values in data for value in values
+        if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+    ]
+    base = min(all_dates) if all_dates else None
+
+    for index, column in enumerate(columns):
+        values = data[index]
+        present = [value for value in values if value is not None]
+
+        if not present:
+            continue
+
+        if base and all(_is_date(value) for value in present):
+            data[index] = [(value - base).days if value is not None else None for value in values]
+            date_columns.append(column)
+
+        elif all(isinstance(value, str) for value in present):
+            distinct = list(dict.fromkeys(present))
+
+            if len(distinct) <= len(values) * DICTIONARY_MAX_DISTINCT_RATIO:
+                positions = {value: position for position, value in enumerate(distinct)}
+                data[index] = [positions[value] if value is not None else None for value in values]
+                dictionaries[column] = distinct
+
+        elif any(isinstance(value, (datetime.datetime, datetime.date, datetime.timedelta)) for value in present):
+            # Datetimes (and dates mixed with other values) are sent as ISO strings
+            data[index] = [_to_iso(value) for value in values]
+
+    return {
+        "format": COMPACT_FORMAT,
+        "length": len(rows),
+        "columns": columns,
+        "data": data,
+        "dates": {"base": base.isoformat() if base else None, "columns": date_columns},
+        "dictionaries": dictionaries,
+    }
+
+
+def _is_date(value) -> bool:
+    return isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+
+
+def _to_iso(value):
+    if isinstance(value, datetime.datetime):
+        # Same as the default JSON encoding of datetimes in Frappe
+        return value.isoformat(sep=" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    return value
@@ -0,0 +1,71 @@
+import frappe
+from frappe import _
+from truebalance.apis.bank_reconciliation import (
+    create_bank_entry_for_transaction,
+    create_internal_transfer_for_transaction,
+    create_payment_entry_for_transaction,
+    enqueue_bulk_job,
+)
+
+@frappe.whitelist(methods=["POST"])
+def apply_rules(company: str | None = None,
+                rule: str | None = None,
+                bank_account: str | None = None,
+                from_date: str | None = None,
+                to_date: str | None = None):
+    """
+    Create the voucher that each matched rule specifies (Bank Entry, Payment Entry or Transfer) for all
+    unreconciled transactions matched to a rule, and reconcile them. Runs in the background (see enqueue_bulk_job).
+
+    Returns the job ID - progress and the per-transaction report can be read with `truebalance.apis.jobs.get_job_status`.
+    """
+    frappe.has_permission("Bank Transaction", "write", throw=True)
+    frappe.has_permission("Journal Entry", "create", throw=True)
+    frappe.has_permission("Payment Entry", "create", throw=True)
+
+    filters = {
+        "status": "Unreconciled",
+        "docstatus": 1,
+        "matched_rule": rule if rule else ["is", "set"],
+        "unallocated_amount": [">", 0],
+    }
+
+    if company:
+        filters["company"] = company
+
+    if bank_account:
+        filters["bank_account"] = bank_account
+
+    if from_date and to_date:
+        filters["date"] = ["between", [from_date, to_date]]
+    elif from_date:
+        filters["date"] = [">=", from_date]
+    elif to_date:
+        filters["date"] = ["<=", to_date]
+
+    transaction_names = frappe.get_all("Bank Transaction", filters=filters, pluck="name", order_by="date asc, name asc")
+
+    return enqueue_bulk_job("Apply Rules",
+                            "truebalance.apis.rule_application.apply_rule_to_transaction",
+                            transaction_names)
+
+def apply_rule_to_transaction(bank_transaction_name: str):
+    """
+    Create the voucher that the transaction's matched rule specifies and reconcile it
+    """
+    matched_rule = frappe.db.get_value("Bank Transaction", bank_transaction_name, "matched_rule")
+
+    if not matched_rule:
+        frappe.throw(_("Bank Transaction {0} is not matched to a rule").format(bank_transaction_name))
+
+    rule = frappe.get_cached_doc("Mint Bank Transaction Rule TB", matched_rule)
+
+    if rule.classify_as == "Bank Entry":
+        return create_bank_entry_for_transaction(bank_transaction_name, rule.account,
+                                                 party_type=rule.party_type, party=rule.party)
+    elif rule.classify_as == "Payment Entry":
+        return create_payment_entry_for_transaction(bank_transaction_name, rule.party_type, rule.party, rule.account)
+    elif rule.classify_as == "Transfer":
+        return create_internal_transfer_for_transaction(bank_transaction_name, rule.account)
+
+    frappe.throw(_("Rule {0} does not specify how to classify the transaction").format(rule.name))
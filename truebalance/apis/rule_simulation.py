@@ -0,0 +1,227 @@
+import frappe
+import json
+import re
+from frappe import _
+from frappe.query_builder.functions import Count
+from frappe.utils import cint, flt
+from truebalance.apis.jobs import append_job_results, create_job, get_job, get_job_status, update_job
+from truebalance.apis.rules import RULE_EVALUATION_PAGE_SIZE, get_rule_docs, get_rule_matcher
+from truebalance.apis.transactions import get_permission_condition
+from truebalance.matching.regex_safety import is_prone_to_catastrophic_backtracking
+from truebalance.matching.rule_matcher import SHARED_TIMING_KEY
+
+@frappe.whitelist(methods=["POST"])
+def start_rule_simulation(company: str,
+                          from_date: str,
+                          to_date: str,
+                          bank_account: str | None = None,
+                          draft_rule: dict | str | None = None):
+    """
+    Dry run the rules of a company against historical bank transactions (reconciled and unreconciled) in the background.
+
+    Nothing is written to the transactions. A draft rule (not saved yet) can be passed to see how it would interact
+    with the existing rules - it is placed at its priority, or after all other rules if it does not have one.
+
+    Returns the simulation ID - use `get_rule_simulation_results` to read the progress, rule statistics and results.
+    """
+    frappe.has_permission("Mint Bank Transaction Rule TB", "read", throw=True)
+    frappe.has_permission("Bank Transaction", "read", throw=True)
+    frappe.has_permission("Company", "read", company, throw=True)
+
+    if bank_account:
+        frappe.has_permission("Bank Account", "read", bank_account, throw=True)
+
+    if isinstance(draft_rule, str):
+        draft_rule = json.loads(draft_rule)
+
+    if draft_rule:
+        # Fail early on invalid patterns instead of in the background job
+        for row in draft_rule.get("description_rules") or []:
+            if row.get("check") == "Regex":
+                try:
+                    re.compile(row.get("value") or "")
+                except re.error:
+                    frappe.throw(_("Invalid regex pattern."))
+
+                if is_prone_to_catastrophic_backtracking(row.get("value") or ""):
+                    frappe.throw(_("Regex pattern {0} has nested or overlapping repetitions that can make matching extremely slow. Please simplify it.").format(frappe.bold(row.get("value"))))
+
+    simulation_id = create_job("Rule Simulation",
+                               company=company,
+                               from_date=from_date,
+                               to_date=to_date,
+                               bank_account=bank_account)
+
+    frappe.enqueue(method=_run_rule_simulation,
+                   queue="long",
+                   job_id=f"truebalance_rule_simulation::{simulation_id}",
+                   simulation_id=simulation_id,
+                   company=company,
+                   from_date=from_date,
+                   to_date=to_date,
+                   bank_account=bank_account,
+                   draft_rule=draft_rule)
+
+    return simulation_id
+
+@frappe.whitelist(methods=["GET"])
+def get_rule_simulation_results(simulation_id: str, start: int = 0, page_length: int = 100):
+    """
+    Returns the status of a simulation, per rule statistics (once completed) and a page of per-transaction results
+    """
+    state = get_job(simulation_id)
+
+    if state and state.job_type != "Rule Simulation":
+        frappe.throw(_("{0} is not a rule simulation").format(simulation_id))
+
+    return get_job_status(simulation_id, start, page_length)
+
+def _run_rule_simulation(simulation_id, company, from_date, to_date, bank_account=None, draft_rule=None):
+
+    update_job(simulation_id, status="Running")
+
+    try:
+        rule_docs = get_rule_docs(company)
+
+        if draft_rule:
+            rule_docs = _add_draft_rule(rule_docs, draft_rule, company)
+
+        # A regex that times out in a dry run is reported in the results - saved rules are not flagged,
+        # and the draft rule has nothing to flag
+        timed_out_rules = set()
+        matcher = get_rule_matcher(rule_docs, on_regex_timeout=lambda rule: timed_out_rules.add(rule.name))
+
+        stats = {
+            rule.name: {
+                "rule": rule.name,
+                "priority": rule.priority,
+                "hits": 0,
+                "matches": 0,
+                "shadowed": 0,
+                "shadowed_by": {},
+                "overlaps": {},
+            } for rule in rule_docs
+        }
+
+        bank_transaction = frappe.qb.DocType("Bank Transaction")
+        query = (frappe.qb.from_(bank_transaction)
+                 .where(bank_transaction.company == company)
+                 .where(bank_transaction.docstatus == 1)
+                 .where(bank_transaction.date[from_date:to_date])
+                 # The job runs as the user who started it - only their permitted transactions are read
+                 .where(get_permission_condition("Bank Transaction"))
+        )
+
+        if bank_account:
+            query = query.where(bank_transaction.bank_account == bank_account)
+
+        total = query.select(Count("*")).run()[0][0]
+        update_job(simulation_id, total=total)
+
+        timings = {}
+        processed = 0
+        last_name = None
+
+        while True:
+            page_query = (query.select(bank_transaction.name, bank_transaction.bank_account, bank_transaction.company,
+                                       bank_transaction.date, bank_transaction.withdrawal, bank_transaction.deposit,
+                                       bank_transaction.description, bank_transaction.status, bank_transaction.matched_rule)
+                          .orderby(bank_transaction.name)
+                          .limit(RULE_EVALUATION_PAGE_SIZE))
+
+            if last_name:
+                page_query = page_query.where(bank_transaction.name > last_name)
+
+            transactions = page_query.run(as_dict=True)
+
+            if not transactions:
+                break
+
+            rows = []
+
+            for transaction in transactions:
+                matches = [rule.name for rule in matcher.match_all(transaction, timings)]
+                _record_matches(stats, matches)
+
+                rows.append({
+                    "name": transaction.name,
+                    "date": transaction.date,
+                    "bank_account": transaction.bank_account,
+                    "description": transaction.description,
+                    "withdrawal": transaction.withdrawal,
+                    "deposit": transaction.deposit,
+                    "status": transaction.status,
+                    "current_rule": transaction.matched_rule,
+                    "simulated_rule": matches[0] if matches else None,
+                    "matching_rules": matches,
+                })
+
+            append_job_results(simulation_id, rows)
+
+            processed += len(transactions)
+            last_name = transactions[-1].name
+            update_job(simulation_id, processed=processed)
+
+        for rule_name, rule_stats in stats.items():
+            rule_stats["time_ms"] = flt(timings.get(rule_name, 0) * 1000, 3)
+            # A rule that matches transactions but never wins is shadowed by higher priority rules
+            rule_stats["is_shadowed"] = rule_stats["matches"] > 0 and rule_stats["hits"] == 0
+            rule_stats["regex_timed_out"] = rule_name in timed_out_rules
+
+        update_job(simulation_id,
+                   status="Completed",
+                   processed=processed,
+                   rule_stats=sorted(stats.values(), key=lambda rule_stats: rule_stats["priority"] or 0),
+                   shared_time_ms=flt(timings.get(SHARED_TIMING_KEY, 0) * 1000, 3))
+
+    except Exception:
+        frappe.log_error(title="Rule Simulation Error", message=frappe.get_traceback())
+        update_job(simulation_id, status="Failed")
+
+def _record_matches(stats, matches):
+    """
+    Update hit, overlap and shadowing counts for the (priority ordered) rules that matched a transaction
+    """
+    if not matches:
+        return
+
+    winner = matches[0]
+    stats[winner]["hits"] += 1
+
+    for index, rule_name in enumerate(matches):
+        rule_stats = stats[rule_name]
+        rule_stats["matches"] += 1
+
+        if index > 0:
+            rule_stats["shadowed"] += 1
+            rule_stats["shadowed_by"][winner] = rule_stats["shadowed_by"].get(winner, 0) + 1
+
+        for other_rule in matches:
+            if other_rule != rule_name:
+                rule_stats["overlaps"][other_rule] = rule_stats["overlaps"].get(other_rule, 0) + 1
+
+def _add_draft_rule(rule_docs, draft_rule, company):
+    """
+    Insert an unsaved rule into the priority ordered list of rules
+    """
+    draft = frappe._dict({
+        "name": draft_rule.get("rule_name") or _("Draft Rule"),
+        "company": company,
+        "transaction_type": draft_rule.get("transaction_type") or "Any",
+        "min_amount": flt(draft_rule.get("min_amount")),
+        "max_amount": flt(draft_rule.get("max_amount")),
+        "priority": cint(draft_rule.get("priority")),
+        "description_rules": [frappe._dict(row) for row in draft_rule.get("description_rules") or []],
+    })
+
+    # Remove the saved version of the rule if the draft is an edit of an existing rule
+    rule_docs = [rule for rule in rule_docs if rule.name != draft.name]
+
+    if not draft.priority:
+        draft.priority = max((cint(rule.priority) for rule in rule_docs), default=0) + 1
+
+    # The draft wins ties - same as moving it to that position in the list
+    position = next((index for index, rule in enumerate(rule_docs) if cint(rule.priority) >= draft.priority), len(rule_docs))
+    rule_docs.insert(position, draft)
+
+    return rule_docs
@@ -1,110 +1,679 @@
 import frappe
-import re
+from frappe import _
+from collections import defaultdict
+from math import ceil
+from pypika import CustomFunction
+from pypika.terms import Criterion
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Count
+from frappe.utils import cint, create_batch, now
+from truebalance.apis.reconciliation_summary import clear_reconciliation_summary_cache
+from truebalance.matching.rule_matcher import RuleMatcher
+
+# Number of transactions fetched and evaluated per page. Progress is checkpointed after every page.
+RULE_EVALUATION_PAGE_SIZE = 5000
+
+# Number of transactions written back per UPDATE statement (and per commit)
+RULE_EVALUATION_BATCH_SIZE = 1000
+
+# In parallel mode, bank accounts with more pending transactions than this are split into hash ranges
+RULE_EVALUATION_SHARD_SIZE = 20000
+
+# Maximum number of submitted transactions evaluated together when flushing the micro-batch queue
+RULE_EVALUATION_QUEUE_BATCH_SIZE = 500
+
+RULE_EVALUATION_QUEUE_KEY = "truebalance:rule_evaluation:queue"
+
+# Rules that were changed (or "deleted::<company>" markers) waiting for a targeted re-evaluation
+RULE_CHANGE_QUEUE_KEY = "truebalance:rule_evaluation:changed_rules"
+
+RULE_EVALUATION_PROGRESS_EVENT = "truebalance_rule_evaluation_progress"
+
+# Rules whose regex exceeded the time limit, mapped to the "modified" timestamp of the version that was flagged
+FLAGGED_REGEX_RULES_KEY = "truebalance:rule_evaluation:flagged_regex_rules"
+
+# Held (with the run_id) by the run in progress, serial or parallel - only one run evaluates at a time
+RULE_EVALUATION_RUN_LOCK_KEY = "truebalance:rule_evaluation:run_lock"
+RULE_EVALUATION_RUN_TTL = 24 * 60 * 60
+
+# The lock is refreshed after every page - a run that stops refreshing it (e.g. its job was killed) loses it after this
+RULE_EVALUATION_LOCK_TTL = 30 * 60
+
+CRC32 = CustomFunction("CRC32", ["value"])
+Mod = CustomFunction("MOD", ["dividend", "divisor"])
 
 def scheduler_run_rule_evaluation():
 
     automatically_run_rules_on_unreconciled_transactions = frappe.db.get_single_value("Mint Settings TB", "automatically_run_rules_on_unreconciled_transactions")
 
     if automatically_run_rules_on_unreconciled_transactions:
-        _run_rule_evaluation(force_evaluate=False)
+        if frappe.db.get_single_value("Mint Settings TB", "evaluate_rules_in_parallel"):
+            _fan_out_rule_evaluation(force_evaluate=False)
+        else:
+            _run_rule_evaluation(force_evaluate=False)
 
 @frappe.whitelist(methods=["POST"])
-def run_rule_evaluation(force_evaluate=False):
-    frappe.enqueue(method=_run_rule_evaluation, force_evaluate=force_evaluate)
+def run_rule_evaluation(force_evaluate=False, parallel=None):
+    """
+    Run the rule evaluation in the background.
+
+    If parallel is set (defaults to the "Evaluate rules in parallel" setting), the work is split by company, bank account
+    (and hash range for large accounts) into multiple jobs on the long queue.
+    """
+    if parallel is None:
+        parallel = frappe.db.get_single_value("Mint Settings TB", "evaluate_rules_in_parallel")
+
+    if _get_rule_evaluation_run_lock():
+        frappe.throw(_("A rule evaluation is already running. Please wait for it to complete."))
+
+    frappe.enqueue(method=_fan_out_rule_evaluation if cint(parallel) else _run_rule_evaluation,
+                   queue="long",
+                   job_id="truebalance_rule_evaluation",
+                   deduplicate=True,
+                   force_evaluate=force_evaluate)
+
+@frappe.whitelist(methods=["GET"])
+def get_rule_evaluation_progress():
+    """
+    Returns the progress of the rule evaluation run that is in progress (or was interrupted), if any
+    """
+    run = get_rule_evaluation_run()
+
+    # A run that lost its lock without completing (e.g. its jobs were killed) is not running anymore
+    if run and _get_rule_evaluation_run_lock() == run.run_id:
+        return _get_run_progress(run, status="Running")
+
+    checkpoint = get_rule_evaluation_checkpoint()
+
+    if not checkpoint:
+        return None
+
+    return _get_progress(checkpoint, status="Running")
+
+def _fan_out_rule_evaluation(force_evaluate=False):
+    """
+    Coordinator for parallel rule evaluation.
+
+    Splits the pending transactions into shards (one per company and bank account, further split by a hash of the
+    transaction name for large accounts) and enqueues one job per shard. Each shard reports back to the run's counters
+    and the last shard to finish publishes the aggregated result.
+
+    Only one run evaluates at a time - while the shards of a run are still working, a new run (e.g. the hourly one
+    while a manual run is in progress) does nothing, so two runs never advance the same shard checkpoints.
+    """
+    if not frappe.db.count("Mint Bank Transaction Rule TB"):
+        return
+
+    force_evaluate = bool(force_evaluate)
+    run_id = frappe.generate_hash(length=10)
+
+    if not _acquire_rule_evaluation_run_lock(run_id):
+        return
+
+    shards = _get_rule_evaluation_shards(force_evaluate)
+
+    if not shards:
+        _release_rule_evaluation_run_lock(run_id)
+        return
+
+    run = frappe._dict({
+        "run_id": run_id,
+        "force_evaluate": force_evaluate,
+        "total": sum(shard.pop("count") for shard in shards),
+        "shards": len(shards),
+    })
+    set_rule_evaluation_run(run)
+
+    for index, shard in enumerate(shards):
+        frappe.enqueue(method=_run_rule_evaluation,
+                       queue="long",
+                       job_id=f"truebalance_rule_evaluation::{run.run_id}::{index}",
+                       force_evaluate=force_evaluate,
+                       run_id=run.run_id,
+                       **shard)
+
+def _get_rule_evaluation_shards(force_evaluate):
+    """
+    Returns the scopes (company, bank account and optional hash range) that the pending transactions are split into
+    """
+    bank_transaction = frappe.qb.DocType("Bank Transaction")
+
+    query = (frappe.qb.from_(bank_transaction)
+             .select(bank_transaction.company, bank_transaction.bank_account, Count("*").as_("count"))
+             .where(bank_transaction.status == "Unreconciled")
+             .where(bank_transaction.docstatus == 1)
+             .groupby(bank_transaction.company, bank_transaction.bank_account)
+    )
+
+    if not force_evaluate:
+        query = query.where(bank_transaction.is_rule_evaluated == 0)
+
+    shards = []
+
+    for row in query.run(as_dict=True):
+        # Hash ranges rely on CRC32, which is only available on MariaDB
+        shard_count = ceil(row.count / RULE_EVALUATION_SHARD_SIZE) if frappe.db.db_type == "mariadb" else 1
+
+        if shard_count <= 1:
+            shards.append({"company": row.company, "bank_account": row.bank_account, "count": row.count})
+            continue
+
+        for shard_index in range(shard_count):
+            shards.append({
+                "company": row.company,
+                "bank_account": row.bank_account,
+                "shard_index": shard_index,
+                "shard_count": shard_count,
+                # Approximate - only used for the total count of the run
+                "count": row.count // shard_count + (1 if shard_index < row.count % shard_count else 0),
+            })
+
+    return shards
 
-def _run_rule_evaluation(force_evaluate=False):
+def _run_rule_evaluation(force_evaluate=False, company=None, bank_account=None, shard_index=None, shard_count=None, run_id=None):
     """
     Run the rule evaluation for all bank transactions
 
     If force evaluate is set to True, then transactions that were previously evaluated will be evaluated again.
+
+    Transactions are fetched in pages using a keyset cursor on (modified, name). After every page, the results are written
+    back and the cursor is checkpointed - if the job is killed, the next run resumes from the last checkpoint.
+
+    The evaluation can be limited to a company, bank account and a hash range of transaction names - this is used
+    by the parallel mode where every scope runs as its own job (identified by run_id).
+
+    A serial run takes the run lock itself, the shards of a parallel run hold it on behalf of their run. The lock is
+    refreshed after every page - if it was taken over by another run in the meantime, the evaluation stops.
     """
-    rules = frappe.get_all("Mint Bank Transaction Rule TB", fields=["name"], order_by="priority asc")
+    scope = frappe._dict({
+        "company": company,
+        "bank_account": bank_account,
+        "shard_index": shard_index,
+        "shard_count": shard_count,
+    })
 
-    if not rules:
+    if run_id:
+        try:
+            if _refresh_rule_evaluation_run_lock(run_id):
+                _evaluate_rules_in_scope(scope, bool(force_evaluate), run_id, lock_id=run_id)
+        finally:
+            # A shard that fails (or was superseded by a newer run) still counts as complete, so the run always ends
+            _complete_rule_evaluation_shard(run_id)
         return
 
-    filters = {
-        "status": "Unreconciled",
-        "docstatus": 1
-    }
+    lock_id = frappe.generate_hash(length=10)
 
-    if not force_evaluate:
-        filters["is_rule_evaluated"] = 0
+    if not _acquire_rule_evaluation_run_lock(lock_id):
+        return
 
-    unreconciled_transactions = frappe.get_all("Bank Transaction", 
-                                               filters=filters, 
-                                               fields=["name", "bank_account","company", "date", "withdrawal", "deposit", "description", "reference_number"])
-    
-    if not unreconciled_transactions:
+    try:
+        _evaluate_rules_in_scope(scope, bool(force_evaluate), run_id=None, lock_id=lock_id)
+    finally:
+        _release_rule_evaluation_run_lock(lock_id)
+
+def _evaluate_rules_in_scope(scope, force_evaluate, run_id, lock_id):
+    rule_docs = get_rule_docs(scope.company)
+
+    if not rule_docs:
         return
-    
-    rule_docs = []
 
-    for rule in rules:
-        rule_doc = frappe.get_doc("Mint Bank Transaction Rule TB", rule.name)
-        rule_docs.append(rule_doc)
-    
-    # Run evaluation for each transaction
-    for transaction in unreconciled_transactions:
-        evaluate_transaction(transaction, rule_docs)
+    checkpoint = get_rule_evaluation_checkpoint(scope)
+
+    if not checkpoint or checkpoint.force_evaluate != force_evaluate:
+        # Only transactions modified before the run started are considered.
+        # Writing back the results updates "modified", so evaluated transactions never re-enter the cursor.
+        checkpoint = frappe._dict({
+            "scope": scope,
+            "force_evaluate": force_evaluate,
+            "snapshot": now(),
+            "last_modified": None,
+            "last_name": None,
+            "processed": 0,
+            "matched": 0,
+        })
+        checkpoint.total = _get_unreconciled_transactions_query(checkpoint, count=True).run()[0][0]
 
-def evaluate_transaction(transaction, rule_docs):
+    if not checkpoint.total:
+        clear_rule_evaluation_checkpoint(scope)
+        return
 
-    matched_rule = None
+    # Compile the rules once for the whole run
+    matcher = get_rule_matcher(rule_docs)
 
-    for rule in rule_docs:
+    while True:
+        unreconciled_transactions = _get_unreconciled_transactions_query(checkpoint).limit(RULE_EVALUATION_PAGE_SIZE).run(as_dict=True)
 
-        if rule.company != transaction.company:
-            continue
+        if not unreconciled_transactions:
+            break
+
+        # Run evaluation for each transaction
+        results = []
+        for transaction in unreconciled_transactions:
+            results.append((transaction.name, evaluate_transaction(transaction, matcher)))
+
+        write_rule_evaluation_results(results)
+
+        matched = sum(1 for _name, matched_rule in results if matched_rule)
+
+        checkpoint.last_modified = unreconciled_transactions[-1].modified
+        checkpoint.last_name = unreconciled_transactions[-1].name
+        checkpoint.processed += len(results)
+        checkpoint.matched += matched
+
+        set_rule_evaluation_checkpoint(checkpoint)
+
+        if run_id:
+            _record_rule_evaluation_shard_progress(run_id, len(results), matched)
+        else:
+            frappe.publish_realtime(RULE_EVALUATION_PROGRESS_EVENT, _get_progress(checkpoint, status="Running"))
+
+        if not _refresh_rule_evaluation_run_lock(lock_id):
+            # Another run took over - it continues from the checkpoint
+            return
+
+    clear_rule_evaluation_checkpoint(scope)
+
+    if not run_id:
+        frappe.publish_realtime(RULE_EVALUATION_PROGRESS_EVENT, _get_progress(checkpoint, status="Completed"))
+
+def get_rule_docs(company=None):
+    """
+    Returns all rule documents (optionally for a company) ordered by priority
+    """
+    filters = {"company": company} if company else {}
+    rules = frappe.get_all("Mint Bank Transaction Rule TB", filters=filters, fields=["name"], order_by="priority asc")
+
+    return [frappe.get_doc("Mint Bank Transaction Rule TB", rule.name) for rule in rules]
+
+def get_rule_matcher(rule_docs, on_regex_timeout=None):
+    """
+    Compile the rules into a matcher. Rules flagged for a slow regex are skipped until they are edited.
+
+    A rule whose regex exceeds its time limit is flagged with `flag_regex_rule`, unless another `on_regex_timeout`
+    callback is passed - like for dry runs that should not affect the rules.
+    """
+    flagged_rules = _get_flagged_regex_rules()
+    skip_rules = {rule.name for rule in rule_docs if rule.name in flagged_rules and flagged_rules[rule.name] == str(rule.modified)}
+
+    return RuleMatcher(rule_docs, skip_rules=skip_rules, on_regex_timeout=on_regex_timeout or flag_regex_rule)
+
+def flag_regex_rule(rule):
+    """
+    Called when a regex of the rule exceeds its time limit - the rule is skipped by all evaluation runs until it is modified
+    """
+    frappe.cache.hset(FLAGGED_REGEX_RULES_KEY, rule.name, str(rule.modified))
+    frappe.log_error(title="Rule Regex Timeout",
+                     message=_("A regex description rule of {0} exceeded the time limit. The rule will be skipped until it is edited.").format(rule.name),
+                     reference_doctype="Mint Bank Transaction Rule TB",
+                     reference_name=rule.name)
+
+@frappe.whitelist(methods=["GET"])
+def get_flagged_regex_rules():
+    """
+    Returns the names of rules that are currently skipped because their regex exceeded the time limit
+    """
+    flagged_rules = _get_flagged_regex_rules()
+
+    return [
+        rule.name for rule in frappe.get_all("Mint Bank Transaction Rule TB", fields=["name", "modified"])
+        if flagged_rules.get(rule.name) == str(rule.modified)
+    ]
+
+def _get_flagged_regex_rules():
+    # Redis returns the field names (and values) of the hash as bytes
+    return {
+        frappe.safe_decode(rule_name): frappe.safe_decode(modified)
+        for rule_name, modified in (frappe.cache.hgetall(FLAGGED_REGEX_RULES_KEY) or {}).items()
+    }
+
+def queue_transaction_for_rule_evaluation(doc, method=None):
+    """
+    Bank Transaction on_submit hook - pushes the transaction to a Redis backed queue that is flushed in micro-batches,
+    so that new transactions get a suggested rule without waiting for the hourly sweep.
+    """
+    if not frappe.db.get_single_value("Mint Settings TB", "automatically_run_rules_on_unreconciled_transactions"):
+        return
+
+    frappe.cache.rpush(RULE_EVALUATION_QUEUE_KEY, doc.name)
+
+    # Only one flush job is queued at a time - everything submitted until it runs is evaluated in the same batch
+    frappe.enqueue(method=flush_rule_evaluation_queue,
+                   queue="short",
+                   job_id="truebalance_rule_evaluation_queue",
+                   deduplicate=True,
+                   enqueue_after_commit=True)
+
+def flush_rule_evaluation_queue():
+    """
+    Evaluate the bank transactions waiting in the micro-batch queue.
+
+    Transactions that are no longer unreconciled (or were already evaluated) are skipped. Anything left behind
+    (for example if the worker dies) is picked up by the hourly sweep since it is still not evaluated.
+    """
+    matcher = None
 
-        # Run the rules
-
-        # Type rule - we continue searching for a rule if the transaction type does not match
-        if rule.transaction_type == "Withdrawal":
-            if transaction.withdrawal == 0.0:
-                continue
-        
-        if rule.transaction_type == "Deposit":
-            if transaction.deposit == 0.0:
-                continue
-        
-        amount = transaction.withdrawal or transaction.deposit
-        if rule.min_amount and amount < rule.min_amount:
+    while True:
+        transaction_names = [
+            frappe.safe_decode(name)
+            for name in frappe.cache.lrange(RULE_EVALUATION_QUEUE_KEY, 0, RULE_EVALUATION_QUEUE_BATCH_SIZE - 1)
+        ]
+
+        if not transaction_names:
+            break
+
+        frappe.cache.ltrim(RULE_EVALUATION_QUEUE_KEY, len(transaction_names), -1)
+
+        unreconciled_transactions = frappe.get_all("Bank Transaction",
+                                                   filters={
+                                                       "name": ["in", transaction_names],
+                                                       "status": "Unreconciled",
+                                                       "docstatus": 1,
+                                                       "is_rule_evaluated": 0,
+                                                   },
+                                                   fields=["name", "bank_account", "company", "date", "withdrawal", "deposit", "description", "reference_number"])
+
+        if not unreconciled_transactions:
             continue
-        
-        if rule.max_amount and amount > rule.max_amount:
+
+        if matcher is None:
+            rule_docs = get_rule_docs()
+            if not rule_docs:
+                # Nothing to match against - drop the queue
+                frappe.cache.delete_value(RULE_EVALUATION_QUEUE_KEY)
+                return
+            matcher = get_rule_matcher(rule_docs)
+
+        write_rule_evaluation_results([
+            (transaction.name, evaluate_transaction(transaction, matcher))
+            for transaction in unreconciled_transactions
+        ])
+
+def queue_rule_change_evaluation(rule_name):
+    """
+    Queue a targeted re-evaluation after a rule is inserted, updated, reordered or deleted.
+
+    Changes are collected in a set and evaluated together by a single job - so reordering many rules at once
+    only re-evaluates the union of their scopes once.
+    """
+    frappe.cache.sadd(RULE_CHANGE_QUEUE_KEY, rule_name)
+
+    frappe.enqueue(method=_run_rule_change_evaluation,
+                   queue="long",
+                   job_id="truebalance_rule_change_evaluation",
+                   deduplicate=True,
+                   enqueue_after_commit=True)
+
+def _run_rule_change_evaluation():
+    """
+    Re-evaluate only the transactions that can be affected by the changed rules:
+
+    1. Transactions in the rule's company that fall within its type and amount envelope
+    2. Transactions currently pointing at the rule
+    3. Transactions currently pointing at a lower priority rule of the same company
+
+    For deleted rules, pointers are cleared when the rule is deleted - so we re-evaluate the company's unevaluated transactions.
+    """
+    changes = [frappe.safe_decode(change) for change in frappe.cache.smembers(RULE_CHANGE_QUEUE_KEY)]
+
+    if not changes:
+        return
+
+    frappe.cache.srem(RULE_CHANGE_QUEUE_KEY, *changes)
+
+    rule_docs = get_rule_docs()
+    rules_by_name = {rule.name: rule for rule in rule_docs}
+
+    bank_transaction = frappe.qb.DocType("Bank Transaction")
+    conditions = []
+
+    for change in changes:
+        if change.startswith("deleted::"):
+            conditions.append((bank_transaction.company == change.split("::", 1)[1]) & (bank_transaction.is_rule_evaluated == 0))
             continue
-        
-        # Description rule
-        for rule_desc_rule in rule.description_rules:
-            desc = (transaction.description or "").lower()
-            value = (rule_desc_rule.value or "").lower()
-            # If we find a match - we can assign the rule to the transaction because type and amount matches
-            if rule_desc_rule.check == "Contains":
-                if value in desc:
-                    matched_rule = rule
-                    break
-            
-            if rule_desc_rule.check == "Starts With":
-                if desc.startswith(value):
-                    matched_rule = rule
-                    break
-            
-            if rule_desc_rule.check == "Ends With":
-                if desc.endswith(value):
-                    matched_rule = rule
-                    break
-            
-            if rule_desc_rule.check == "Regex":
-                if re.search(value, desc):
-                    matched_rule = rule
-                    break
-        
-        if matched_rule:
+
+        rule = rules_by_name.get(change)
+        if rule:
+            conditions.append(_get_rule_scope_condition(bank_transaction, rule))
+
+    if not conditions:
+        return
+
+    matcher = get_rule_matcher(rule_docs)
+    last_name = None
+
+    while True:
+        query = (frappe.qb.from_(bank_transaction)
+                 .select(bank_transaction.name, bank_transaction.bank_account, bank_transaction.company,
+                         bank_transaction.date, bank_transaction.withdrawal, bank_transaction.deposit,
+                         bank_transaction.description, bank_transaction.reference_number)
+                 .where(bank_transaction.status == "Unreconciled")
+                 .where(bank_transaction.docstatus == 1)
+                 .where(Criterion.any(conditions))
+                 .orderby(bank_transaction.name)
+                 .limit(RULE_EVALUATION_PAGE_SIZE)
+        )
+
+        if last_name:
+            query = query.where(bank_transaction.name > last_name)
+
+        unreconciled_transactions = query.run(as_dict=True)
+
+        if not unreconciled_transactions:
             break
-        
-    frappe.db.set_value("Bank Transaction", transaction.name, {
-        "is_rule_evaluated": 1,
-        "matched_rule": matched_rule.name if matched_rule else None
-    })
-        
+
+        write_rule_evaluation_results([
+            (transaction.name, evaluate_transaction(transaction, matcher))
+            for transaction in unreconciled_transactions
+        ])
+
+        last_name = unreconciled_transactions[-1].name
+
+def _get_rule_scope_condition(bank_transaction, rule):
+    """
+    SQL condition for the transactions whose matched rule can change because of the given rule
+    """
+    amount = Case().when(bank_transaction.withdrawal != 0, bank_transaction.withdrawal).else_(bank_transaction.deposit)
+
+    envelope = bank_transaction.company == rule.company
+
+    if rule.transaction_type == "Withdrawal":
+        envelope &= bank_transaction.withdrawal != 0
+    elif rule.transaction_type == "Deposit":
+        envelope &= bank_transaction.deposit != 0
+
+    if rule.min_amount:
+        envelope &= amount >= rule.min_amount
+
+    if rule.max_amount:
+        envelope &= amount <= rule.max_amount
+
+    rule_table = frappe.qb.DocType("Mint Bank Transaction Rule TB")
+    lower_priority_rules = (frappe.qb.from_(rule_table)
+                            .select(rule_table.name)
+                            .where(rule_table.company == rule.company)
+                            .where(rule_table.priority > rule.priority))
+
+    return envelope | (bank_transaction.matched_rule == rule.name) | bank_transaction.matched_rule.isin(lower_priority_rules)
+
+def _get_unreconciled_transactions_query(checkpoint, count=False):
+    """
+    Query for the unreconciled transactions in the checkpoint's scope that come after its cursor, ordered by (modified, name)
+    """
+    bank_transaction = frappe.qb.DocType("Bank Transaction")
+
+    query = (frappe.qb.from_(bank_transaction)
+             .where(bank_transaction.status == "Unreconciled")
+             .where(bank_transaction.docstatus == 1)
+             .where(bank_transaction.modified <= checkpoint.snapshot)
+    )
+
+    if not checkpoint.force_evaluate:
+        query = query.where(bank_transaction.is_rule_evaluated == 0)
+
+    scope = checkpoint.scope
+
+    if scope.company:
+        query = query.where(bank_transaction.company == scope.company)
+
+    if scope.bank_account:
+        query = query.where(bank_transaction.bank_account == scope.bank_account)
+
+    if scope.shard_count:
+        query = query.where(Mod(CRC32(bank_transaction.name), scope.shard_count) == scope.shard_index)
+
+    if count:
+        return query.select(Count("*"))
+
+    if checkpoint.last_modified:
+        query = query.where(
+            (bank_transaction.modified > checkpoint.last_modified)
+            | ((bank_transaction.modified == checkpoint.last_modified) & (bank_transaction.name > checkpoint.last_name))
+        )
+
+    return (query.select(bank_transaction.name, bank_transaction.bank_account, bank_transaction.company,
+                         bank_transaction.date, bank_transaction.withdrawal, bank_transaction.deposit,
+                         bank_transaction.description, bank_transaction.reference_number, bank_transaction.modified)
+            .orderby(bank_transaction.modified)
+            .orderby(bank_transaction.name))
+
+def _get_progress(checkpoint, status):
+    return {
+        "status": status,
+        "processed": checkpoint.processed,
+        "total": checkpoint.total,
+        "matched": checkpoint.matched,
+        "force_evaluate": checkpoint.force_evaluate,
+    }
+
+def _get_checkpoint_key(scope=None):
+    key = "truebalance:rule_evaluation:checkpoint"
+
+    if scope and (scope.company or scope.bank_account or scope.shard_count):
+        key += f":{scope.company}:{scope.bank_account}:{scope.shard_index}/{scope.shard_count}"
+
+    return key
+
+def get_rule_evaluation_checkpoint(scope=None):
+    return frappe.cache.get_value(_get_checkpoint_key(scope))
+
+def set_rule_evaluation_checkpoint(checkpoint):
+    # Checkpoints older than a day are stale - the next run starts afresh
+    frappe.cache.set_value(_get_checkpoint_key(checkpoint.scope), checkpoint, expires_in_sec=24 * 60 * 60)
+
+def clear_rule_evaluation_checkpoint(scope=None):
+    frappe.cache.delete_value(_get_checkpoint_key(scope))
+
+def _get_run_counters_key(run_id):
+    # Counters are incremented atomically by the shard jobs - so we use the raw (site prefixed) redis key
+    return frappe.cache.make_key(f"truebalance:rule_evaluation:run:{run_id}")
+
+def _get_rule_evaluation_run_lock():
+    return frappe.safe_decode(frappe.cache.get(frappe.cache.make_key(RULE_EVALUATION_RUN_LOCK_KEY)))
+
+def _acquire_rule_evaluation_run_lock(lock_id) -> bool:
+    return bool(frappe.cache.set(frappe.cache.make_key(RULE_EVALUATION_RUN_LOCK_KEY), lock_id, nx=True, ex=RULE_EVALUATION_LOCK_TTL))
+
+def _refresh_rule_evaluation_run_lock(lock_id) -> bool:
+    """
+    Extend the lock of the run - or take it again if it expired in the meantime. False if another run holds it.
+    """
+    if _acquire_rule_evaluation_run_lock(lock_id):
+        return True
+
+    if _get_rule_evaluation_run_lock() != lock_id:
+        return False
+
+    frappe.cache.expire(frappe.cache.make_key(RULE_EVALUATION_RUN_LOCK_KEY), RULE_EVALUATION_LOCK_TTL)
+    return True
+
+def _release_rule_evaluation_run_lock(run_id):
+    # Only the run holding the lock releases it
+    if _get_rule_evaluation_run_lock() == run_id:
+        frappe.cache.delete(frappe.cache.make_key(RULE_EVALUATION_RUN_LOCK_KEY))
+
+def get_rule_evaluation_run():
+    return frappe.cache.get_value("truebalance:rule_evaluation:run")
+
+def set_rule_evaluation_run(run):
+    frappe.cache.set_value("truebalance:rule_evaluation:run", run, expires_in_sec=RULE_EVALUATION_RUN_TTL)
+    frappe.cache.delete(_get_run_counters_key(run.run_id))
+
+def _record_rule_evaluation_shard_progress(run_id, processed, matched):
+    counters_key = _get_run_counters_key(run_id)
+    frappe.cache.hincrby(counters_key, "processed", processed)
+    frappe.cache.hincrby(counters_key, "matched", matched)
+    frappe.cache.expire(counters_key, RULE_EVALUATION_RUN_TTL)
+
+    run = get_rule_evaluation_run()
+    if run and run.run_id == run_id:
+        frappe.publish_realtime(RULE_EVALUATION_PROGRESS_EVENT, _get_run_progress(run, status="Running"))
+
+def _complete_rule_evaluation_shard(run_id):
+    """
+    Marks a shard of a parallel run as complete. The last shard publishes the aggregated result and clears the run.
+    """
+    if not run_id:
+        return
+
+    completed_shards = frappe.cache.hincrby(_get_run_counters_key(run_id), "completed_shards", 1)
+
+    run = get_rule_evaluation_run()
+    if not run or run.run_id != run_id or completed_shards < run.shards:
+        return
+
+    frappe.publish_realtime(RULE_EVALUATION_PROGRESS_EVENT, _get_run_progress(run, status="Completed"))
+    frappe.cache.delete_value("truebalance:rule_evaluation:run")
+    frappe.cache.delete(_get_run_counters_key(run_id))
+    _release_rule_evaluation_run_lock(run_id)
+
+def _get_run_progress(run, status):
+    processed, matched = frappe.cache.hmget(_get_run_counters_key(run.run_id), ["processed", "matched"])
+    return {
+        "status": status,
+        "processed": cint(processed),
+        "total": run.total,
+        "matched": cint(matched),
+        "force_evaluate": run.force_evaluate,
+    }
+
+def evaluate_transaction(transaction, matcher):
+    """
+    Find the first rule (by priority) that matches the transaction and return its name (or None).
+
+    `matcher` is a compiled RuleMatcher - a list of rule documents is also accepted and compiled on the fly.
+    Results are not written to the database here - use `write_rule_evaluation_results` for that.
+    """
+    if not isinstance(matcher, RuleMatcher):
+        matcher = get_rule_matcher(matcher)
+
+    matched_rule = matcher.match(transaction)
+
+    return matched_rule.name if matched_rule else None
+
+def write_rule_evaluation_results(results, batch_size=RULE_EVALUATION_BATCH_SIZE):
+    """
+    Write back a list of (bank transaction name, matched rule) tuples.
+
+    Transactions are grouped by their matched rule so that each group is written with a single UPDATE per batch.
+    We commit after every batch so that a long run does not hold locks on the whole table.
+    """
+    transactions_by_rule = defaultdict(list)
+    for transaction_name, matched_rule in results:
+        transactions_by_rule[matched_rule].append(transaction_name)
+
+    bank_transaction = frappe.qb.DocType("Bank Transaction")
+    modified = now()
+
+    for matched_rule, transaction_names in transactions_by_rule.items():
+        for batch in create_batch(transaction_names, batch_size):
+            (frappe.qb.update(bank_transaction)
+                .set(bank_transaction.is_rule_evaluated, 1)
+                .set(bank_transaction.matched_rule, matched_rule)
+                .set(bank_transaction.modified, modified)
+                .set(bank_transaction.modified_by, frappe.session.user)
+                .where(bank_transaction.name.isin(list(batch)))
+            ).run()
+            frappe.db.commit()
+
+    # The summaries count rule matched transactions
+    clear_reconciliation_summary_cache("Bank Transaction")
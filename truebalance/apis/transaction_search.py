@@ -0,0 +1,208 @@
+import frappe
+from frappe.utils import cint, now
+from pypika import Order
+from pypika.terms import Criterion, Term, ValueWrapper
+from pypika.utils import format_alias_sql
+from truebalance.apis.transactions import get_transaction_source
+from truebalance.matching.search_tokens import get_search_tokens, get_words
+
+SEARCH_INDEX_DOCTYPE = "Mint Transaction Search Index TB"
+
+# Fields that are indexed for each searchable doctype
+SEARCH_FIELDS = {
+    "Bank Transaction": ["description", "reference_number"],
+    "Debtor Statement Entry": ["description", "customer_reference", "reference_number"],
+}
+
+SEARCH_INDEX_BATCH_SIZE = 5000
+
+MAX_SEARCH_RESULTS = 500
+
+class MatchAgainst(Term):
+    """
+    MariaDB full text relevance: MATCH(field) AGAINST (value IN NATURAL LANGUAGE MODE)
+    """
+
+    def __init__(self, field, against, alias=None):
+        super().__init__(alias=alias)
+        self.field = field
+        self.against = ValueWrapper(against)
+
+    def get_sql(self, with_alias=False, **kwargs):
+        sql = "MATCH({}) AGAINST ({} IN NATURAL LANGUAGE MODE)".format(
+            self.field.get_sql(**kwargs), self.against.get_sql(**kwargs)
+        )
+        return format_alias_sql(sql, self.alias, **kwargs) if with_alias else sql
+
+@frappe.whitelist(methods=["GET"])
+def search_transactions(search: str,
+                        bank_account: str | None = None,
+                        from_date: str | None = None,
+                        to_date: str | None = None,
+                        all_transactions: bool = False,
+                        data_source: str = 'Bank',
+                        type_filter: str | None = None,
+                        amount: float | None = None,
+                        min_amount: float | None = None,
+                        max_amount: float | None = None,
+                        limit: int = 100):
+    """
+    Ranked search over the description and reference of transactions (same filters as `get_bank_transactions`).
+
+    Matches on whole words and on character trigrams, so partial words and small typos still rank.
+    Each transaction has a `search_score` - results are ordered by it (highest first).
+    """
+    tokens = get_search_tokens(search)
+
+    if not tokens:
+        return []
+
+    source = get_transaction_source(bank_account, from_date, to_date, all_transactions, data_source,
+                                    type_filter, amount, min_amount, max_amount)
+
+    if not source:
+        return []
+
+    limit = min(cint(limit) or 100, MAX_SEARCH_RESULTS)
+    table = source.table
+
+    if frappe.db.db_type != "mariadb":
+        return _search_transactions_by_pattern(source, search, limit)
+
+    search_index = frappe.qb.DocType(SEARCH_INDEX_DOCTYPE)
+    score = MatchAgainst(search_index.tokens, " ".join(tokens))
+
+    return (frappe.qb.from_(search_index)
+            .join(table)
+            .on(search_index.reference_name == table.name)
+            .select(*source.fields, score.as_("search_score"))
+            .where(search_index.reference_doctype == source.doctype)
+            .where(score > 0)
+            .where(Criterion.all(source.conditions))
+            .orderby(score, order=Order.desc)
+            .orderby(source.date_field, order=Order.desc)
+            .limit(limit)
+    ).run(as_dict=True)
+
+def _search_transactions_by_pattern(source, search, limit):
+    """
+    Fallback for databases without a full text index - any word of the search in the description or reference
+    """
+    table = source.table
+    searched_fields = [getattr(table, fieldname) for fieldname in SEARCH_FIELDS[source.doctype]]
+
+    word_conditions = [
+        field.like(f"%{word}%") for word in get_words(search) for field in searched_fields
+    ]
+
+    return (frappe.qb.from_(table)
+            .select(*source.fields)
+            .where(Criterion.all(source.conditions))
+            .where(Criterion.any(word_conditions))
+            .orderby(source.date_field, order=Order.desc)
+            .limit(limit)
+    ).run(as_dict=True)
+
+def update_search_index(doc, method=None):
+    """
+    doc_events hook - re-index a transaction when it is created or its searchable fields change
+    """
+    fields = SEARCH_FIELDS.get(doc.doctype)
+
+    if not fields:
+        return
+
+    doc_before_save = doc.get_doc_before_save()
+
+    if doc_before_save and all(doc.get(field) == doc_before_save.get(field) for field in fields):
+        return
+
+    write_search_index(doc.doctype, [doc])
+
+def remove_from_search_index(doc, method=None):
+    """
+    doc_events hook - remove a deleted transaction from the index
+    """
+    if doc.doctype in SEARCH_FIELDS:
+        frappe.db.delete(SEARCH_INDEX_DOCTYPE, {"reference_doctype": doc.doctype, "reference_name": doc.name})
+
+def write_search_index(doctype: str, docs: list):
+    """
+    Replace the index rows of the given documents (anything with a name and the searchable fields)
+    """
+    if not docs:
+        return
+
+    fields = SEARCH_FIELDS[doctype]
+
+    search_index = frappe.qb.DocType(SEARCH_INDEX_DOCTYPE)
+    (frappe.qb.from_(search_index)
+     .delete()
+     .where(search_index.reference_doctype == doctype)
+     .where(search_index.reference_name.isin([doc.name for doc in docs]))
+    ).run()
+
+    timestamp = now()
+    user = frappe.session.user
+
+    values = []
+    for doc in docs:
+        tokens = get_search_tokens(*[doc.get(field) for field in fields])
+
+        if tokens:
+            values.append((frappe.generate_hash(length=10), doctype, doc.name, " ".join(tokens),
+                           timestamp, timestamp, user, user))
+
+    frappe.db.bulk_insert(SEARCH_INDEX_DOCTYPE,
+                          ["name", "reference_doctype", "reference_name", "tokens", "creation", "modified", "owner", "modified_by"],
+                          values)
+
+@frappe.whitelist(methods=["POST"])
+def rebuild_search_index():
+    """
+    Rebuild the search index for all transactions in the background
+    """
+    frappe.only_for("System Manager")
+
+    enqueue_search_index_rebuild()
+
+def enqueue_search_index_rebuild():
+    frappe.enqueue(method=_rebuild_search_index,
+                   queue="long",
+                   job_id="truebalance_rebuild_search_index",
+                   deduplicate=True,
+                   enqueue_after_commit=True)
+
+def _rebuild_search_index():
+
+    for doctype, fields in SEARCH_FIELDS.items():
+        table = frappe.qb.DocType(doctype)
+        last_name = None
+
+        while True:
+            query = (frappe.qb.from_(table)
+                     .select(table.name, *[getattr(table, field) for field in fields])
+                     .orderby(table.name)
+                     .limit(SEARCH_INDEX_BATCH_SIZE))
+
+            if last_name:
+                query = query.where(table.name > last_name)
+
+            docs = query.run(as_dict=True)
+
+            if not docs:
+                break
+
+            write_search_index(doctype, docs)
+            frappe.db.commit()
+
+            last_name = docs[-1].name
+
+        # Remove rows of transactions that were deleted without going through the hooks
+        search_index = frappe.qb.DocType(SEARCH_INDEX_DOCTYPE)
+        (frappe.qb.from_(search_index)
+         .delete()
+         .where(search_index.reference_doctype == doctype)
+         .where(search_index.reference_name.notin(frappe.qb.from_(table).select(table.name)))
+        ).run()
+        frappe.db.commit()
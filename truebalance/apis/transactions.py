@@ -1,89 +1,407 @@
 # mint/mint/apis/transactions.py
 from __future__ import annotations
 import frappe
+import json
 from frappe import _
-from frappe.utils import flt
+from frappe.desk.reportview import build_match_conditions
+from frappe.utils import add_to_date, cint, flt, get_datetime, getdate, now
+from pypika import Order
+from pypika.terms import Criterion, EmptyCriterion
+from frappe.query_builder.functions import Count
+from truebalance.apis.response_format import format_rows
+
+# Upper bound on the page size a client can request
+MAX_TRANSACTIONS_PAGE_LENGTH = 2000
+
+# Changes are read from slightly before the sync token's timestamp, to include transactions that were
+# modified before the last sync but committed after it. Clients apply changes by name, so overlaps are harmless.
+SYNC_OVERLAP_SECONDS = 60
+
+# Deleted transactions are remembered for this long (and at most TOMBSTONE_LIMIT per bank account / party).
+# Clients with an older sync token get a full reset.
+TOMBSTONE_TTL = 7 * 24 * 60 * 60
+TOMBSTONE_LIMIT = 1000
 
 @frappe.whitelist()
-def get_bank_transactions(bank_account=None, from_date=None, to_date=None, all_transactions=False, data_source='Bank'):
+def get_bank_transactions(bank_account=None, from_date=None, to_date=None, all_transactions=False, data_source='Bank',
+                          type_filter=None, amount=None, min_amount=None, max_amount=None,
+                          cursor=None, page_length=None, response_format=None):
     """
     MODIFIED: Fetches external transactions, selecting between Bank Transactions and Debtor Statement Entries.
-    
+
     The 'bank_account' argument from the frontend is used as the Party/Customer name when data_source='Debtor'.
+
+    Filters (applied in the database):
+    - type_filter: "Debits" (withdrawals) or "Credits" (deposits)
+    - amount: exact amount of the transaction (withdrawal or deposit)
+    - min_amount / max_amount: amount range of the transaction
+
+    Pagination: if `page_length` is passed, transactions are returned in pages ordered by (date, name) as
+    {"transactions": [...], "next_cursor": "...", "total_count": n}. Pass `next_cursor` back as `cursor` to get
+    the next page - it is None on the last page. Without `page_length`, the full list is returned as before.
+
+    Pass response_format="compact" to get the transactions in the compact columnar format (see response_format.py).
+    """
+
+    paginate = cint(page_length) > 0
+
+    source = get_transaction_source(bank_account, from_date, to_date, all_transactions, data_source,
+                                    type_filter, amount, min_amount, max_amount)
+
+    if not source: # Final safety check
+        empty = format_rows([], response_format)
+        return {"transactions": empty, "next_cursor": None, "total_count": 0} if paginate else empty
+
+    table = source.table
+    date_field = source.date_field
+    conditions = source.conditions
+
+    # --- 2. EXECUTE QUERY ---
+
+    query = (frappe.qb.from_(table)
+             .select(*source.fields)
+             .where(Criterion.all(conditions))
+             .orderby(date_field, order=Order.asc)
+             .orderby(table.name, order=Order.asc)
+    )
+
+    if not paginate:
+        return format_rows(query.run(as_dict=True), response_format)
+
+    page_length = min(cint(page_length), MAX_TRANSACTIONS_PAGE_LENGTH)
+
+    total_count = (frappe.qb.from_(table)
+                   .select(Count("*"))
+                   .where(Criterion.all(conditions))
+    ).run()[0][0]
+
+    if cursor:
+        cursor_date, cursor_name = _parse_cursor(cursor)
+        # Keyset condition for (date, name) > (cursor_date, cursor_name)
+        query = query.where((date_field > cursor_date) | ((date_field == cursor_date) & (table.name > cursor_name)))
+
+    # Fetch one extra row to know if there is another page
+    transactions = query.limit(page_length + 1).run(as_dict=True)
+
+    next_cursor = None
+    if len(transactions) > page_length:
+        transactions = transactions[:page_length]
+        last = transactions[-1]
+        next_cursor = json.dumps([str(last.date), last.name])
+
+    return {
+        "transactions": format_rows(transactions, response_format),
+        "next_cursor": next_cursor,
+        "total_count": total_count,
+    }
+
+@frappe.whitelist(methods=["GET"])
+def get_bank_transaction_changes(bank_account=None, from_date=None, to_date=None, sync_token=None, data_source='Bank',
+                                 response_format=None):
+    """
+    Delta sync for the unreconciled transaction list of a bank account (or party when data_source='Debtor').
+
+    Returns {"reset": bool, "transactions": [...], "removed": [...], "sync_token": "..."}
+
+    - Without a sync token (or if the token is too old), `reset` is True and `transactions` is the full list.
+    - Otherwise `transactions` are the ones inserted or changed since the token that are in the list,
+      and `removed` the names of transactions that left the list (reconciled, cancelled, deleted or moved out).
+
+    Pass the returned `sync_token` to the next call.
+    """
+    source = get_transaction_source(bank_account, from_date, to_date, False, data_source)
+
+    if not source:
+        return {"reset": True, "transactions": format_rows([], response_format), "removed": [], "sync_token": None}
+
+    table = source.table
+
+    # Read the position of the tombstones before the transactions so that nothing falls between two syncs
+    new_token = {
+        "modified": now(),
+        "tombstone": _get_tombstone_sequence(source.doctype, bank_account),
+    }
+
+    token = _parse_sync_token(sync_token)
+    tombstones = _get_tombstones_since(source.doctype, bank_account, token.tombstone) if token else None
+
+    query = (frappe.qb.from_(table)
+             .select(*source.fields)
+             .where(Criterion.all(source.conditions))
+             .orderby(source.date_field)
+             .orderby(table.name))
+
+    if not token or tombstones is None:
+        return {
+            "reset": True,
+            "transactions": format_rows(query.run(as_dict=True), response_format),
+            "removed": [],
+            "sync_token": json.dumps(new_token),
+        }
+
+    since = add_to_date(get_datetime(token.modified), seconds=-SYNC_OVERLAP_SECONDS)
+
+    changed = query.where(table.modified >= since).run(as_dict=True)
+
+    # Transactions of the account that changed but are no longer in the list
+    touched = (frappe.qb.from_(table)
+               .select(table.name)
+               .where(source.account_condition)
+               .where(source.permission_condition)
+               .where(table.modified >= since)
+    ).run(pluck=True)
+
+    changed_names = {row.name for row in changed}
+    removed = [name for name in touched if name not in changed_names]
+    removed.extend(name for name in tombstones if name not in changed_names)
+
+    return {
+        "reset": False,
+        "transactions": format_rows(changed, response_format),
+        "removed": list(dict.fromkeys(removed)),
+        "sync_token": json.dumps(new_token),
+    }
+
+def record_transaction_tombstone(doc, method=None):
+    """
+    doc_events hook - remember deleted transactions so that delta syncs can remove them
+    """
+    account = doc.bank_account if doc.doctype == "Bank Transaction" else doc.get("party")
+
+    if not account:
+        return
+
+    key = frappe.cache.make_key(_get_tombstones_key(doc.doctype, account))
+    sequence_key = frappe.cache.make_key(_get_tombstone_sequence_key(doc.doctype, account))
+
+    sequence = frappe.cache.incr(sequence_key)
+
+    pipeline = frappe.cache.pipeline()
+    pipeline.rpush(key, json.dumps({"sequence": sequence, "name": doc.name}))
+    pipeline.ltrim(key, -TOMBSTONE_LIMIT, -1)
+    pipeline.expire(key, TOMBSTONE_TTL)
+    pipeline.expire(sequence_key, TOMBSTONE_TTL)
+    pipeline.execute()
+
+def _get_tombstone_sequence(doctype, account) -> int:
+    return cint(frappe.safe_decode(frappe.cache.get(frappe.cache.make_key(_get_tombstone_sequence_key(doctype, account)))))
+
+def _get_tombstones_since(doctype, account, sequence):
+    """
+    Names of transactions deleted after the given sequence number.
+    Returns None if some of them are no longer known - the client has to reset.
+    """
+    sequence = cint(sequence)
+    current = _get_tombstone_sequence(doctype, account)
+
+    if sequence > current:
+        # The tombstones expired (or the cache was cleared) since the token was issued
+        return None
+
+    if sequence == current:
+        return []
+
+    entries = [json.loads(entry) for entry in frappe.cache.lrange(_get_tombstones_key(doctype, account), 0, -1)]
+    entries = [entry for entry in entries if entry["sequence"] > sequence]
+
+    if not entries or entries[0]["sequence"] != sequence + 1:
+        # Older tombstones were trimmed
+        return None
+
+    return [entry["name"] for entry in entries]
+
+def _parse_sync_token(sync_token):
+    if not sync_token:
+        return None
+
+    try:
+        token = frappe._dict(json.loads(sync_token))
+        get_datetime(token["modified"])
+    except (ValueError, TypeError, KeyError):
+        frappe.throw(_("Invalid sync token"))
+
+    if get_datetime(token.modified) < add_to_date(get_datetime(), seconds=-TOMBSTONE_TTL):
+        return None
+
+    return token
+
+def _get_tombstones_key(doctype, account):
+    return f"truebalance:transaction_tombstones:{doctype}:{account}"
+
+def _get_tombstone_sequence_key(doctype, account):
+    return f"truebalance:transaction_tombstones:{doctype}:{account}:sequence"
+
+def get_transaction_source(bank_account=None, from_date=None, to_date=None, all_transactions=False, data_source='Bank',
+                           type_filter=None, amount=None, min_amount=None, max_amount=None):
     """
-    
+    Returns the doctype, table, fields (aliased to the 'BankTransaction' type) and filter conditions
+    for the transactions of a bank account - or a party when data_source='Debtor'.
+
+    Returns None if there is no bank account / party to filter on.
+
+    The user needs read access to the bank account (or party), and the conditions include the user permissions
+    and permission query conditions of the doctype - same as frappe.get_list.
+    """
+
     # --- 1. DETERMINE SOURCE DOCTYPE AND FIELD NAMES ---
-    
+
     if data_source == 'Debtor':
         # --- Debtor Logic: Targets Debtor Statement Entry (DSE) ---
         external_doctype = 'Debtor Statement Entry'
-        date_field = 'statement_date'
-        party_name = bank_account 
-        
-        if not party_name:
-            return []
-            
-        filters = {
-            'party': party_name, # Filter by the selected Party ID
-            date_field: ['between', [from_date, to_date]],
-            'docstatus': 0 
-        }
+        table = frappe.qb.DocType(external_doctype)
+        date_field = table.statement_date
+        withdrawal_field = table.payment_amount_debit
+        deposit_field = table.payment_amount_credit
+
+        conditions = [
+            table.party == bank_account, # Filter by the selected Party ID
+            table.docstatus == 0,
+        ]
 
         # --- CRITICAL FIX: Use 'is_reconciled = 0' as a safe filter for unreconciled entries ---
         if not all_transactions:
             # We use 'is_reconciled = 0' (False) as the filter for unreconciled entries
-            filters['is_reconciled'] = 0 
-        
-        
+            conditions.append(table.is_reconciled == 0)
+
+
         # Fields are aliased to match the 'BankTransaction' type expected by the React UI
         # Assumes you have added all necessary fields (description, unallocated_amount, status, matched_rule)
         fields = [
-            f"{date_field} as date", 
-            "payment_amount_credit as deposit",
-            "payment_amount_debit as withdrawal",
-            "currency",
-            "customer_reference as reference_number",
-            "description", 
-            "name",
-            "company",
-            "party",
-            "party_type",
-            "unallocated_amount", 
-            "allocated_amount", 
-            "status", 
-            "transaction_type",
-            "matched_rule"
+            date_field.as_("date"),
+            deposit_field.as_("deposit"),
+            withdrawal_field.as_("withdrawal"),
+            table.currency,
+            table.customer_reference.as_("reference_number"),
+            table.description,
+            table.name,
+            table.company,
+            table.party,
+            table.party_type,
+            table.unallocated_amount,
+            table.allocated_amount,
+            table.status,
+            table.transaction_type,
+            table.matched_rule,
         ]
-        
+
     else:
         # --- Original Bank Logic: Targets Bank Transaction ---
         external_doctype = 'Bank Transaction'
-        date_field = 'date'
-        
-        filters = {
-            "bank_account": bank_account,
-            "docstatus": 1,
-            "unallocated_amount": (">", 0.0) if not all_transactions else ['!=', 2],
-            date_field: ['between', [from_date, to_date]]
-        }
-        
+        table = frappe.qb.DocType(external_doctype)
+        date_field = table.date
+        withdrawal_field = table.withdrawal
+        deposit_field = table.deposit
+
+        conditions = [
+            table.bank_account == bank_account,
+            table.docstatus == 1,
+        ]
+
+        if not all_transactions:
+            conditions.append(table.unallocated_amount > 0.0)
+
         # Original fields
         fields = [
-            "date", "deposit", "withdrawal", "currency", "description", 
-            "transaction_type", "name", "bank_account", "company", "allocated_amount", 
-            "unallocated_amount", "reference_number", "party_type", "party", "status", "matched_rule"
+            table.date, table.deposit, table.withdrawal, table.currency, table.description,
+            table.transaction_type, table.name, table.bank_account, table.company, table.allocated_amount,
+            table.unallocated_amount, table.reference_number, table.party_type, table.party, table.status, table.matched_rule
         ]
 
-    # --- 2. EXECUTE QUERY ---
-    
-    if not bank_account: # Final safety check
-        return []
+    if not bank_account:
+        return None
 
-    transactions = frappe.get_list(
-        external_doctype,
-        fields=fields,
-        filters=filters,
-        order_by=f"{date_field} asc"
-    )
-    
-    return transactions
\ No newline at end of file
+    frappe.has_permission(external_doctype, "read", throw=True)
+    _check_account_permission(bank_account, data_source)
+
+    permission_condition = get_permission_condition(external_doctype)
+
+    if not isinstance(permission_condition, EmptyCriterion):
+        conditions.append(permission_condition)
+
+    conditions.append(date_field[getdate(from_date):getdate(to_date)])
+    conditions.extend(_get_amount_conditions(withdrawal_field, deposit_field, type_filter, amount, min_amount, max_amount))
+
+    return frappe._dict({
+        "doctype": external_doctype,
+        "table": table,
+        "account_condition": conditions[0],
+        "permission_condition": permission_condition,
+        "date_field": date_field,
+        "fields": fields,
+        "conditions": conditions,
+    })
+
+def get_permission_condition(doctype: str) -> Criterion:
+    """
+    The user permission and permission query conditions of the doctype for the session user, for raw queries
+    on the doctype's table
+    """
+    match_conditions = build_match_conditions(doctype)
+
+    return RawCriterion(match_conditions) if match_conditions else EmptyCriterion()
+
+def _check_account_permission(bank_account, data_source):
+    if data_source == 'Debtor':
+        party_type = frappe.db.get_value('Debtor Statement Entry', {'party': bank_account}, 'party_type')
+
+        if party_type in ('Customer', 'Supplier'):
+            frappe.has_permission(party_type, "read", bank_account, throw=True)
+    else:
+        frappe.has_permission("Bank Account", "read", bank_account, throw=True)
+
+class RawCriterion(Criterion):
+    """
+    A condition in SQL (with the table names in full, like the match conditions of frappe.get_list)
+    """
+    def __init__(self, sql: str):
+        super().__init__()
+        self.sql = sql
+
+    def get_sql(self, **kwargs):
+        return f"({self.sql})"
+
+def _get_amount_conditions(withdrawal_field, deposit_field, type_filter=None, amount=None, min_amount=None, max_amount=None):
+    """
+    Conditions for the type and amount filters. The amount of a transaction is its withdrawal or its deposit.
+    """
+    conditions = []
+
+    if type_filter == "Debits":
+        amount_fields = [withdrawal_field]
+    elif type_filter == "Credits":
+        amount_fields = [deposit_field]
+    else:
+        amount_fields = [withdrawal_field, deposit_field]
+
+    if len(amount_fields) == 1:
+        conditions.append(amount_fields[0] > 0)
+
+    amount, min_amount, max_amount = flt(amount), flt(min_amount), flt(max_amount)
+
+    if not (amount or min_amount or max_amount):
+        return conditions
+
+    amount_conditions = []
+
+    for field in amount_fields:
+        field_conditions = [field > 0]
+
+        if amount:
+            field_conditions.append(field == amount)
+        if min_amount:
+            field_conditions.append(field >= min_amount)
+        if max_amount:
+            field_conditions.append(field <= max_amount)
+
+        amount_conditions.append(Criterion.all(field_conditions))
+
+    conditions.append(Criterion.any(amount_conditions))
+
+    return conditions
+
+def _parse_cursor(cursor: str):
+    try:
+        cursor_date, cursor_name = json.loads(cursor)
+        return getdate(cursor_date), cursor_name
+    except (ValueError, TypeError):
+        frappe.throw(_("Invalid cursor"))
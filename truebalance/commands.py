@@ -0,0 +1,91 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+from frappe.utils import add_days, getdate, now
+from pypika.terms import Criterion
+
+@click.command("truebalance-explain-queries")
+@pass_context
+def explain_queries(context):
+    """
+    Print the EXPLAIN plan of the TrueBalance API queries, using sample values from the site's data
+    """
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+
+    try:
+        for label, query in get_diagnostic_queries():
+            click.secho(label, bold=True)
+
+            for row in frappe.db.sql(f"EXPLAIN {query.get_sql()}", as_dict=True):
+                full_scan = row.get("type") == "ALL"
+                click.secho("  table: {table}  type: {type}  key: {key}  rows: {rows}  extra: {Extra}".format(**{
+                    "table": row.get("table"),
+                    "type": row.get("type"),
+                    "key": row.get("key"),
+                    "rows": row.get("rows"),
+                    "Extra": row.get("Extra"),
+                }), fg="red" if full_scan else None)
+
+            click.echo()
+    finally:
+        frappe.destroy()
+
+def get_diagnostic_queries():
+    """
+    Returns (label, query) for each hot query - built by the same functions the APIs use where possible.
+    App modules are imported here since bench loads the commands before a site is initialised.
+    """
+    from truebalance.apis.rules import _get_unreconciled_transactions_query
+    from truebalance.apis.transaction_search import MatchAgainst, SEARCH_INDEX_DOCTYPE
+    from truebalance.apis.transactions import get_transaction_source
+
+    queries = []
+    to_date = getdate()
+    from_date = add_days(to_date, -365)
+
+    bank_account = frappe.db.get_value("Bank Transaction", {"docstatus": 1}, "bank_account", order_by="creation desc")
+    party = frappe.db.get_value("Debtor Statement Entry", {}, "party", order_by="creation desc")
+
+    for data_source, account in (("Bank", bank_account), ("Debtor", party)):
+        source = get_transaction_source(account or "", from_date, to_date, data_source=data_source)
+        if source:
+            queries.append((f"get_bank_transactions ({data_source})",
+                            frappe.qb.from_(source.table).select(*source.fields).where(Criterion.all(source.conditions))
+                            .orderby(source.date_field).orderby(source.table.name)))
+
+    checkpoint = frappe._dict({
+        "scope": frappe._dict(),
+        "force_evaluate": False,
+        "snapshot": now(),
+    })
+    queries.append(("Rule evaluation", _get_unreconciled_transactions_query(checkpoint)))
+
+    bank_transaction = frappe.qb.DocType("Bank Transaction")
+    company = frappe.db.get_value("Bank Transaction", {"docstatus": 1}, "company", order_by="creation desc")
+    queries.append(("search_for_transfer_transaction",
+                    frappe.qb.from_(bank_transaction)
+                    .select(bank_transaction.name)
+                    .where(bank_transaction.company == (company or ""))
+                    .where(bank_transaction.date[add_days(to_date, -4):to_date])
+                    .where(bank_transaction.withdrawal == 0)
+                    .where(bank_transaction.deposit == 1000)
+                    .where(bank_transaction.bank_account != (bank_account or ""))
+                    .where(bank_transaction.docstatus == 1)
+                    .where(bank_transaction.status == "Unreconciled")))
+
+    if frappe.db.db_type == "mariadb":
+        search_index = frappe.qb.DocType(SEARCH_INDEX_DOCTYPE)
+        queries.append(("search_transactions",
+                        frappe.qb.from_(search_index)
+                        .join(bank_transaction)
+                        .on(search_index.reference_name == bank_transaction.name)
+                        .select(bank_transaction.name)
+                        .where(search_index.reference_doctype == "Bank Transaction")
+                        .where(MatchAgainst(search_index.tokens, "payment tgpay") > 0)
+                        .where(bank_transaction.bank_account == (bank_account or ""))))
+
+    return queries
+
+commands = [explain_queries]
@@ -85,6 +85,11 @@ add_to_apps_screen = [
 # before_install = "truebalance.install.before_install"
 after_install = "truebalance.setup.install.after_install"
 
+# Migration
+# ------------
+
+after_migrate = "truebalance.setup.indexes.create_indexes"
+
 # Uninstallation
 # ------------
 
@@ -145,6 +150,32 @@ after_install = "truebalance.setup.install.after_install"
 # 	}
 # }
 
+doc_events = {
+	"Bank Transaction": {
+		"on_change": "truebalance.apis.reconciliation_summary.invalidate_reconciliation_summary",
+		"on_update": "truebalance.apis.transaction_search.update_search_index",
+		"on_submit": "truebalance.apis.rules.queue_transaction_for_rule_evaluation",
+		"on_update_after_submit": "truebalance.apis.transaction_search.update_search_index",
+		"on_trash": [
+			"truebalance.apis.transaction_search.remove_from_search_index",
+			"truebalance.apis.transactions.record_transaction_tombstone",
+			"truebalance.apis.reconciliation_summary.invalidate_reconciliation_summary",
+		],
+	},
+	"Debtor Statement Entry": {
+		"on_change": "truebalance.apis.reconciliation_summary.invalidate_reconciliation_summary",
+		"on_update": "truebalance.apis.transaction_search.update_search_index",
+		"on_trash": [
+			"truebalance.apis.transaction_search.remove_from_search_index",
+			"truebalance.apis.transactions.record_transaction_tombstone",
+			"truebalance.apis.reconciliation_summary.invalidate_reconciliation_summary",
+		],
+	},
+	"Payment Ledger Entry": {
+		"on_submit": "truebalance.matching.open_items.invalidate_open_items",
+	},
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -152,6 +183,9 @@ scheduler_events = {
 	"hourly": [
 		"truebalance.apis.rules.scheduler_run_rule_evaluation"
 	],
+	"daily": [
+		"truebalance.apis.idempotency.delete_expired_idempotency_keys"
+	],
 }
 
 # Testing
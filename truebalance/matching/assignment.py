@@ -0,0 +1,281 @@
+"""
+Conflict free auto matching of transactions with vouchers.
+
+Matching every transaction with its best voucher independently can propose the same voucher for two
+transactions. Instead, transactions and vouchers are the two sides of a bipartite graph with an edge for
+every pair within the amount and date tolerances (weighted by scoring.py), and the proposals are a
+maximum weight assignment over it - every transaction and every voucher is used at most once.
+
+The graph is kept sparse: vouchers are looked up by amount window (sorted amounts + bisect) and each
+transaction keeps at most MAX_EDGES_PER_TRANSACTION edges. It falls apart into many small connected
+components, each solved on its own:
+
+- exactly with SciPy's linear_sum_assignment if it is installed (up to MAX_DENSE_COMPONENT_SIZE nodes a side)
+- exactly with the Hungarian algorithm in pure Python (up to MAX_EXACT_COMPONENT_SIZE nodes a side)
+- greedily by weight for larger components
+"""
+from __future__ import annotations
+import bisect
+from truebalance.matching.batch_scoring import get_direction
+from truebalance.matching.scoring import AMOUNT_PRECISION, DATE_WINDOW_DAYS, get_voucher_amount, rank_candidates, score_candidate, to_date
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    _SCIPY = True
+except ImportError:
+    _SCIPY = False
+
+# A voucher is a candidate if its amount is within this share of the transaction's unallocated amount...
+AMOUNT_TOLERANCE = 0.01
+
+# ...and its posting or reference date is within this many days of the transaction date
+DATE_TOLERANCE_DAYS = DATE_WINDOW_DAYS
+
+# Pairs scoring lower than this are never proposed
+MIN_PROPOSAL_SCORE = 0.5
+
+MAX_EDGES_PER_TRANSACTION = 20
+
+MAX_EXACT_COMPONENT_SIZE = 150
+
+MAX_DENSE_COMPONENT_SIZE = 3000
+
+
+def get_auto_match_proposals(transactions: list, vouchers: list,
+                             amount_tolerance: float = AMOUNT_TOLERANCE,
+                             date_tolerance: int = DATE_TOLERANCE_DAYS) -> list:
+    """
+    Returns the proposed (transaction, voucher) pairs - no transaction or voucher appears twice.
+
+    Each proposal is {"transaction": transaction, "voucher": voucher with its score and match flags,
+    "allocated_amount": amount to allocate}, best score first.
+    """
+    edges = get_edges(transactions, vouchers, amount_tolerance, date_tolerance)
+
+    proposals = []
+
+    for transaction_index, voucher_index in solve_assignment(edges):
+        transaction = transactions[transaction_index]
+        voucher = rank_candidates(transaction, [vouchers[voucher_index]])[0]
+
+        proposals.append({
+            "transaction": transaction,
+            "voucher": voucher,
+            "allocated_amount": min(abs(transaction.get("unallocated_amount") or 0), get_voucher_amount(voucher)),
+        })
+
+    proposals.sort(key=lambda proposal: proposal["voucher"]["score"], reverse=True)
+
+    return proposals
+
+
+def get_edges(transactions: list, vouchers: list, amount_tolerance: float = AMOUNT_TOLERANCE,
+              date_tolerance: int = DATE_TOLERANCE_DAYS) -> dict:
+    """
+    Returns {(transaction index, voucher index): score} for the pairs within the tolerances
+    """
+    by_direction = {}
+    voucher_dates = []
+    for index, voucher in enumerate(vouchers):
+        voucher_dates.append([date for date in (to_date(voucher.get("posting_date")), to_date(voucher.get("reference_date"))) if date])
+        by_direction.setdefault(voucher.get("direction", "deposit"), []).append((get_voucher_amount(voucher), index))
+
+    amounts = {}
+    for direction, entries in by_direction.items():
+        entries.sort()
+        amounts[direction] = [amount for amount, _index in entries]
+
+    edges = {}
+
+    for transaction_index, transaction in enumerate(transactions):
+        direction = get_direction(transaction)
+        entries = by_direction.get(direction)
+
+        if not entries:
+            continue
+
+        amount = abs(transaction.get("unallocated_amount") or 0)
+        tolerance = max(amount * amount_tolerance, AMOUNT_PRECISION)
+        transaction_date = to_date(transaction.get("date"))
+
+        start = bisect.bisect_left(amounts[direction], amount - tolerance)
+        end = bisect.bisect_right(amounts[direction], amount + tolerance)
+
+        candidates = []
+
+        for _amount, voucher_index in entries[start:end]:
+            if transaction_date and not any(abs((transaction_date - date).days) <= date_tolerance for date in voucher_dates[voucher_index]):
+                continue
+
+            score = score_candidate(transaction, vouchers[voucher_index])["score"]
+            if score >= MIN_PROPOSAL_SCORE:
+                candidates.append((score, voucher_index))
+
+        for score, voucher_index in sorted(candidates, reverse=True)[:MAX_EDGES_PER_TRANSACTION]:
+            edges[(transaction_index, voucher_index)] = score
+
+    return edges
+
+
+def solve_assignment(edges: dict) -> list[tuple[int, int]]:
+    """
+    Maximum weight assignment over the edges {(transaction, voucher): weight} - solved per connected component
+    """
+    pairs = []
+
+    for component in _get_components(edges):
+        transactions = sorted({transaction for transaction, _voucher in component})
+        vouchers = sorted({voucher for _transaction, voucher in component})
+
+        if len(component) == 1:
+            pairs.extend(component)
+        elif _SCIPY and max(len(transactions), len(vouchers)) <= MAX_DENSE_COMPONENT_SIZE:
+            pairs.extend(_solve_dense(component, transactions, vouchers))
+        elif max(len(transactions), len(vouchers)) <= MAX_EXACT_COMPONENT_SIZE:
+            pairs.extend(_solve_hungarian(component, transactions, vouchers))
+        else:
+            pairs.extend(_solve_greedy(component))
+
+    return pairs
+
+
+def _get_components(edges: dict) -> list[dict]:
+    """
+    Splits the edges into connected components (union find over transactions and vouchers)
+    """
+    parents = {}
+
+    def find(node):
+        parents.setdefault(node, node)
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    for transaction, voucher in edges:
+        parents[find(("t", transaction))] = find(("v", voucher))
+
+    components = {}
+    for (transaction, voucher), weight in edges.items():
+        components.setdefault(find(("t", transaction)), {})[(transaction, voucher)] = weight
+
+    return list(components.values())
+
+
+def _solve_dense(edges: dict, transactions: list, vouchers: list) -> list[tuple[int, int]]:
+    import numpy as np
+
+    rows = {transaction: index for index, transaction in enumerate(transactions)}
+    columns = {voucher: index for index, voucher in enumerate(vouchers)}
+
+    weights = np.zeros((len(transactions), len(vouchers)))
+    for (transaction, voucher), weight in edges.items():
+        weights[rows[transaction], columns[voucher]] = weight
+
+    row_indexes, column_indexes = linear_sum_assignment(weights, maximize=True)
+
+    return [
+        (transactions[row], vouchers[column])
+        for row, column in zip(row_indexes, column_indexes)
+        if (transactions[row], vouchers[column]) in edges
+    ]
+
+
+def _solve_hungarian(edges: dict, transactions: list, vouchers: list) -> list[tuple[int, int]]:
+    # The algorithm needs at most as many rows as columns
+    transpose = len(transactions) > len(vouchers)
+    rows, columns = (vouchers, transactions) if transpose else (transactions, vouchers)
+
+    def get_edge(row, column):
+        return (column, row) if transpose else (row, column)
+
+    # Cost is the negative weight - pairs without an edge cost 0 and are dropped afterwards
+    cost = [[-edges.get(get_edge(row, column), 0) for column in columns] for row in rows]
+
+    pairs = []
+    for row_index, column_index in enumerate(_hungarian(cost)):
+        pair = get_edge(rows[row_index], columns[column_index])
+        if pair in edges:
+            pairs.append(pair)
+
+    return pairs
+
+
+def _hungarian(cost: list[list[float]]) -> list[int]:
+    """
+    Minimum cost assignment of every row to a distinct column (rows <= columns) - returns the column of each row
+    """
+    row_count, column_count = len(cost), len(cost[0])
+    infinity = float("inf")
+
+    row_potential = [0.0] * (row_count + 1)
+    column_potential = [0.0] * (column_count + 1)
+    # Row assigned to each column (1 based, 0 is unassigned) and the previous column on the augmenting path
+    assigned_row = [0] * (column_count + 1)
+    previous_column = [0] * (column_count + 1)
+
+    for row in range(1, row_count + 1):
+        assigned_row[0] = row
+        column = 0
+        min_reduced_cost = [infinity] * (column_count + 1)
+        used = [False] * (column_count + 1)
+
+        while True:
+            used[column] = True
+            current_row = assigned_row[column]
+            delta = infinity
+            next_column = 0
+
+            for candidate in range(1, column_count + 1):
+                if used[candidate]:
+                    continue
+
+                reduced_cost = cost[current_row - 1][candidate - 1] - row_potential[current_row] - column_potential[candidate]
+                if reduced_cost < min_reduced_cost[candidate]:
+                    min_reduced_cost[candidate] = reduced_cost
+                    previous_column[candidate] = column
+                if min_reduced_cost[candidate] < delta:
+                    delta = min_reduced_cost[candidate]
+                    next_column = candidate
+
+            for candidate in range(column_count + 1):
+                if used[candidate]:
+                    row_potential[assigned_row[candidate]] += delta
+                    column_potential[candidate] -= delta
+                else:
+                    min_reduced_cost[candidate] -= delta
+
+            column = next_column
+            if assigned_row[column] == 0:
+                break
+
+        while column:
+            previous = previous_column[column]
+            assigned_row[column] = assigned_row[previous]
+            column = previous
+
+    assignment = [0] * row_count
+    for column in range(1, column_count + 1):
+        if assigned_row[column]:
+            assignment[assigned_row[column] - 1] = column - 1
+
+    return assignment
+
+
+def _solve_greedy(edges: dict) -> list[tuple[int, int]]:
+    """
+    Heaviest edges first - at least half the weight of the optimal assignment
+    """
+    used_transactions, used_vouchers = set(), set()
+    pairs = []
+
+    for (transaction, voucher), _weight in sorted(edges.items(), key=lambda edge: edge[1], reverse=True):
+        if transaction in used_transactions or voucher in used_vouchers:
+            continue
+
+        used_transactions.add(transaction)
+        used_vouchers.add(voucher)
+        pairs.append((transaction, voucher))
+
+    return pairs
+
@@ -0,0 +1,181 @@
+"""
+Match suggestions for a whole list of transactions at once.
+
+Every transaction x voucher pair is scored with the components of scoring.py, computed on whole matrices
+(one row per transaction, one column per voucher) with NumPy:
+
+- amounts and date deltas are plain array arithmetic
+- references are compared by hash: an exact match is an equal hash of the normalized reference, and
+  the trigram similarity is the overlap of hashed trigram buckets (a matrix product)
+
+The best top_k vouchers of each transaction are then scored exactly with scoring.rank_candidates, so the
+returned scores and match flags are the same as get_vouchers_for_reco's. Without NumPy, every pair is
+scored with scoring.py directly.
+"""
+from __future__ import annotations
+import zlib
+from truebalance.matching.scoring import (
+    AMOUNT_PRECISION,
+    DATE_WINDOW_DAYS,
+    PARTIAL_REFERENCE_SCORE,
+    UNKNOWN_PARTY_SCORE,
+    WEIGHTS,
+    get_voucher_amount,
+    normalize_reference,
+    rank_candidates,
+    to_date,
+)
+from truebalance.matching.search_tokens import get_trigrams
+
+try:
+    import numpy as np
+    _NUMPY = True
+except ImportError:
+    _NUMPY = False
+
+# Number of hash buckets the trigrams of a reference are spread over
+TRIGRAM_BUCKETS = 512
+
+# Transactions are scored in chunks of this many rows to bound the size of the score matrices
+CHUNK_SIZE = 256
+
+
+def get_top_k_suggestions(transactions: list, vouchers: list, top_k: int = 3) -> dict:
+    """
+    Returns {transaction name: [best top_k vouchers]} - each voucher with its score and match flags
+    (see scoring.rank_candidates). A transaction is only matched with vouchers in the same direction:
+    deposits with money received and withdrawals with money paid.
+    """
+    if not transactions or not vouchers or top_k <= 0:
+        return {transaction["name"]: [] for transaction in transactions}
+
+    if not _NUMPY:
+        return {
+            transaction["name"]: rank_candidates(transaction, [
+                voucher for voucher in vouchers if voucher.get("direction", "deposit") == get_direction(transaction)
+            ], top_k)
+            for transaction in transactions
+        }
+
+    transaction_features = _get_transaction_features(transactions)
+    voucher_features = _get_voucher_features(vouchers)
+
+    suggestions = {}
+
+    for start in range(0, len(transactions), CHUNK_SIZE):
+        scores = _get_score_matrix(transaction_features, voucher_features, slice(start, start + CHUNK_SIZE))
+
+        k = min(top_k, len(vouchers))
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        for row, columns in enumerate(best):
+            transaction = transactions[start + row]
+            candidates = [vouchers[column] for column in columns if scores[row, column] >= 0]
+            suggestions[transaction["name"]] = rank_candidates(transaction, candidates)
+
+    return suggestions
+
+
+def get_direction(transaction) -> str:
+    return "withdrawal" if (transaction.get("withdrawal") or 0) > 0 else "deposit"
+
+
+def _get_score_matrix(transactions, vouchers, rows: slice):
+    """
+    Weighted score of every transaction (in rows) x voucher pair - pairs in opposite directions score -1
+    """
+    amount = transactions["amount"][rows, None]
+    difference = np.abs(amount - vouchers["amount"][None, :])
+    amount_score = np.clip(1 - difference / np.where(amount > 0, amount, np.finfo(float).tiny), 0, 1)
+    amount_score[difference < AMOUNT_PRECISION] = 1
+
+    date = transactions["date"][rows, None]
+    with np.errstate(invalid="ignore"):
+        date_score = np.fmax(
+            np.clip(1 - np.abs(date - vouchers["posting_date"][None, :]) / DATE_WINDOW_DAYS, 0, 1),
+            np.clip(1 - np.abs(date - vouchers["reference_date"][None, :]) / DATE_WINDOW_DAYS, 0, 1),
+        )
+    date_score = np.nan_to_num(date_score, nan=0.0)
+
+    reference_hash = vouchers["reference_hash"][None, :]
+    full_match = (reference_hash != 0) & (
+        (reference_hash == transactions["reference_hash"][rows, None])
+        | (reference_hash == transactions["description_hash"][rows, None])
+    )
+    similarity = (transactions["trigrams"][rows] @ vouchers["trigrams"].T) / np.maximum(vouchers["trigram_count"], 1)[None, :]
+    reference_score = np.where(full_match, 1.0, np.where(similarity >= 1, PARTIAL_REFERENCE_SCORE, similarity))
+
+    party = transactions["party"][rows, None]
+    party_score = np.where(party < 0, UNKNOWN_PARTY_SCORE, (party == vouchers["party"][None, :]).astype(float))
+
+    scores = (WEIGHTS["amount"] * amount_score
+              + WEIGHTS["date"] * date_score
+              + WEIGHTS["reference"] * reference_score
+              + WEIGHTS["party"] * party_score)
+
+    scores[transactions["is_deposit"][rows, None] != vouchers["is_deposit"][None, :]] = -1
+
+    return scores
+
+
+def _get_transaction_features(transactions: list) -> dict:
+    return {
+        "amount": np.array([abs(transaction.get("unallocated_amount") or 0) for transaction in transactions], dtype=float),
+        "date": np.array([_to_ordinal(transaction.get("date")) for transaction in transactions], dtype=float),
+        "reference_hash": np.array([_hash(transaction.get("reference_number")) for transaction in transactions], dtype=np.int64),
+        "description_hash": np.array([_hash(transaction.get("description")) for transaction in transactions], dtype=np.int64),
+        "trigrams": _get_trigram_matrix([
+            (transaction.get("reference_number"), transaction.get("description")) for transaction in transactions
+        ]),
+        # Missing parties never match: -1 for transactions (scored as unknown) and -2 for vouchers
+        "party": np.array([_party_code(transaction.get("party")) or -1 for transaction in transactions], dtype=np.int64),
+        "is_deposit": np.array([get_direction(transaction) == "deposit" for transaction in transactions]),
+    }
+
+
+def _get_voucher_features(vouchers: list) -> dict:
+    trigrams = _get_trigram_matrix([(voucher.get("reference_no"),) for voucher in vouchers])
+
+    return {
+        "amount": np.array([get_voucher_amount(voucher) for voucher in vouchers], dtype=float),
+        "posting_date": np.array([_to_ordinal(voucher.get("posting_date")) for voucher in vouchers], dtype=float),
+        "reference_date": np.array([_to_ordinal(voucher.get("reference_date")) for voucher in vouchers], dtype=float),
+        "reference_hash": np.array([_hash(voucher.get("reference_no")) for voucher in vouchers], dtype=np.int64),
+        "trigrams": trigrams,
+        "trigram_count": trigrams.sum(axis=1),
+        "party": np.array([_party_code(voucher.get("party")) or -2 for voucher in vouchers], dtype=np.int64),
+        "is_deposit": np.array([voucher.get("direction") != "withdrawal" for voucher in vouchers]),
+    }
+
+
+def _get_trigram_matrix(rows: list[tuple]):
+    """
+    One row per entry - a 1 in the bucket of each trigram of its (normalized) texts
+    """
+    matrix = np.zeros((len(rows), TRIGRAM_BUCKETS), dtype=np.float32)
+
+    for index, texts in enumerate(rows):
+        for text in texts:
+            text = normalize_reference(text)
+            if text:
+                for trigram in get_trigrams(text):
+                    matrix[index, zlib.crc32(trigram.encode()) % TRIGRAM_BUCKETS] = 1
+
+    return matrix
+
+
+def _hash(value) -> int:
+    """
+    Hash of the normalized value - 0 when it is empty
+    """
+    value = normalize_reference(value)
+    return zlib.crc32(value.encode()) + 1 if value else 0
+
+
+def _party_code(value) -> int:
+    return zlib.crc32(value.encode()) + 1 if value else 0
+
+
+def _to_ordinal(value) -> float:
+    date = to_date(value)
+    return date.toordinal() if date else np.nan
@@ -0,0 +1,304 @@
+"""
+Open vouchers that transactions can be matched against - fetched once for a whole bank account (or party)
+and period, instead of once per transaction.
+
+Every voucher is returned in the LinkedPayment shape used by the UI (doctype, name, paid_amount, posting_date,
+reference_no, reference_date, party_type, party, currency) with a `direction`:
+"deposit" for money coming in and "withdrawal" for money going out of the bank account.
+"""
+from __future__ import annotations
+import frappe
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Coalesce, Sum
+from frappe.utils import flt
+from pypika.terms import Criterion, ValueWrapper
+from truebalance.matching.open_items import get_open_items
+from truebalance.matching.scoring import AMOUNT_PRECISION
+
+# Vouchers a Debtor statement entry can be allocated to - as references of a "Receive" Payment Entry
+DEBTOR_STATEMENT_DOCTYPES = ("Sales Invoice", "Payment Entry")
+
+
+def get_open_vouchers(bank_account: str, from_date, to_date, document_types: list | None = None,
+                      direction: str | None = None, amount_range: tuple | None = None) -> list:
+    """
+    Submitted vouchers posted to the GL account of the bank account in the period that are not cleared yet, with
+    their `unallocated_amount` - what is left of them after the allocations to other bank transactions (see
+    set_unallocated_amounts). Fully allocated vouchers are left out.
+
+    Pass a direction ("deposit" or "withdrawal") and an amount_range (low, high) to only get the vouchers in that
+    direction with an unallocated amount in the range. The filter on the voucher amount is part of the query, so an
+    exact amount (low == high) is an indexed equality lookup (see setup/indexes.py) - vouchers that are already
+    partly allocated are fetched separately and filtered on what is left of them.
+    """
+    account = frappe.db.get_value("Bank Account", bank_account, "account")
+
+    if not account:
+        return []
+
+    # document type: (doctype, getter, the only direction its vouchers can have)
+    getters = {
+        "payment_entry": ("Payment Entry", _get_payment_entries, None),
+        "journal_entry": ("Journal Entry", _get_journal_entries, None),
+        "sales_invoice": ("Sales Invoice", _get_pos_sales_invoices, "deposit"),
+        "purchase_invoice": ("Purchase Invoice", _get_paid_purchase_invoices, "withdrawal"),
+    }
+
+    vouchers = []
+
+    for document_type in document_types or ["payment_entry", "journal_entry"]:
+        if document_type not in getters:
+            continue
+
+        doctype, getter, only_direction = getters[document_type]
+
+        if direction and only_direction and direction != only_direction:
+            continue
+
+        if not frappe.has_permission(doctype, "read"):
+            continue
+
+        doctype_vouchers = getter(account, from_date, to_date, direction, amount_range).run(as_dict=True)
+
+        if amount_range:
+            fetched = {voucher.name for voucher in doctype_vouchers}
+            doctype_vouchers.extend(
+                voucher for voucher in (getter(account, from_date, to_date, direction)
+                                        .where(frappe.qb.DocType(doctype).name.isin(_get_allocated_vouchers_query(doctype)))
+                                        .run(as_dict=True))
+                if voucher.name not in fetched
+            )
+
+        vouchers.extend(doctype_vouchers)
+
+    set_unallocated_amounts(vouchers)
+
+    low, high = amount_range or (None, None)
+
+    return [
+        voucher for voucher in vouchers
+        if voucher.unallocated_amount >= AMOUNT_PRECISION
+        and (not amount_range or low - AMOUNT_PRECISION < voucher.unallocated_amount < high + AMOUNT_PRECISION)
+    ]
+
+
+def set_unallocated_amounts(vouchers: list) -> list:
+    """
+    Set the `unallocated_amount` of each voucher - its amount less what is already allocated to submitted bank transactions
+    """
+    if not vouchers:
+        return vouchers
+
+    bank_transaction = frappe.qb.DocType("Bank Transaction")
+    bank_transaction_payments = frappe.qb.DocType("Bank Transaction Payments")
+
+    rows = (frappe.qb.from_(bank_transaction_payments)
+            .join(bank_transaction)
+            .on(bank_transaction_payments.parent == bank_transaction.name)
+            .select(
+                bank_transaction_payments.payment_document,
+                bank_transaction_payments.payment_entry,
+                Sum(bank_transaction_payments.allocated_amount).as_("allocated_amount"),
+            )
+            .where(bank_transaction_payments.parenttype == "Bank Transaction")
+            .where(bank_transaction.docstatus == 1)
+            .where(bank_transaction_payments.payment_entry.isin(list({voucher["name"] for voucher in vouchers})))
+            .groupby(bank_transaction_payments.payment_document, bank_transaction_payments.payment_entry)
+            .run(as_dict=True))
+
+    allocated = {(row.payment_document, row.payment_entry): flt(row.allocated_amount) for row in rows}
+
+    for voucher in vouchers:
+        voucher["unallocated_amount"] = flt(voucher["paid_amount"]) - allocated.get((voucher["doctype"], voucher["name"]), 0)
+
+    return vouchers
+
+
+def _get_allocated_vouchers_query(doctype):
+    """
+    Vouchers of the doctype that are allocated (in part) to submitted bank transactions
+    """
+    bank_transaction = frappe.qb.DocType("Bank Transaction")
+    bank_transaction_payments = frappe.qb.DocType("Bank Transaction Payments")
+
+    return (frappe.qb.from_(bank_transaction_payments)
+            .join(bank_transaction)
+            .on(bank_transaction_payments.parent == bank_transaction.name)
+            .select(bank_transaction_payments.payment_entry)
+            .where(bank_transaction_payments.parenttype == "Bank Transaction")
+            .where(bank_transaction_payments.payment_document == doctype)
+            .where(bank_transaction.docstatus == 1))
+
+
+def get_party_vouchers(party: str, party_type: str = "Customer", company: str | None = None) -> list:
+    """
+    Open items of a party - outstanding invoices, credit notes, unallocated payments and journal entries -
+    whenever they were posted (see open_items.py)
+    """
+    # The cache is shared by all users - only return vouchers the user can read
+    readable = {}
+
+    vouchers = []
+    for item in get_open_items(party_type, party, company):
+        if item["doctype"] not in readable:
+            readable[item["doctype"]] = frappe.has_permission(item["doctype"], "read")
+        if readable[item["doctype"]]:
+            vouchers.append(item)
+
+    return vouchers
+
+
+def get_debtor_statement_vouchers(party: str, party_type: str = "Customer", company: str | None = None) -> list:
+    """
+    Open items of a customer that a Debtor statement entry can be reconciled with - outstanding Sales Invoices
+    and payments received on account. Credit notes, refunds, journal entries and the open items of suppliers are
+    left out since allocate_vouchers cannot reference them on the receipt it creates.
+    """
+    if party_type != "Customer":
+        return []
+
+    return [voucher for voucher in get_party_vouchers(party, party_type, company) if is_debtor_statement_voucher(voucher)]
+
+
+def is_debtor_statement_voucher(voucher) -> bool:
+    return voucher["doctype"] in DEBTOR_STATEMENT_DOCTYPES and voucher["direction"] == "deposit"
+
+
+def _get_payment_entries(account, from_date, to_date, direction=None, amount_range=None):
+    payment_entry = frappe.qb.DocType("Payment Entry")
+    is_deposit = payment_entry.paid_to == account
+
+    query = (frappe.qb.from_(payment_entry)
+             .select(
+                 ValueWrapper("Payment Entry").as_("doctype"),
+                 payment_entry.name,
+                 Case().when(is_deposit, payment_entry.received_amount).else_(payment_entry.paid_amount).as_("paid_amount"),
+                 payment_entry.posting_date,
+                 payment_entry.reference_no,
+                 payment_entry.reference_date,
+                 payment_entry.party_type,
+                 payment_entry.party,
+                 Case().when(is_deposit, payment_entry.paid_to_account_currency)
+                 .else_(payment_entry.paid_from_account_currency).as_("currency"),
+                 Case().when(is_deposit, "deposit").else_("withdrawal").as_("direction"),
+             )
+             .where(payment_entry.docstatus == 1)
+             .where(payment_entry.clearance_date.isnull())
+             .where(payment_entry.posting_date[from_date:to_date])
+    )
+
+    if direction == "deposit":
+        return query.where(is_deposit).where(_in_range(payment_entry.received_amount, amount_range))
+    if direction == "withdrawal":
+        return query.where(payment_entry.paid_from == account).where(_in_range(payment_entry.paid_amount, amount_range))
+
+    return query.where((payment_entry.paid_from == account) | is_deposit)
+
+
+def _get_journal_entries(account, from_date, to_date, direction=None, amount_range=None):
+    journal_entry = frappe.qb.DocType("Journal Entry")
+    journal_entry_account = frappe.qb.DocType("Journal Entry Account")
+    is_deposit = journal_entry_account.debit_in_account_currency > 0
+
+    query = (frappe.qb.from_(journal_entry)
+             .join(journal_entry_account)
+             .on(journal_entry_account.parent == journal_entry.name)
+             .select(
+                 ValueWrapper("Journal Entry").as_("doctype"),
+                 journal_entry.name,
+                 Case().when(is_deposit, journal_entry_account.debit_in_account_currency)
+                 .else_(journal_entry_account.credit_in_account_currency).as_("paid_amount"),
+                 journal_entry.posting_date,
+                 journal_entry.cheque_no.as_("reference_no"),
+                 journal_entry.cheque_date.as_("reference_date"),
+                 journal_entry_account.party_type,
+                 journal_entry_account.party,
+                 journal_entry_account.account_currency.as_("currency"),
+                 Case().when(is_deposit, "deposit").else_("withdrawal").as_("direction"),
+             )
+             .where(journal_entry.docstatus == 1)
+             .where(journal_entry_account.docstatus == 1)
+             .where(journal_entry_account.account == account)
+             .where(journal_entry.clearance_date.isnull())
+             .where(journal_entry.posting_date[from_date:to_date])
+    )
+
+    if direction == "deposit":
+        return query.where(_in_range(journal_entry_account.debit_in_account_currency, amount_range, exclusive_low=0))
+    if direction == "withdrawal":
+        return query.where(_in_range(journal_entry_account.credit_in_account_currency, amount_range, exclusive_low=0))
+
+    return query
+
+
+def _get_pos_sales_invoices(account, from_date, to_date, direction=None, amount_range=None):
+    sales_invoice = frappe.qb.DocType("Sales Invoice")
+    sales_invoice_payment = frappe.qb.DocType("Sales Invoice Payment")
+
+    query = (frappe.qb.from_(sales_invoice)
+             .join(sales_invoice_payment)
+             .on(sales_invoice_payment.parent == sales_invoice.name)
+             .select(
+                 ValueWrapper("Sales Invoice").as_("doctype"),
+                 sales_invoice.name,
+                 sales_invoice_payment.amount.as_("paid_amount"),
+                 sales_invoice.posting_date,
+                 sales_invoice.name.as_("reference_no"),
+                 sales_invoice.posting_date.as_("reference_date"),
+                 ValueWrapper("Customer").as_("party_type"),
+                 sales_invoice.customer.as_("party"),
+                 sales_invoice.currency,
+                 ValueWrapper("deposit").as_("direction"),
+             )
+             .where(sales_invoice.docstatus == 1)
+             .where(sales_invoice.is_pos == 1)
+             .where(sales_invoice_payment.account == account)
+             .where(sales_invoice_payment.clearance_date.isnull())
+             .where(sales_invoice.posting_date[from_date:to_date])
+    )
+
+    return query.where(_in_range(sales_invoice_payment.amount, amount_range))
+
+
+def _get_paid_purchase_invoices(account, from_date, to_date, direction=None, amount_range=None):
+    purchase_invoice = frappe.qb.DocType("Purchase Invoice")
+
+    query = (frappe.qb.from_(purchase_invoice)
+             .select(
+                 ValueWrapper("Purchase Invoice").as_("doctype"),
+                 purchase_invoice.name,
+                 purchase_invoice.paid_amount,
+                 purchase_invoice.posting_date,
+                 Coalesce(purchase_invoice.bill_no, purchase_invoice.name).as_("reference_no"),
+                 Coalesce(purchase_invoice.bill_date, purchase_invoice.posting_date).as_("reference_date"),
+                 ValueWrapper("Supplier").as_("party_type"),
+                 purchase_invoice.supplier.as_("party"),
+                 purchase_invoice.currency,
+                 ValueWrapper("withdrawal").as_("direction"),
+             )
+             .where(purchase_invoice.docstatus == 1)
+             .where(purchase_invoice.is_paid == 1)
+             .where(purchase_invoice.cash_bank_account == account)
+             .where(purchase_invoice.clearance_date.isnull())
+             .where(purchase_invoice.posting_date[from_date:to_date])
+    )
+
+    return query.where(_in_range(purchase_invoice.paid_amount, amount_range))
+
+
+def _in_range(column, amount_range=None, exclusive_low=None):
+    """
+    Condition on an amount column - equality for an exact amount so that the index is used for the whole lookup
+    """
+    if not amount_range:
+        return column > exclusive_low if exclusive_low is not None else Criterion.all([])
+
+    low, high = amount_range
+
+    if low == high:
+        return column == low
+
+    if exclusive_low is not None and low <= exclusive_low:
+        return (column > exclusive_low) & (column <= high)
+
+    return column[low:high]
@@ -0,0 +1,74 @@
+"""
+Groups of transactions that together settle one voucher - card settlements and split wires arrive as
+several bank transactions for a single Payment Entry or Journal Entry.
+
+For every voucher, the unreconciled transactions in the same direction dated within the date window of
+the voucher are searched for combinations whose unallocated amounts add up to the voucher's unallocated
+amount (see subset_sum.py).
+"""
+from __future__ import annotations
+import time
+from truebalance.matching.batch_scoring import get_direction
+from truebalance.matching.scoring import to_date
+from truebalance.matching.subset_sum import find_combinations
+
+# Transactions dated up to this many days from the voucher's posting (or reference) date are grouped
+DATE_WINDOW_DAYS = 7
+
+# Time budget of the search for a single voucher and for all vouchers together, in seconds
+VOUCHER_TIME_BUDGET = 0.05
+TOTAL_TIME_BUDGET = 3
+
+
+def find_transaction_groups(transactions: list, vouchers: list, date_window: int = DATE_WINDOW_DAYS,
+                            max_groups_per_voucher: int = 3, tolerance: float = 0, precision: int = 2) -> list:
+    """
+    Returns [{"voucher": voucher, "transactions": [transactions], "total": sum of their unallocated amounts}]
+
+    Vouchers need `unallocated_amount` (the part not allocated to other transactions yet) besides the
+    LinkedPayment fields. Groups with fewer transactions come first.
+    """
+    deadline = time.monotonic() + TOTAL_TIME_BUDGET
+    transaction_dates = [to_date(transaction.get("date")) for transaction in transactions]
+
+    groups = []
+
+    for voucher in vouchers:
+        if time.monotonic() > deadline:
+            break
+
+        amount = abs(voucher.get("unallocated_amount") or 0)
+        voucher_dates = [date for date in (to_date(voucher.get("posting_date")), to_date(voucher.get("reference_date"))) if date]
+
+        if not amount or not voucher_dates:
+            continue
+
+        candidates = [
+            transaction for transaction, date in zip(transactions, transaction_dates)
+            if date
+            and get_direction(transaction) == voucher.get("direction", "deposit")
+            and 0 < abs(transaction.get("unallocated_amount") or 0) < amount
+            and any(abs((date - voucher_date).days) <= date_window for voucher_date in voucher_dates)
+        ]
+
+        if len(candidates) < 2:
+            continue
+
+        # Transactions closest to the voucher date are searched first
+        candidates.sort(key=lambda transaction: min(abs((to_date(transaction.get("date")) - voucher_date).days) for voucher_date in voucher_dates))
+
+        combinations = find_combinations(amount, [abs(transaction.get("unallocated_amount") or 0) for transaction in candidates],
+                                         tolerance=tolerance, precision=precision, max_results=max_groups_per_voucher,
+                                         time_budget=min(VOUCHER_TIME_BUDGET, max(0, deadline - time.monotonic())))
+
+        for combination in combinations:
+            group = sorted((candidates[index] for index in combination), key=lambda transaction: str(transaction.get("date")))
+            groups.append({
+                "voucher": voucher,
+                "transactions": group,
+                "total": round(sum(abs(transaction.get("unallocated_amount") or 0) for transaction in group), precision),
+            })
+
+    groups.sort(key=lambda group: len(group["transactions"]))
+
+    return groups
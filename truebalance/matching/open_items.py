@@ -0,0 +1,159 @@
+"""
+Open items of a party - outstanding invoices, credit notes, unallocated payments and journal entries -
+kept in the cache so that matching a statement line does not scan the party's whole history.
+
+The open items are built from the Payment Ledger Entry: the entries of a party are grouped by the voucher
+they are against, and every voucher whose balance is not zero is open. Amounts in the payment ledger are
+signed so that a positive balance is owed by the party (customer) or to the party (supplier) - an invoice
+or debit note - and a negative balance is an advance, an unallocated payment or a credit note.
+
+The cached open items of a party are dropped whenever a payment ledger entry of the party is submitted -
+that is on submit and cancel of any voucher and whenever payments are allocated against invoices - and
+rebuilt on the next read.
+"""
+from __future__ import annotations
+import frappe
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Abs, Coalesce, Max, Min, Sum
+from frappe.utils import flt
+
+# Open items are rebuilt at least once a day even if no hook fires (e.g. after a repost)
+OPEN_ITEMS_CACHE_TTL = 24 * 60 * 60
+
+# Vouchers that move money - their balance is cash already received or paid, not a claim
+PAYMENT_DOCTYPES = ("Payment Entry", "Journal Entry")
+
+# Balances below this are settled
+OUTSTANDING_PRECISION = 0.005
+
+
+def get_open_items(party_type: str, party: str, company: str | None = None) -> list:
+    """
+    Open items of the party in the LinkedPayment shape (doctype, name, paid_amount, posting_date, reference_no,
+    reference_date, party_type, party, currency, direction) with the company - oldest first.
+
+    paid_amount is the outstanding (or unallocated) amount of the voucher.
+    """
+    cache_key = _get_cache_key(party_type, party)
+    open_items = frappe.cache.get_value(cache_key)
+
+    if open_items is None:
+        open_items = _build_open_items(party_type, party)
+        frappe.cache.set_value(cache_key, open_items, expires_in_sec=OPEN_ITEMS_CACHE_TTL)
+
+    if company:
+        return [item for item in open_items if item["company"] == company]
+
+    return open_items
+
+
+def invalidate_open_items(doc, method=None):
+    """
+    doc_events hook on Payment Ledger Entry - drops the cached open items of the entry's party
+    """
+    if doc.party_type and doc.party:
+        clear_open_items_cache(doc.party_type, doc.party)
+
+
+def clear_open_items_cache(party_type: str, party: str):
+    """
+    Drop the cached open items of a party - now, and again once the transaction is committed so that a read
+    running in parallel cannot cache the open items from before the change.
+    """
+    cache_key = _get_cache_key(party_type, party)
+
+    frappe.cache.delete_value(cache_key)
+    frappe.db.after_commit.add(lambda: frappe.cache.delete_value(cache_key))
+
+
+def _build_open_items(party_type, party) -> list:
+    payment_ledger_entry = frappe.qb.DocType("Payment Ledger Entry")
+    outstanding = Sum(payment_ledger_entry.amount_in_account_currency)
+
+    rows = (frappe.qb.from_(payment_ledger_entry)
+            .select(
+                payment_ledger_entry.against_voucher_type.as_("doctype"),
+                payment_ledger_entry.against_voucher_no.as_("name"),
+                payment_ledger_entry.company,
+                payment_ledger_entry.account_currency.as_("currency"),
+                outstanding.as_("outstanding"),
+                # The posting date of the voucher itself, not of the payments allocated against it
+                Coalesce(
+                    Max(Case().when(payment_ledger_entry.voucher_no == payment_ledger_entry.against_voucher_no, payment_ledger_entry.posting_date)),
+                    Min(payment_ledger_entry.posting_date),
+                ).as_("posting_date"),
+            )
+            .where(payment_ledger_entry.party_type == party_type)
+            .where(payment_ledger_entry.party == party)
+            .where(payment_ledger_entry.delinked == 0)
+            .where(payment_ledger_entry.docstatus == 1)
+            .groupby(
+                payment_ledger_entry.company,
+                payment_ledger_entry.against_voucher_type,
+                payment_ledger_entry.against_voucher_no,
+                payment_ledger_entry.account_currency,
+            )
+            .having(Abs(outstanding) >= OUTSTANDING_PRECISION)
+            .run(as_dict=True))
+
+    references = _get_references(rows)
+
+    # Customers pay into the bank account, suppliers are paid from it
+    expected_direction = "withdrawal" if party_type == "Supplier" else "deposit"
+    opposite_direction = "deposit" if expected_direction == "withdrawal" else "withdrawal"
+
+    open_items = []
+
+    for row in rows:
+        reference_no, reference_date = references.get((row.doctype, row.name), (None, None))
+
+        # A positive balance is a claim (money is still to move in the expected direction) unless the voucher
+        # is a payment - then it is a refund. A negative balance is a payment made in the expected direction
+        # unless the voucher is an invoice - then it is a credit note.
+        is_claim = row.outstanding > 0
+        is_payment = row.doctype in PAYMENT_DOCTYPES
+
+        open_items.append({
+            'doctype': row.doctype,
+            'name': row.name,
+            'company': row.company,
+            'paid_amount': abs(flt(row.outstanding)),
+            'posting_date': str(row.posting_date),
+            'currency': row.currency,
+            'party': party,
+            'party_type': party_type,
+            'reference_no': reference_no or row.name,
+            'reference_date': str(reference_date or row.posting_date),
+            'direction': expected_direction if is_claim != is_payment else opposite_direction,
+        })
+
+    open_items.sort(key=lambda item: item['posting_date'])
+
+    return open_items
+
+
+def _get_references(rows) -> dict:
+    """
+    {(doctype, name): (reference_no, reference_date)} of the payments and supplier bills among the open items
+    """
+    reference_fields = {
+        "Payment Entry": ["reference_no", "reference_date"],
+        "Journal Entry": ["cheque_no as reference_no", "cheque_date as reference_date"],
+        "Purchase Invoice": ["bill_no as reference_no", "bill_date as reference_date"],
+    }
+
+    references = {}
+
+    for doctype, fields in reference_fields.items():
+        names = [row.name for row in rows if row.doctype == doctype]
+        if not names:
+            continue
+
+        for voucher in frappe.get_all(doctype, filters={"name": ["in", names]}, fields=["name", *fields]):
+            references[(doctype, voucher.name)] = (voucher.reference_no, voucher.reference_date)
+
+    return references
+
+
+def _get_cache_key(party_type, party):
+    return f"truebalance:open_items:{party_type}:{party}"
@@ -0,0 +1,333 @@
+"""
+Safety checks for user supplied regex description rules.
+
+- A static check that rejects patterns prone to catastrophic backtracking (nested quantifiers and
+  repeated alternations whose branches overlap), used when a rule is validated.
+- A time limited search, so that a pattern that slips through cannot stall the evaluation of every company.
+- A per worker cache of compiled patterns keyed by the rule's modified timestamp.
+"""
+from __future__ import annotations
+import re
+import signal
+import threading
+import time
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# Maximum time (in seconds) a single regex search is allowed to take
+REGEX_TIME_LIMIT = 0.1
+
+# Repetitions of at most this many times are bounded - nesting them cannot blow up
+MAX_SAFE_REPEAT = 10
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+
+# Items that match a single character
+_CHARACTER_OPS = {sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN, sre_constants.CATEGORY}
+
+# Overlaps of character classes are checked on ASCII and a few non-ASCII letters, digits and spaces
+_ALPHABET = [chr(code) for code in range(128)] + ["\u00e9", "\u0663", "\u00a0"]
+
+_ANY_CHARACTER = re.compile(".", re.DOTALL)
+
+_CATEGORY_PATTERNS = {
+    sre_constants.CATEGORY_DIGIT: re.compile(r"\d"),
+    sre_constants.CATEGORY_NOT_DIGIT: re.compile(r"\D"),
+    sre_constants.CATEGORY_SPACE: re.compile(r"\s"),
+    sre_constants.CATEGORY_NOT_SPACE: re.compile(r"\S"),
+    sre_constants.CATEGORY_WORD: re.compile(r"\w"),
+    sre_constants.CATEGORY_NOT_WORD: re.compile(r"\W"),
+}
+
+_compiled_patterns = {}
+
+
+class RegexTimeout(Exception):
+    pass
+
+
+def get_compiled_patterns(cache_key, values: list[str]) -> list[re.Pattern]:
+    """
+    Compile the (lower cased) regex values of a rule once per worker.
+
+    The cache key should change whenever the rule changes - for example (rule name, modified timestamp).
+    """
+    if cache_key is None:
+        return [re.compile(value) for value in values]
+
+    patterns = _compiled_patterns.get(cache_key)
+
+    if patterns is None:
+        if len(_compiled_patterns) > 1000:
+            # Old versions of edited rules are never looked up again
+            _compiled_patterns.clear()
+        patterns = _compiled_patterns[cache_key] = [re.compile(value) for value in values]
+
+    return patterns
+
+
+def search_with_time_limit(pattern: re.Pattern, text: str, time_limit: float = REGEX_TIME_LIMIT):
+    """
+    Run `pattern.search` and raise RegexTimeout if it takes longer than the time limit.
+
+    The limit is enforced with a SIGALRM timer, so it only applies in the main thread (like in background workers).
+    Elsewhere the search runs without a limit.
+
+    The timer is shared with the job timeout of the worker - a timer that is already running is restored (less the
+    time spent searching) afterwards, and if it falls due during the search its own handler is called.
+    """
+    if not time_limit or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        return pattern.search(text)
+
+    started = time.monotonic()
+    previous_delay, previous_interval = signal.setitimer(signal.ITIMER_REAL, 0)
+
+    def on_timeout(signum, frame):
+        if previous_delay and time.monotonic() - started >= previous_delay and callable(previous_handler):
+            # The enclosing timer (e.g. the job timeout) is due
+            return previous_handler(signum, frame)
+
+        raise RegexTimeout(pattern.pattern)
+
+    previous_handler = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, min(time_limit, previous_delay) if previous_delay else time_limit)
+
+    try:
+        return pattern.search(text)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+        if previous_delay:
+            # Re-arm the enclosing timer - if it is already due it fires right away
+            remaining = previous_delay - (time.monotonic() - started)
+            signal.setitimer(signal.ITIMER_REAL, max(remaining, 1e-6), previous_interval)
+
+
+def is_prone_to_catastrophic_backtracking(pattern: str) -> bool:
+    """
+    Static check for patterns whose backtracking can grow exponentially with the input length, like
+    "(a+)+", "(.*)*", "(\\w+\\s?)*$" or "(\\w|\\d)+".
+
+    A repetition is only flagged if it can repeat more than MAX_SAFE_REPEAT times and its body can match the
+    same text in more than one way - it contains a variable length item that is not separated from the next
+    iteration by a mandatory item it cannot match (like the comma in "(\\d{1,3},)*"), or an alternation whose
+    branches can start with the same character.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError):
+        return False
+
+    return _has_unsafe_repeat(parsed)
+
+
+def _has_unsafe_repeat(subpattern) -> bool:
+    for op, av in subpattern:
+        if op in _REPEATS:
+            _min_count, max_count, item = av
+
+            if max_count > MAX_SAFE_REPEAT and (_has_ambiguous_repeat(_flatten(item)) or _has_overlapping_branches(item)):
+                return True
+
+            if _has_unsafe_repeat(item):
+                return True
+
+        elif op == sre_constants.SUBPATTERN:
+            if _has_unsafe_repeat(av[-1]):
+                return True
+
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                if _has_unsafe_repeat(branch):
+                    return True
+
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _has_unsafe_repeat(av[1]):
+                return True
+
+    return False
+
+
+def _flatten(subpattern) -> list:
+    """
+    The items of a sequence with its groups expanded in place
+    """
+    items = []
+
+    for op, av in subpattern:
+        if op == sre_constants.SUBPATTERN:
+            items.extend(_flatten(av[-1]))
+        else:
+            items.append((op, av))
+
+    return items
+
+
+def _has_ambiguous_repeat(body: list) -> bool:
+    """
+    Whether a repeated body contains a variable length item that can take over the text of the body's next
+    iteration - every mandatory item of the body outside it matches characters the item also matches
+    """
+    for index, item in enumerate(body):
+        if not _is_variable([item]):
+            continue
+
+        characters = _get_characters([item])
+
+        is_separated = any(
+            other_index != index and _get_min_length([other]) > 0 and not (_get_characters([other]) & characters)
+            for other_index, other in enumerate(body)
+        )
+
+        if not is_separated:
+            return True
+
+    return False
+
+
+def _has_overlapping_branches(subpattern) -> bool:
+    """
+    Whether a repeated item contains an alternation whose branches can start with the same character
+    """
+    for op, av in subpattern:
+        if op == sre_constants.SUBPATTERN and _has_overlapping_branches(av[-1]):
+            return True
+
+        if op == sre_constants.SUBPATTERN and len(av[-1]) == 1 and av[-1][0][0] == sre_constants.IN:
+            # The parser merges an alternation of single characters like "(\\w|\\d)" into a character class
+            if _has_overlapping_class_items(av[-1][0][1]):
+                return True
+
+        if op == sre_constants.BRANCH:
+            first_characters = [_get_first_characters(branch) for branch in av[1]]
+
+            for index, characters in enumerate(first_characters):
+                for other in first_characters[index + 1:]:
+                    if characters & other:
+                        return True
+
+    return False
+
+
+def _has_overlapping_class_items(items) -> bool:
+    if any(op == sre_constants.NEGATE for op, _av in items):
+        return False
+
+    item_characters = [_get_characters([(sre_constants.IN, [item])]) for item in items]
+
+    for index, characters in enumerate(item_characters):
+        for other in item_characters[index + 1:]:
+            if characters & other:
+                return True
+
+    return False
+
+
+def _is_variable(subpattern) -> bool:
+    """
+    Whether the sequence can match texts of different lengths
+    """
+    for op, av in subpattern:
+        if op in _REPEATS and (av[0] != av[1] or _is_variable(av[2])):
+            return True
+
+        if op == sre_constants.SUBPATTERN and _is_variable(av[-1]):
+            return True
+
+        if op == sre_constants.BRANCH and (
+            any(_is_variable(branch) for branch in av[1])
+            or len({_get_min_length(branch) for branch in av[1]}) > 1
+        ):
+            return True
+
+    return False
+
+
+def _get_min_length(subpattern) -> int:
+    length = 0
+
+    for op, av in subpattern:
+        if op in _CHARACTER_OPS:
+            length += 1
+        elif op in _REPEATS:
+            length += av[0] * _get_min_length(av[2])
+        elif op == sre_constants.SUBPATTERN:
+            length += _get_min_length(av[-1])
+        elif op == sre_constants.BRANCH:
+            length += min(_get_min_length(branch) for branch in av[1])
+
+    return length
+
+
+def _get_first_characters(subpattern) -> frozenset:
+    """
+    The characters (of the sample alphabet) the sequence can start with
+    """
+    characters = frozenset()
+
+    for op, av in subpattern:
+        if op == sre_constants.SUBPATTERN:
+            characters |= _get_first_characters(av[-1])
+        elif op in _REPEATS:
+            characters |= _get_first_characters(av[2])
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                characters |= _get_first_characters(branch)
+        else:
+            characters |= _get_characters([(op, av)])
+
+        if _get_min_length([(op, av)]) > 0:
+            break
+
+    return characters
+
+
+def _get_characters(subpattern) -> frozenset:
+    """
+    The characters (of the sample alphabet) that any part of the sequence can match
+    """
+    characters = set()
+
+    for op, av in subpattern:
+        if op in _REPEATS:
+            characters |= _get_characters(av[2])
+        elif op == sre_constants.SUBPATTERN:
+            characters |= _get_characters(av[-1])
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                characters |= _get_characters(branch)
+        elif op in _CHARACTER_OPS:
+            characters |= {character for character in _ALPHABET if _matches_character(op, av, character)}
+
+    return frozenset(characters)
+
+
+def _matches_character(op, av, character) -> bool:
+    if op == sre_constants.ANY:
+        return character != "\n"
+
+    if op == sre_constants.LITERAL:
+        return ord(character) == av
+
+    if op == sre_constants.NOT_LITERAL:
+        return ord(character) != av
+
+    if op == sre_constants.CATEGORY:
+        return _CATEGORY_PATTERNS.get(av, _ANY_CHARACTER).match(character) is not None
+
+    # IN - a character class
+    negate = any(item_op == sre_constants.NEGATE for item_op, _item_av in av)
+    matches = any(
+        _matches_character(item_op, item_av, character) if item_op != sre_constants.RANGE
+        else item_av[0] <= ord(character) <= item_av[1]
+        for item_op, item_av in av if item_op != sre_constants.NEGATE
+    )
+
+    return matches != negate
@@ -0,0 +1,311 @@
+"""
+Compiled matcher for Mint Bank Transaction Rules.
+
+Rules are compiled once per evaluation run and partitioned by company and by the
+transaction types they apply to. Within a partition, all "Contains" values are
+loaded into a single Aho-Corasick automaton, "Starts With" and "Ends With" values
+into prefix/suffix tries and "Regex" values are pre-compiled.
+
+The result is the same as walking the rules in priority order and checking every
+description rule: the first rule (by priority) whose type, amount and any one
+description rule match the transaction wins.
+"""
+from __future__ import annotations
+from collections import deque
+from time import perf_counter
+from truebalance.matching.regex_safety import RegexTimeout, get_compiled_patterns, search_with_time_limit
+
+# Key under which `match_all` records the time spent in the shared automata (not attributable to a single rule)
+SHARED_TIMING_KEY = "__automata__"
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring automaton.
+
+    Each pattern carries a payload (the position of the owning rule in a partition).
+    `search` returns the set of payloads whose pattern occurs anywhere in the text.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._built = False
+
+    def add(self, pattern: str, payload):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+        self._out[node].append(payload)
+        self._built = False
+
+    def build(self):
+        queue = deque()
+        for next_node in self._goto[0].values():
+            self._fail[next_node] = 0
+            queue.append(next_node)
+
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail_target = self._goto[fail].get(char, 0)
+                self._fail[next_node] = fail_target if fail_target != next_node else 0
+                # Inherit the outputs of the longest proper suffix so that a search only has to look at the current node
+                self._out[next_node] = self._out[next_node] + self._out[self._fail[next_node]]
+
+        self._built = True
+
+    def search(self, text: str) -> set:
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        found = set(out[0])
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class Trie:
+    """
+    Character trie used for "Starts With" (and, with reversed strings, "Ends With") checks.
+
+    `walk` returns the set of payloads for every pattern that is a prefix of the text.
+    """
+
+    def __init__(self):
+        self._children = [{}]
+        self._out = [[]]
+
+    def add(self, pattern: str, payload):
+        node = 0
+        for char in pattern:
+            next_node = self._children[node].get(char)
+            if next_node is None:
+                next_node = len(self._children)
+                self._children.append({})
+                self._out.append([])
+                self._children[node][char] = next_node
+            node = next_node
+        self._out[node].append(payload)
+
+    def walk(self, text) -> set:
+        children = self._children
+        out = self._out
+
+        found = set(out[0])
+        node = 0
+        for char in text:
+            node = children[node].get(char)
+            if node is None:
+                break
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class CompiledRule:
+    __slots__ = ("doc", "name", "transaction_type", "min_amount", "max_amount", "regexes", "skipped", "on_regex_timeout")
+
+    def __init__(self, doc, skipped: bool = False, on_regex_timeout=None):
+        self.doc = doc
+        self.name = doc.name
+        self.transaction_type = doc.transaction_type
+        self.min_amount = doc.min_amount
+        self.max_amount = doc.max_amount
+        self.skipped = skipped
+        self.on_regex_timeout = on_regex_timeout
+
+        # Saved rules are compiled once per worker - until they are modified again
+        modified = doc.get("modified")
+        self.regexes = get_compiled_patterns(
+            (doc.name, str(modified)) if modified else None,
+            [(row.value or "").lower() for row in doc.description_rules if row.check == "Regex"]
+        )
+
+    def applies_to(self, withdrawal_is_zero: bool, deposit_is_zero: bool) -> bool:
+        if self.transaction_type == "Withdrawal" and withdrawal_is_zero:
+            return False
+        if self.transaction_type == "Deposit" and deposit_is_zero:
+            return False
+        return True
+
+    def accepts_amount(self, amount) -> bool:
+        if self.min_amount and amount < self.min_amount:
+            return False
+        if self.max_amount and amount > self.max_amount:
+            return False
+        return True
+
+    def search_regex(self, description: str) -> bool:
+        try:
+            for pattern in self.regexes:
+                if search_with_time_limit(pattern, description):
+                    return True
+        except RegexTimeout:
+            # Skip the rule for the rest of the run - and let the caller flag it
+            self.skipped = True
+            if self.on_regex_timeout:
+                self.on_regex_timeout(self.doc)
+        return False
+
+
+class RulePartition:
+    """
+    All rules of a company that can apply to a given transaction type, in priority order,
+    with their description checks compiled into shared automata.
+    """
+
+    def __init__(self, rules: list[CompiledRule]):
+        self.rules = rules
+        self.contains = AhoCorasick()
+        self.starts_with = Trie()
+        self.ends_with = Trie()
+        self.regex_positions = set()
+
+        for position, rule in enumerate(rules):
+            for row in rule.doc.description_rules:
+                value = (row.value or "").lower()
+                if row.check == "Contains":
+                    self.contains.add(value, position)
+                elif row.check == "Starts With":
+                    self.starts_with.add(value, position)
+                elif row.check == "Ends With":
+                    self.ends_with.add(value[::-1], position)
+
+            if rule.regexes:
+                self.regex_positions.add(position)
+
+        self.contains.build()
+
+    def literal_hits(self, description: str) -> set:
+        hits = self.contains.search(description)
+        hits |= self.starts_with.walk(description)
+        hits |= self.ends_with.walk(reversed(description))
+        return hits
+
+    def match(self, description: str, amount):
+        if not self.rules:
+            return None
+
+        hits = self.literal_hits(description)
+
+        # Only rules with a literal hit or a regex can match - walk them in priority order
+        for position in sorted(hits | self.regex_positions):
+            rule = self.rules[position]
+            if rule.skipped or not rule.accepts_amount(amount):
+                continue
+            if position in hits or rule.search_regex(description):
+                return rule
+        return None
+
+    def match_all(self, description: str, amount, timings: dict | None = None) -> list[CompiledRule]:
+        """
+        Returns every matching rule in priority order (not just the first).
+
+        If `timings` is passed, the seconds spent verifying each rule are added to it (keyed by rule name).
+        """
+        if not self.rules:
+            return []
+
+        start = perf_counter()
+        hits = self.literal_hits(description)
+        if timings is not None:
+            timings[SHARED_TIMING_KEY] = timings.get(SHARED_TIMING_KEY, 0) + perf_counter() - start
+
+        matches = []
+        for position in sorted(hits | self.regex_positions):
+            rule = self.rules[position]
+            if rule.skipped:
+                continue
+            start = perf_counter()
+            if rule.accepts_amount(amount) and (position in hits or rule.search_regex(description)):
+                matches.append(rule)
+            if timings is not None:
+                timings[rule.name] = timings.get(rule.name, 0) + perf_counter() - start
+        return matches
+
+
+class RuleMatcher:
+    """
+    Matches transactions against a priority ordered list of `Mint Bank Transaction Rule TB` documents.
+
+    Build it once per evaluation run and call `match` for every transaction.
+
+    Rules in `skip_rules` are ignored. If a regex of a rule exceeds its time limit, the rule is skipped from then on
+    and `on_regex_timeout` is called with the rule document.
+    """
+
+    def __init__(self, rule_docs: list, skip_rules: set | None = None, on_regex_timeout=None):
+        skip_rules = skip_rules or set()
+
+        self.rules_by_company = {}
+        for doc in rule_docs:
+            compiled_rule = CompiledRule(doc, skipped=doc.name in skip_rules, on_regex_timeout=on_regex_timeout)
+            self.rules_by_company.setdefault(doc.company, []).append(compiled_rule)
+
+        self._partitions = {}
+
+    def get_partition(self, company: str, withdrawal_is_zero: bool, deposit_is_zero: bool) -> RulePartition:
+        key = (company, withdrawal_is_zero, deposit_is_zero)
+        partition = self._partitions.get(key)
+        if partition is None:
+            rules = [
+                rule for rule in self.rules_by_company.get(company, [])
+                if rule.applies_to(withdrawal_is_zero, deposit_is_zero)
+            ]
+            partition = self._partitions[key] = RulePartition(rules)
+        return partition
+
+    def match(self, transaction):
+        """
+        Returns the first matching rule document for the transaction, or None
+        """
+        if transaction.company not in self.rules_by_company:
+            return None
+
+        partition = self.get_partition(transaction.company,
+                                       transaction.withdrawal == 0.0,
+                                       transaction.deposit == 0.0)
+
+        description = (transaction.description or "").lower()
+        amount = transaction.withdrawal or transaction.deposit
+
+        rule = partition.match(description, amount)
+        return rule.doc if rule else None
+
+    def match_all(self, transaction, timings: dict | None = None) -> list:
+        """
+        Returns all matching rule documents for the transaction in priority order - the first one is what `match` returns
+        """
+        if transaction.company not in self.rules_by_company:
+            return []
+
+        partition = self.get_partition(transaction.company,
+                                       transaction.withdrawal == 0.0,
+                                       transaction.deposit == 0.0)
+
+        description = (transaction.description or "").lower()
+        amount = transaction.withdrawal or transaction.deposit
+
+        return [rule.doc for rule in partition.match_all(description, amount, timings)]
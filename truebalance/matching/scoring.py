@@ -0,0 +1,165 @@
+"""
+Scoring of voucher candidates (Payment Entries, Journal Entries, Invoices ...) for a bank transaction.
+
+Every candidate gets a score between 0 and 1 - the weighted sum of:
+
+- amount: 1 when the voucher amount (what is left of it to allocate, if known) equals the unallocated amount of
+  the transaction, falling linearly to 0 as the difference reaches the transaction amount
+- date: 1 on the same day (posting or reference date, whichever is closer), falling linearly to 0 at DATE_WINDOW_DAYS
+- reference: 1 when the voucher reference equals the transaction reference or description, PARTIAL_REFERENCE_SCORE
+  when it is contained in them, otherwise the trigram similarity of the references
+- party: 1 when the parties are the same, 0 when they differ and UNKNOWN_PARTY_SCORE when the transaction has no party
+"""
+from __future__ import annotations
+import datetime
+import re
+from truebalance.matching.search_tokens import get_trigrams
+
+WEIGHTS = {
+    "amount": 0.4,
+    "date": 0.2,
+    "reference": 0.3,
+    "party": 0.1,
+}
+
+DATE_WINDOW_DAYS = 30
+
+PARTIAL_REFERENCE_SCORE = 0.8
+
+UNKNOWN_PARTY_SCORE = 0.5
+
+# Amounts closer than this are equal
+AMOUNT_PRECISION = 0.005
+
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+def rank_candidates(transaction, vouchers: list, top_n: int | None = None) -> list:
+    """
+    Score the vouchers for the transaction and return them sorted by score (highest first).
+
+    The transaction needs `unallocated_amount`, `date`, `reference_number`, `description` and `party`.
+    Vouchers need `paid_amount`, `posting_date`, `reference_date`, `reference_no` and `party`.
+
+    Each voucher is returned with `score`, `score_breakdown` (the unweighted score of every component),
+    the match flags used by the UI and `is_suggested` (for the best candidate, if it is a likely match).
+    """
+    scored = [{**voucher, **score_candidate(transaction, voucher)} for voucher in vouchers]
+    scored.sort(key=lambda voucher: voucher["score"], reverse=True)
+
+    if scored:
+        best = scored[0]
+        best["is_suggested"] = best["amount_matches"] and (
+            best["posting_date_matches"] or best["reference_date_matches"] or best["reference_matches_partial"]
+        )
+
+    return scored[:top_n] if top_n else scored
+
+
+def get_voucher_amount(voucher) -> float:
+    """
+    The amount of the voucher that can still be matched - its `unallocated_amount` if set, otherwise its `paid_amount`
+    """
+    unallocated_amount = voucher.get("unallocated_amount")
+
+    return abs((unallocated_amount if unallocated_amount is not None else voucher.get("paid_amount")) or 0)
+
+
+def score_candidate(transaction, voucher) -> dict:
+    transaction_amount = abs(transaction.get("unallocated_amount") or 0)
+    voucher_amount = get_voucher_amount(voucher)
+
+    transaction_date = to_date(transaction.get("date"))
+    posting_date = to_date(voucher.get("posting_date"))
+    reference_date = to_date(voucher.get("reference_date"))
+
+    reference = normalize_reference(voucher.get("reference_no"))
+    transaction_references = [
+        normalize_reference(transaction.get("reference_number")),
+        normalize_reference(transaction.get("description")),
+    ]
+
+    breakdown = {
+        "amount": amount_score(transaction_amount, voucher_amount),
+        "date": max(date_score(transaction_date, posting_date), date_score(transaction_date, reference_date)),
+        "reference": reference_score(reference, transaction_references),
+        "party": party_score(transaction.get("party"), voucher.get("party")),
+    }
+
+    return {
+        "score": round(sum(WEIGHTS[component] * value for component, value in breakdown.items()), 4),
+        "score_breakdown": {component: round(value, 4) for component, value in breakdown.items()},
+        "amount_matches": abs(transaction_amount - voucher_amount) < AMOUNT_PRECISION,
+        "posting_date_matches": bool(transaction_date and transaction_date == posting_date),
+        "reference_date_matches": bool(transaction_date and transaction_date == reference_date),
+        "reference_matches_full": bool(reference) and reference in transaction_references,
+        "reference_matches_partial": bool(reference) and any(reference in value for value in transaction_references if value),
+        "is_suggested": False,
+    }
+
+
+def amount_score(transaction_amount: float, voucher_amount: float) -> float:
+    difference = abs(transaction_amount - voucher_amount)
+
+    if difference < AMOUNT_PRECISION:
+        return 1.0
+
+    if not transaction_amount:
+        return 0.0
+
+    return max(0.0, 1 - difference / transaction_amount)
+
+
+def date_score(transaction_date, voucher_date) -> float:
+    if not transaction_date or not voucher_date:
+        return 0.0
+
+    days = abs((transaction_date - voucher_date).days)
+    return max(0.0, 1 - days / DATE_WINDOW_DAYS)
+
+
+def reference_score(reference: str, transaction_references: list[str]) -> float:
+    if not reference:
+        return 0.0
+
+    if reference in transaction_references:
+        return 1.0
+
+    if any(reference in value for value in transaction_references if value):
+        return PARTIAL_REFERENCE_SCORE
+
+    reference_trigrams = set(get_trigrams(reference))
+
+    return max((trigram_similarity(reference_trigrams, value) for value in transaction_references if value), default=0.0)
+
+
+def trigram_similarity(trigrams: set, text: str) -> float:
+    """
+    Share of the reference's trigrams that occur in the text
+    """
+    if not trigrams:
+        return 0.0
+    return len(trigrams & set(get_trigrams(text))) / len(trigrams)
+
+
+def party_score(transaction_party, voucher_party) -> float:
+    if not transaction_party:
+        return UNKNOWN_PARTY_SCORE
+    return 1.0 if transaction_party == voucher_party else 0.0
+
+
+def normalize_reference(value) -> str:
+    return _NON_ALPHANUMERIC.sub("", str(value or "")).lower()
+
+
+def to_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
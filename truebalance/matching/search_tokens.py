@@ -0,0 +1,52 @@
+"""
+Tokenizer for the transaction search index.
+
+A description and reference are split into lower cased alphanumeric words. Each word is indexed as is
+and as character trigrams, so that a search still ranks transactions whose text has typos, is abbreviated
+or has words glued together ("NEFT-ACME" / "neftacme").
+
+Trigram tokens are prefixed so that they do not collide with whole words and are not dropped as
+stopwords or for being shorter than the full text index's minimum token size.
+"""
+from __future__ import annotations
+import re
+
+TRIGRAM_PREFIX = "tg"
+
+# Words shorter than this are only indexed as a single (prefixed) token
+MIN_WORD_LENGTH = 3
+
+# Upper bound on the number of distinct tokens stored per transaction
+MAX_TOKENS = 500
+
+_WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+def get_words(text: str | None) -> list[str]:
+    return _WORD_PATTERN.findall((text or "").lower())
+
+
+def get_trigrams(word: str) -> list[str]:
+    if len(word) < MIN_WORD_LENGTH:
+        return [word]
+    return [word[index:index + 3] for index in range(len(word) - 2)]
+
+
+def get_search_tokens(*texts: str | None) -> list[str]:
+    """
+    Returns the distinct index tokens for the given texts, in order of first occurrence
+    """
+    tokens = {}
+
+    for text in texts:
+        for word in get_words(text):
+            if len(word) >= MIN_WORD_LENGTH:
+                tokens.setdefault(word, None)
+
+            for trigram in get_trigrams(word):
+                tokens.setdefault(TRIGRAM_PREFIX + trigram, None)
+
+            if len(tokens) >= MAX_TOKENS:
+                return list(tokens)[:MAX_TOKENS]
+
+    return list(tokens)
@@ -0,0 +1,147 @@
+"""
+Combinations of open items (invoices) whose amounts add up to a payment.
+
+Amounts are converted to integer minor units (cents) and a dynamic programme computes, for every suffix of
+the items, the set of reachable sums as a bitset (a Python int - bit n is set if the sum n can be made).
+A depth first search then only takes a branch if the amount still needed can be reached with the remaining
+items, so every leaf it reaches is a valid combination.
+
+Combinations are searched by size - all pairs, then all combinations of three items and so on - so the
+shortest combinations are found first. Within a size, a branch is also dropped if the amount still needed
+is more than the largest (or less than the smallest) items left can add up to.
+
+For very large amounts the bitsets are computed in coarser units (at most MAX_DP_UNITS bits) - the pruning
+then allows for the rounding and every combination is checked exactly in minor units before it is returned.
+
+The search stops after max_results combinations or when the time budget runs out, so it stays interactive
+for parties with hundreds of open items.
+"""
+from __future__ import annotations
+import math
+import time
+
+# Upper bound on the size of the sum bitsets
+MAX_DP_UNITS = 1_000_000
+
+# Upper bound on the number of items searched - callers pass the items in order of preference
+MAX_ITEMS = 300
+
+# Time budget of a search in seconds
+TIME_BUDGET = 0.5
+
+
+def find_combinations(target: float, amounts: list[float], tolerance: float = 0, precision: int = 2,
+                      max_results: int = 10, time_budget: float = TIME_BUDGET) -> list[list[int]]:
+    """
+    Returns combinations (lists of indexes into amounts) of at least two items whose sum is within the
+    tolerance of the target - fewest items and closest sum first.
+    """
+    scale = 10 ** precision
+    target_units = round(abs(target) * scale)
+    tolerance_units = round(abs(tolerance) * scale)
+
+    # Items larger than the target can never be part of a combination
+    items = [
+        (round(abs(amount) * scale), index) for index, amount in enumerate(amounts)
+        if 0 < round(abs(amount) * scale) <= target_units + tolerance_units
+    ][:MAX_ITEMS]
+
+    if len(items) < 2:
+        return []
+
+    # Larger items first - the search fails faster on branches that overshoot
+    items.sort(reverse=True)
+
+    unit = max(1, math.ceil((target_units + tolerance_units) / MAX_DP_UNITS))
+    reachable = _get_suffix_reachable_sums([amount // unit for amount, _index in items], (target_units + tolerance_units) // unit)
+
+    # prefix_sums[i] is the sum of the i largest items
+    prefix_sums = [0]
+    for amount, _index in items:
+        prefix_sums.append(prefix_sums[-1] + amount)
+
+    deadline = time.monotonic() + time_budget
+    results = []
+
+    def can_reach(position, low, high):
+        """
+        Whether a sum in [low, high] (in minor units) can be made with the items from position onwards
+        """
+        low_units = max(0, low // unit)
+        if unit > 1:
+            # Rounding down to units can understate a sum by up to one unit per item
+            low_units = max(0, low_units - (len(items) - position))
+        high_units = high // unit
+        if high < 0 or high_units < low_units:
+            return False
+        return (reachable[position] >> low_units) & ((1 << (high_units - low_units + 1)) - 1) != 0
+
+    def search(position, remaining, chosen, size):
+        if len(results) >= max_results or time.monotonic() > deadline:
+            return
+
+        left = size - len(chosen)
+
+        for next_position in range(position, len(items) - left + 1):
+            amount, index = items[next_position]
+            rest = remaining - amount
+
+            if rest < -tolerance_units:
+                continue
+
+            if left == 1:
+                if abs(rest) <= tolerance_units:
+                    results.append(chosen + [index])
+                    if len(results) >= max_results:
+                        return
+                continue
+
+            # The largest left - 1 items after this one - smaller items further on only add up to less
+            if rest - tolerance_units > prefix_sums[next_position + left] - prefix_sums[next_position + 1]:
+                break
+
+            # The smallest left - 1 items (at the end)
+            if rest + tolerance_units < prefix_sums[len(items)] - prefix_sums[len(items) - left + 1]:
+                continue
+
+            if can_reach(next_position + 1, rest - tolerance_units, rest + tolerance_units):
+                chosen.append(index)
+                search(next_position + 1, rest, chosen, size)
+                chosen.pop()
+
+                if len(results) >= max_results:
+                    return
+
+    if not can_reach(0, target_units - tolerance_units, target_units + tolerance_units):
+        return []
+
+    for size in range(2, len(items) + 1):
+        # Even the smallest items add up to more than the target
+        if prefix_sums[len(items)] - prefix_sums[len(items) - size] > target_units + tolerance_units:
+            break
+
+        search(0, target_units, [], size)
+
+        if len(results) >= max_results or time.monotonic() > deadline:
+            break
+
+    results.sort(key=lambda combination: (
+        len(combination),
+        abs(target_units - sum(round(abs(amounts[index]) * scale) for index in combination)),
+    ))
+
+    return results
+
+
+def _get_suffix_reachable_sums(amounts: list[int], limit: int) -> list[int]:
+    """
+    reachable[i] is a bitset of the sums (up to limit) that can be made with amounts[i:] - bit 0 is the empty sum
+    """
+    mask = (1 << (limit + 1)) - 1
+    reachable = [0] * (len(amounts) + 1)
+    reachable[len(amounts)] = 1
+
+    for position in range(len(amounts) - 1, -1, -1):
+        reachable[position] = (reachable[position + 1] | (reachable[position + 1] << amounts[position])) & mask
+
+    return reachable
@@ -0,0 +1,4 @@
+from truebalance.setup.indexes import create_indexes
+
+def execute():
+    create_indexes()
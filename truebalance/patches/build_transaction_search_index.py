@@ -0,0 +1,5 @@
+from truebalance.apis.transaction_search import enqueue_search_index_rebuild
+
+def execute():
+    # Index the transactions that existed before the search index was added
+    enqueue_search_index_rebuild()
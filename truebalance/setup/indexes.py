@@ -0,0 +1,62 @@
+import frappe
+
+# Composite indexes for the reconciliation queries, by doctype: index name -> columns.
+# Columns compared with "=" come first and the column used for a range (dates) or ordering last,
+# so that the whole index can be used for the lookup.
+INDEXES = {
+    "Bank Transaction": {
+        # get_bank_transactions: bank account, submitted, date range, unallocated
+        "truebalance_bank_account_date": ["bank_account", "docstatus", "date", "unallocated_amount"],
+        # Rule evaluation: unreconciled, submitted, not evaluated yet - paged on modified
+        "truebalance_rule_evaluation": ["status", "docstatus", "is_rule_evaluated", "modified"],
+        # search_for_transfer_transaction: mirror amount in the same company within a few days
+        "truebalance_transfer_search": ["company", "withdrawal", "deposit", "date"],
+    },
+    "Payment Entry": {
+        # get_vouchers_for_reco with an amount tolerance: bank account, submitted, amount (equality or band)
+        "truebalance_received_amount": ["paid_to", "docstatus", "received_amount"],
+        "truebalance_paid_amount": ["paid_from", "docstatus", "paid_amount"],
+    },
+    "Journal Entry Account": {
+        # get_vouchers_for_reco with an amount tolerance: bank account, submitted, amount (equality or band)
+        "truebalance_account_debit": ["account", "docstatus", "debit_in_account_currency"],
+        "truebalance_account_credit": ["account", "docstatus", "credit_in_account_currency"],
+    },
+    "Debtor Statement Entry": {
+        # get_bank_transactions (Debtor): party, unreconciled, statement date range
+        "truebalance_party_statement_date": ["party", "is_reconciled", "statement_date"],
+    },
+}
+
+def create_indexes():
+    """
+    Create the indexes in INDEXES that are missing. An index whose columns differ from the registry is recreated.
+
+    Runs after install and after every migrate - so adding an entry to INDEXES is all that is needed.
+    """
+    for doctype, indexes in INDEXES.items():
+        if not frappe.db.table_exists(doctype):
+            continue
+
+        for index_name, columns in indexes.items():
+            existing_columns = get_index_columns(doctype, index_name)
+
+            if existing_columns == columns:
+                continue
+
+            if existing_columns:
+                frappe.db.sql_ddl(f"ALTER TABLE `tab{doctype}` DROP INDEX `{index_name}`")
+
+            frappe.db.add_index(doctype, columns, index_name)
+
+def get_index_columns(doctype: str, index_name: str) -> list[str]:
+    """
+    Returns the columns of an index in order - an empty list if the index does not exist
+    """
+    if frappe.db.db_type != "mariadb":
+        # Other databases only report whether the index exists - assume it matches the registry
+        return INDEXES[doctype][index_name] if frappe.db.has_index(f"tab{doctype}", index_name) else []
+
+    rows = frappe.db.sql(f"SHOW INDEX FROM `tab{doctype}` WHERE Key_name = %s", index_name, as_dict=True)
+
+    return [row.Column_name for row in sorted(rows, key=lambda row: row.Seq_in_index)]
@@ -1,4 +1,6 @@
 from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+from truebalance.apis.transaction_search import enqueue_search_index_rebuild
+from truebalance.setup.indexes import create_indexes
 
 def after_install():
 
@@ -43,3 +45,8 @@ def after_install():
 			}
 		]
         })
+
+    create_indexes()
+
+    # Index the transactions already on the site (patches are not run on install)
+    enqueue_search_index_rebuild()
@@ -1,9 +1,75 @@
 # Copyright (c) 2025, The Commit Company (Algocode Technologies Pvt. Ltd.) and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from truebalance.apis.bank_reconciliation import validate_debtor_statement_vouchers
+from truebalance.matching.candidates import get_debtor_statement_vouchers
+
+
+def _open_item(doctype, name, direction):
+	return {"doctype": doctype, "name": name, "direction": direction, "paid_amount": 100}
+
 
 class TestDebtorStatementEntry(FrappeTestCase):
-	pass
+	def test_candidates_are_invoices_and_received_payments(self):
+		open_items = [
+			_open_item("Sales Invoice", "SINV-1", "deposit"),
+			_open_item("Payment Entry", "PE-1", "deposit"),
+			_open_item("Sales Invoice", "SINV-RET-1", "withdrawal"),  # credit note
+			_open_item("Payment Entry", "PE-REFUND-1", "withdrawal"),
+			_open_item("Journal Entry", "JV-1", "deposit"),
+		]
+
+		with patch("truebalance.matching.candidates.get_party_vouchers", return_value=open_items):
+			vouchers = get_debtor_statement_vouchers("Customer A", "Customer")
+
+		self.assertEqual([voucher["name"] for voucher in vouchers], ["SINV-1", "PE-1"])
+
+	def test_no_candidates_for_suppliers(self):
+		open_items = [_open_item("Purchase Invoice", "PINV-1", "withdrawal")]
+
+		with patch("truebalance.matching.candidates.get_party_vouchers", return_value=open_items):
+			self.assertEqual(get_debtor_statement_vouchers("Supplier A", "Supplier"), [])
+
+	def test_journal_entry_cannot_be_allocated(self):
+		transaction = frappe._dict(name="DSE-1", party_type="Customer")
+
+		with self.assertRaises(frappe.ValidationError):
+			validate_debtor_statement_vouchers(transaction, [{"payment_doctype": "Journal Entry", "payment_name": "JV-1"}])
+
+	def test_purchase_invoice_cannot_be_allocated(self):
+		transaction = frappe._dict(name="DSE-1", party_type="Customer")
+
+		with self.assertRaises(frappe.ValidationError):
+			validate_debtor_statement_vouchers(transaction, [{"payment_doctype": "Purchase Invoice", "payment_name": "PINV-1"}])
+
+	def test_supplier_statement_cannot_be_allocated(self):
+		transaction = frappe._dict(name="DSE-1", party_type="Supplier")
+
+		with self.assertRaises(frappe.ValidationError):
+			validate_debtor_statement_vouchers(transaction, [{"payment_doctype": "Sales Invoice", "payment_name": "SINV-1"}])
+
+	def test_credit_note_cannot_be_allocated(self):
+		transaction = frappe._dict(name="DSE-1", party_type="Customer")
+
+		with patch("frappe.db.get_value", return_value=1), self.assertRaises(frappe.ValidationError):
+			validate_debtor_statement_vouchers(transaction, [{"payment_doctype": "Sales Invoice", "payment_name": "SINV-RET-1"}])
+
+	def test_refund_cannot_be_allocated(self):
+		transaction = frappe._dict(name="DSE-1", party_type="Customer")
+
+		with patch("frappe.db.get_value", return_value="Pay"), self.assertRaises(frappe.ValidationError):
+			validate_debtor_statement_vouchers(transaction, [{"payment_doctype": "Payment Entry", "payment_name": "PE-REFUND-1"}])
+
+	def test_invoice_and_received_payment_can_be_allocated(self):
+		transaction = frappe._dict(name="DSE-1", party_type="Customer")
+
+		with patch("frappe.db.get_value", side_effect=lambda doctype, name, field: 0 if doctype == "Sales Invoice" else "Receive"):
+			validate_debtor_statement_vouchers(transaction, [
+				{"payment_doctype": "Sales Invoice", "payment_name": "SINV-1"},
+				{"payment_doctype": "Payment Entry", "payment_name": "PE-1"},
+			])
@@ -5,6 +5,9 @@ import frappe
 import re
 from frappe import _
 from frappe.model.document import Document
+from truebalance.apis.reconciliation_summary import clear_reconciliation_summary_cache
+from truebalance.apis.rules import queue_rule_change_evaluation
+from truebalance.matching.regex_safety import is_prone_to_catastrophic_backtracking
 
 
 class MintBankTransactionRuleTB(Document):
@@ -65,7 +68,42 @@ class MintBankTransactionRuleTB(Document):
 					re.compile(rule.value)
 				except re.error:
 					frappe.throw(_("Invalid regex pattern."))
+
+				if is_prone_to_catastrophic_backtracking(rule.value):
+					frappe.throw(_("Regex pattern {0} has nested or overlapping repetitions that can make matching extremely slow. Please simplify it.").format(frappe.bold(rule.value)))
 		
 		account_company = frappe.db.get_value("Account", self.account, "company")
 		if account_company != self.company:
 			frappe.throw(_("Account company does not match with the rule company."))
+
+	def on_update(self):
+		"""Re-evaluate the transactions that this rule can affect"""
+		if self.has_matching_criteria_changed():
+			queue_rule_change_evaluation(self.name)
+
+	def on_trash(self):
+		"""Clear the rule from transactions pointing at it so that they are evaluated again"""
+		bank_transaction = frappe.qb.DocType("Bank Transaction")
+		(frappe.qb.update(bank_transaction)
+			.set(bank_transaction.matched_rule, None)
+			.set(bank_transaction.is_rule_evaluated, 0)
+			.where(bank_transaction.matched_rule == self.name)
+		).run()
+		clear_reconciliation_summary_cache("Bank Transaction")
+
+		queue_rule_change_evaluation(f"deleted::{self.company}")
+
+	def has_matching_criteria_changed(self):
+		previous = self.get_doc_before_save()
+
+		if not previous:
+			return True
+
+		for field in ("company", "transaction_type", "priority", "min_amount", "max_amount"):
+			if self.get(field) != previous.get(field):
+				return True
+
+		def get_description_rules(doc):
+			return [(row.check, row.value) for row in doc.description_rules]
+
+		return get_description_rules(self) != get_description_rules(previous)
@@ -4,6 +4,31 @@
 # import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from truebalance.matching.regex_safety import is_prone_to_catastrophic_backtracking
+
 
 class TestMintBankTransactionRuleTB(FrappeTestCase):
-	pass
+	def test_nested_unbounded_repeats_are_flagged(self):
+		for pattern in (r"(a+)+", r"(.*)*", r"(\w+\s?)*$", r"(\w|\w\w)+$", r"(\d|\w+)+", r"(?:[a-z]+|\d)*"):
+			with self.subTest(pattern=pattern):
+				self.assertTrue(is_prone_to_catastrophic_backtracking(pattern))
+
+	def test_overlapping_alternations_are_flagged(self):
+		for pattern in (r"(\w|\d)+$", r"(.|x)+", r"(\w|[a-z])*x"):
+			with self.subTest(pattern=pattern):
+				self.assertTrue(is_prone_to_catastrophic_backtracking(pattern))
+
+	def test_separated_repeats_are_safe(self):
+		for pattern in (r"(\d{1,3},)*\d{3}", r"\d+(,\d+)*", r"(\w+\s)*", r"(\s+\w+)*", r"(a|ab)*c"):
+			with self.subTest(pattern=pattern):
+				self.assertFalse(is_prone_to_catastrophic_backtracking(pattern))
+
+	def test_bounded_repeats_are_safe(self):
+		for pattern in (r"(?:\s+\w+){2}", r"(?:\w+\s?){1,3}", r"(\d{3})+"):
+			with self.subTest(pattern=pattern):
+				self.assertFalse(is_prone_to_catastrophic_backtracking(pattern))
+
+	def test_simple_patterns_are_safe(self):
+		for pattern in (r"upi/\d+/", r"(neft|imps|rtgs)[-/ ]\w+", r"[^a-z]+", r"(?:ab|cd)+", r"[\w.-]+@\w+"):
+			with self.subTest(pattern=pattern):
+				self.assertFalse(is_prone_to_catastrophic_backtracking(pattern))
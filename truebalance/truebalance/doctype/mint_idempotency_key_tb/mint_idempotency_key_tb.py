@@ -0,0 +1,29 @@
+# Copyright (c) 2026, The Commit Company (Algocode Technologies Pvt. Ltd.) and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MintIdempotencyKeyTB(Document):
+	# begin: auto-generated types
+	# This code is auto-generated. Do not modify anything in this block.
+
+	from typing import TYPE_CHECKING
+
+	if TYPE_CHECKING:
+		from frappe.types import DF
+
+		endpoint: DF.Data
+		idempotency_key: DF.Data
+		request_hash: DF.Data | None
+		response: DF.LongText | None
+		status: DF.Literal["Processing", "Completed"]
+		user: DF.Link
+	# end: auto-generated types
+	pass
+
+
+def on_doctype_update():
+	# Expired keys are deleted by age
+	frappe.db.add_index("Mint Idempotency Key TB", ["creation"])
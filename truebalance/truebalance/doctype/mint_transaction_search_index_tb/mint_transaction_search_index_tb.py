@@ -0,0 +1,30 @@
+# Copyright (c) 2026, The Commit Company (Algocode Technologies Pvt. Ltd.) and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MintTransactionSearchIndexTB(Document):
+	# begin: auto-generated types
+	# This code is auto-generated. Do not modify anything in this block.
+
+	from typing import TYPE_CHECKING
+
+	if TYPE_CHECKING:
+		from frappe.types import DF
+
+		reference_doctype: DF.Link
+		reference_name: DF.DynamicLink
+		tokens: DF.LongText | None
+	# end: auto-generated types
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Mint Transaction Search Index TB", ["reference_doctype", "reference_name(140)"])
+
+	if frappe.db.db_type == "mariadb" and not frappe.db.sql(
+		"""SHOW INDEX FROM `tabMint Transaction Search Index TB` WHERE Key_name = 'tokens_fulltext'"""
+	):
+		frappe.db.sql_ddl("""ALTER TABLE `tabMint Transaction Search Index TB` ADD FULLTEXT INDEX `tokens_fulltext` (`tokens`)""")